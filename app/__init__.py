@@ -40,6 +40,7 @@ def create_app(config_class=Config):
     from app.routes.users import users_bp
     from app.routes.reviews import reviews_bp
     from app.routes.admin import admin_bp
+    from app.routes.api import api_bp
     
     app.register_blueprint(auth_bp)
     app.register_blueprint(main_bp)
@@ -49,5 +50,38 @@ def create_app(config_class=Config):
     app.register_blueprint(users_bp)
     app.register_blueprint(reviews_bp)
     app.register_blueprint(admin_bp)
+    app.register_blueprint(api_bp)
+    
+    # Лічильники рядків підтримуються при кожному flush сесії
+    from app.utils.counters import counters
+    counters.init_app(app)
+    
+    # Поточний користувач береться зі знімка в пам'яті, а не запитом до users
+    from app.utils.identity import user_identities
+    user_identities.init_app(app)
+    
+    # Статистика SQL-запитів кожного запиту (SQL_INSTRUMENTATION)
+    from app.utils.sqlstats import sql_instrumentation
+    sql_instrumentation.init_app(app)
+    
+    # Журнал дій пишеться пакетами у фоновому потоці
+    from app.utils.activity import activity_log
+    activity_log.init_app(app)
+    
+    # Кеш відповідей для анонімних відвідувачів
+    from app.utils.cache import response_cache
+    response_cache.init_app(app)
+    
+    # Індекс підказок для пошуку будується у фоні з першим запитом
+    from app.utils.suggest import suggest_index
+    suggest_index.init_app(app)
+    
+    # Статичні файли з хешем вмісту в імені (flask assets build) кешуються назавжди
+    from app.utils.assets import assets
+    assets.init_app(app)
+    
+    # Команди CLI
+    from app.cli import register_commands
+    register_commands(app)
     
     return app
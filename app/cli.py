@@ -0,0 +1,357 @@
+"""Команди Flask CLI для обслуговування бази даних."""
+import click
+from flask.cli import AppGroup
+
+
+def register_commands(app):
+    """Зареєструвати групи команд у застосунку."""
+    app.cli.add_command(ratings_cli)
+    app.cli.add_command(popularity_cli)
+    app.cli.add_command(counters_cli)
+    app.cli.add_command(rollups_cli)
+    app.cli.add_command(logs_cli)
+    app.cli.add_command(indexes_cli)
+    app.cli.add_command(files_cli)
+    app.cli.add_command(storage_cli)
+    app.cli.add_command(covers_cli)
+    app.cli.add_command(assets_cli)
+    app.cli.add_command(metadata_cli)
+    app.cli.add_command(fulltext_cli)
+    app.cli.add_command(catalog_cli)
+    app.cli.add_command(export_cli)
+
+
+ratings_cli = AppGroup('ratings', help='Рейтинги книг.')
+
+
+@ratings_cli.command('recompute')
+@click.option('--batch-size', default=1000, show_default=True, help='Кількість книг за одну транзакцію.')
+def recompute_ratings_command(batch_size):
+    """Перерахувати rating_sum/rating_count/rating_score з таблиці reviews."""
+    from app.utils.cache import response_cache
+    from app.utils.ratings import recompute_ratings
+
+    rated = recompute_ratings(batch_size=batch_size)
+    response_cache.clear()
+    click.echo(f'Рейтинги перераховано. Книг з відгуками: {rated}')
+
+
+popularity_cli = AppGroup('popularity', help='Популярність книг (головна сторінка).')
+
+
+@popularity_cli.command('rebuild')
+@click.option('--batch-size', default=1000, show_default=True, help='Кількість рядків в одному INSERT.')
+def rebuild_popularity_command(batch_size):
+    """Перерахувати таблицю book_popularity з відгуків і журналу завантажень."""
+    from app.utils.popularity import rebuild_popularity
+
+    count = rebuild_popularity(batch_size=batch_size)
+    click.echo(f'Популярність перераховано. Книг у рейтингу: {count}')
+
+
+counters_cli = AppGroup('counters', help='Лічильники кількості записів.')
+
+
+@counters_cli.command('recount')
+def recount_counters_command():
+    """Перерахувати таблицю counters точними COUNT-запитами."""
+    from app.utils.counters import counters
+
+    values = counters.recount()
+    for name, value in sorted(values.items()):
+        click.echo(f'{name}: {value}')
+
+
+rollups_cli = AppGroup('rollups', help='Зведена статистика журналу дій (панель адміністратора).')
+
+
+@rollups_cli.command('run')
+@click.option('--batch-size', default=5000, show_default=True, help='Кількість записів журналу за одну транзакцію.')
+def run_rollups_command(batch_size):
+    """Додати нові записи журналу до погодинної/денної статистики."""
+    from app.utils.rollups import run_rollups
+
+    processed = run_rollups(batch_size=batch_size)
+    click.echo(f'Оброблено записів журналу: {processed}')
+
+
+@rollups_cli.command('backfill')
+@click.option('--batch-size', default=5000, show_default=True, help='Кількість записів журналу за одну транзакцію.')
+@click.confirmation_option(prompt='Зведену статистику буде перебудовано з наявного журналу. Продовжити?')
+def backfill_rollups_command(batch_size):
+    """Перебудувати зведену статистику з усієї історії журналу.
+
+    Записи, уже видалені з журналу, до нової статистики не потраплять.
+    """
+    from app.utils.rollups import reset_rollups, run_rollups
+
+    reset_rollups()
+    processed = run_rollups(batch_size=batch_size)
+    click.echo(f'Оброблено записів журналу: {processed}')
+
+
+logs_cli = AppGroup('logs', help='Журнал дій.')
+
+
+@logs_cli.command('purge')
+@click.option('--batch-size', type=int, help='Кількість записів за одну транзакцію (типово LOG_RETENTION_BATCH_SIZE).')
+@click.option('--pause', type=float, help='Пауза між партіями в секундах (типово LOG_RETENTION_PAUSE).')
+@click.option('--dry-run', is_flag=True, help='Лише порахувати записи, що підлягають видаленню.')
+def purge_logs_command(batch_size, pause, dry_run):
+    """Архівувати й видалити записи журналу, старші за термін зберігання."""
+    from app.utils.jobs import JobAlreadyRunning, run_job
+    from app.utils.retention import archive_dir, purge_logs
+
+    try:
+        result = run_job('log_retention', purge_logs, echo=click.echo,
+                         batch_size=batch_size, pause=pause, dry_run=dry_run)
+    except JobAlreadyRunning:
+        raise click.ClickException('Очищення журналу вже виконується.')
+    if dry_run:
+        click.echo(f'Переглянуто записів: {result.scanned}, до видалення: {result.expired}')
+    else:
+        click.echo(f'Видалено записів: {result.deleted}, архівних файлів: {result.files} ({archive_dir()})')
+
+
+indexes_cli = AppGroup('indexes', help='Індекси та плани запитів.')
+
+
+@indexes_cli.command('check')
+@click.option('--min-rows', default=100, show_default=True,
+              help='MySQL: повне сканування менших таблиць не вважається помилкою.')
+@click.option('--verbose', '-v', is_flag=True, help='Показати план кожного запиту.')
+def check_indexes_command(min_rows, verbose):
+    """Перевірити EXPLAIN канонічних запитів маршрутів (повні сканування, сортування без індексу).
+
+    Запускайте на базі із заповненими даними; код виходу 1, якщо знайдено проблеми.
+    """
+    from app.utils.explain import check_queries
+
+    plans, issues = check_queries(min_rows=min_rows)
+    problems = {issue.query for issue in issues}
+    for name, rows in plans.items():
+        click.echo(f"{'FAIL' if name in problems else 'ok  '} {name}")
+        if verbose or name in problems:
+            for row in rows:
+                click.echo(f'       {dict(row)}')
+    for issue in issues:
+        click.echo(f'{issue.query}: {issue.kind}: {issue.detail}', err=True)
+    if issues:
+        raise SystemExit(1)
+    click.echo(f'Перевірено запитів: {len(plans)}, проблем не знайдено.')
+
+
+files_cli = AppGroup('files', help='Файли книг.')
+
+
+@files_cli.command('checksums')
+@click.option('--batch-size', default=100, show_default=True, help='Кількість файлів за одну транзакцію.')
+def checksums_command(batch_size):
+    """Обчислити SHA-256 (ETag завантажень) для файлів без контрольної суми."""
+    import os
+    from flask import current_app
+    from app import db
+    from app.models import File
+    from app.utils.helpers import file_checksum
+
+    updated = missing = 0
+    last_id = 0
+    while True:
+        files = File.query.filter(File.checksum.is_(None), File.id > last_id)\
+            .order_by(File.id).limit(batch_size).all()
+        if not files:
+            break
+        for file in files:
+            path = os.path.join(current_app.root_path, 'static', file.file_path.replace('/', os.sep))
+            if os.path.exists(path):
+                file.checksum = file_checksum(path)
+                updated += 1
+            else:
+                missing += 1
+                click.echo(f'Файл не знайдено: {file.file_path}', err=True)
+        last_id = files[-1].id
+        db.session.commit()
+    click.echo(f'Контрольних сум обчислено: {updated}, відсутніх файлів: {missing}')
+
+
+storage_cli = AppGroup('storage', help='Сховище завантажених файлів (вміст за SHA-256).')
+
+
+@storage_cli.command('migrate')
+@click.option('--batch-size', default=100, show_default=True, help='Кількість записів за одну транзакцію.')
+@click.option('--dry-run', is_flag=True, help='Лише порахувати файли, які буде перенесено.')
+def migrate_storage_command(batch_size, dry_run):
+    """Перенести файли книг і обкладинки, збережені до появи сховища, у static/uploads/blobs.
+
+    Однаковий вміст зберігається один раз; старі файли видаляються після оновлення всіх записів.
+    """
+    from app.utils.cache import response_cache
+    from app.utils.storage import relink_existing
+
+    result = relink_existing(batch_size=batch_size, dry_run=dry_run, echo=lambda m: click.echo(m, err=True))
+    if dry_run:
+        click.echo(f'До перенесення: {result.relinked}, відсутніх файлів: {result.missing}')
+        return
+    response_cache.clear()
+    click.echo(f'Перенесено: {result.relinked}, відсутніх файлів: {result.missing}, '
+               f'унікальних файлів у сховищі: {result.blobs}, видалено невикористаних: {result.removed}')
+
+
+@storage_cli.command('recount')
+def recount_storage_command():
+    """Перерахувати посилання на файли сховища й видалити ті, на які ніщо не посилається."""
+    from app.utils.storage import recount_references
+
+    removed = recount_references()
+    click.echo(f'Посилання перераховано. Видалено невикористаних файлів: {removed}')
+
+
+covers_cli = AppGroup('covers', help='Обкладинки книг.')
+
+
+@covers_cli.command('thumbnails')
+@click.option('--workers', type=int, help='Кількість процесів (типово — кількість ядер).')
+@click.option('--force', is_flag=True, help='Перегенерувати й ті обкладинки, що вже мають зменшені копії.')
+def cover_thumbnails_command(workers, force):
+    """Створити зменшені копії (WebP/JPEG) наявних обкладинок паралельно в кількох процесах."""
+    from app.utils.thumbnails import backfill
+
+    try:
+        done, failed = backfill(workers=workers, force=force, echo=lambda m: click.echo(m, err=True))
+    except RuntimeError as exc:
+        raise click.ClickException(str(exc))
+    click.echo(f'Оброблено обкладинок: {done}, помилок: {failed}')
+
+
+assets_cli = AppGroup('assets', help='Статичні файли (CSS, JS, зображення).')
+
+
+@assets_cli.command('build')
+@click.option('--prune', is_flag=True, help='Видалити файли попередніх збірок.')
+def build_assets_command(prune):
+    """Скопіювати статичні файли в static/dist з хешем вмісту в імені, стиснути (gzip, brotli) і записати маніфест."""
+    from flask import current_app
+    from app.utils.assets import brotli, build_assets, prune_assets
+
+    manifest = build_assets(current_app.static_folder)
+    click.echo(f"Файлів у маніфесті: {len(manifest)}{'' if brotli else ' (brotli не встановлено, лише gzip)'}")
+    if prune:
+        click.echo(f'Видалено файлів попередніх збірок: {prune_assets(current_app.static_folder, manifest)}')
+
+
+metadata_cli = AppGroup('metadata', help='Метадані з файлів книг (EPUB, FB2, PDF).')
+
+
+@metadata_cli.command('extract')
+@click.option('--workers', type=int, help='Кількість процесів (типово — кількість ядер).')
+@click.option('--force', is_flag=True, help='Прочитати повторно й файли, що вже мають метадані.')
+def extract_metadata_command(workers, force):
+    """Прочитати назву, авторів, ISBN та обкладинку з наявних файлів паралельно в кількох процесах."""
+    from app.utils.metadata import backfill
+
+    done, failed = backfill(workers=workers, force=force, echo=lambda m: click.echo(m, err=True))
+    click.echo(f'Оброблено файлів: {done}, помилок: {failed}')
+
+
+fulltext_cli = AppGroup('fulltext', help='Повнотекстовий індекс вмісту книг (EPUB, FB2).')
+
+
+@fulltext_cli.command('build')
+@click.option('--workers', type=int, help='Кількість процесів (типово — кількість ядер).')
+@click.option('--batch-size', default=50, show_default=True, help='Файлів в одному проміжному сегменті.')
+def build_fulltext_command(workers, batch_size):
+    """Перебудувати індекс з усіх активних файлів EPUB/FB2."""
+    from app.utils.fulltext import rebuild
+
+    indexed, failed = rebuild(workers=workers, batch_size=batch_size, echo=lambda m: click.echo(m, err=True))
+    click.echo(f'Проіндексовано файлів: {indexed}, помилок: {failed}')
+
+
+catalog_cli = AppGroup('catalog', help='Каталог книг.')
+
+
+@catalog_cli.command('import')
+@click.argument('source', type=click.Path(exists=True, dir_okay=False))
+@click.option('--format', 'file_format', type=click.Choice(['csv', 'jsonl', 'onix']),
+              help='Формат джерела (типово — за розширенням файлу).')
+@click.option('--batch-size', default=1000, show_default=True, help='Кількість книг за одну транзакцію.')
+@click.option('--files-dir', type=click.Path(exists=True, file_okay=False),
+              help='Каталог з обкладинками та файлами книг, на які посилаються записи.')
+@click.option('--workers', default=4, show_default=True, help='Кількість потоків для збереження файлів.')
+@click.option('--checkpoint', type=click.Path(dir_okay=False), help='Файл контрольної точки (типово SOURCE.checkpoint).')
+@click.option('--restart', is_flag=True, help='Почати спочатку, ігноруючи контрольну точку.')
+def import_catalog_command(source, file_format, batch_size, files_dir, workers, checkpoint, restart):
+    """Імпортувати книги з CSV, JSON Lines або ONIX пакетами; перерване імпортування продовжується з контрольної точки."""
+    from app.utils.cache import response_cache
+    from app.utils.counters import counters
+    from app.utils.importer import import_catalog
+
+    result = import_catalog(source, file_format=file_format, batch_size=batch_size, files_dir=files_dir,
+                            workers=workers, checkpoint=checkpoint, restart=restart,
+                            echo=lambda m: click.echo(m, err=True))
+    counters.recount()
+    response_cache.clear()
+    click.echo(f'Прочитано записів: {result.read} за {result.seconds:.1f} с '
+               f'({result.read / max(result.seconds, 1e-6):,.0f} рядків/с)')
+    click.echo(f'Додано книг: {result.imported}, дублікатів ISBN: {result.duplicates}, '
+               f'некоректних записів: {result.invalid}')
+    click.echo(f'Нових авторів: {result.authors}, жанрів: {result.genres}, файлів: {result.files}, '
+               f'пропущено файлів: {result.missing}')
+
+
+export_cli = AppGroup('export', help='Потоковий експорт даних у CSV або JSON Lines.')
+
+
+def _export_options(command):
+    command = click.option('--batch-size', default=1000, show_default=True,
+                           help='Кількість рядків, що читаються з курсора за раз.')(command)
+    command = click.option('--gzip', 'compress', is_flag=True,
+                           help='Стиснути gzip (увімкнено автоматично для OUTPUT.gz).')(command)
+    command = click.option('--output', '-o', type=click.Path(dir_okay=False),
+                           help='Файл результату (типово — стандартний вивід).')(command)
+    command = click.option('--format', 'file_format', type=click.Choice(['csv', 'jsonl']), default='csv',
+                           show_default=True, help='Формат результату.')(command)
+    return command
+
+
+def _write_export(dataset, file_format, output, compress, batch_size, **filters):
+    from app.utils.exports import export_chunks
+
+    compress = compress or bool(output and output.endswith('.gz'))
+    chunks = export_chunks(dataset, file_format, compress, batch_size, **filters)
+    if output:
+        with open(output, 'wb') as f:
+            for chunk in chunks:
+                f.write(chunk)
+        click.echo(f'Експорт збережено: {output}', err=True)
+    else:
+        stream = click.get_binary_stream('stdout')
+        for chunk in chunks:
+            stream.write(chunk)
+        stream.flush()
+
+
+@export_cli.command('logs')
+@_export_options
+@click.option('--action', help='Лише записи з цією дією (download, login, ...).')
+@click.option('--user-id', type=int, help='Лише дії цього користувача.')
+@click.option('--date-from', help='Початкова дата (РРРР-ММ-ДД).')
+@click.option('--date-to', help='Кінцева дата включно (РРРР-ММ-ДД).')
+def export_logs_command(file_format, output, compress, batch_size, action, user_id, date_from, date_to):
+    """Експортувати журнал дій з тими самими фільтрами, що й на сторінці логів."""
+    _write_export('logs', file_format, output, compress, batch_size,
+                  action=action, user_id=user_id, date_from=date_from, date_to=date_to)
+
+
+@export_cli.command('reviews')
+@_export_options
+def export_reviews_command(file_format, output, compress, batch_size):
+    """Експортувати відгуки з назвами книг та іменами користувачів."""
+    _write_export('reviews', file_format, output, compress, batch_size)
+
+
+@export_cli.command('books')
+@_export_options
+def export_books_command(file_format, output, compress, batch_size):
+    """Експортувати каталог у форматі, який читає `flask catalog import`."""
+    _write_export('books', file_format, output, compress, batch_size)
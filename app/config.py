@@ -4,6 +4,19 @@ from dotenv import load_dotenv
 basedir = os.path.abspath(os.path.dirname(__file__))
 load_dotenv(os.path.join(basedir, '..', '.env'))
 
+def _days_by_action(value):
+    """'view=30,download=365' -> {'view': 30, 'download': 365}."""
+    rules = {}
+    for item in value.split(','):
+        if item.strip():
+            action, _, days = item.partition('=')
+            rules[action.strip()] = int(days)
+    return rules
+
+def _int_list(value):
+    """'160,320,480' -> [160, 320, 480]."""
+    return [int(item) for item in value.split(',') if item.strip()]
+
 class Config:
     # Flask
     SECRET_KEY = os.environ.get('SECRET_KEY') or 'dev-secret-key-change-in-production'
@@ -31,7 +44,105 @@ class Config:
     ALLOWED_EXTENSIONS = {'pdf', 'epub', 'mobi', 'fb2'}
     ALLOWED_IMAGES = {'png', 'jpg', 'jpeg', 'gif', 'webp'}
     
+    # Book downloads: 'send_file' (streamed by the Python worker), 'x-accel'
+    # (nginx X-Accel-Redirect to the internal location DOWNLOAD_ACCEL_PREFIX,
+    # aliased to app/static) or 'x-sendfile' (Apache/lighttpd X-Sendfile)
+    DOWNLOAD_DELIVERY = os.environ.get('DOWNLOAD_DELIVERY', 'send_file')
+    DOWNLOAD_ACCEL_PREFIX = os.environ.get('DOWNLOAD_ACCEL_PREFIX', '/protected/')
+    
+    # Cover thumbnails (needs Pillow): resized copies in these widths and
+    # formats, rendered by a pool of worker processes after the upload
+    COVER_THUMBNAILS = os.environ.get('COVER_THUMBNAILS', '1').lower() in ('1', 'true', 'yes')
+    COVER_THUMBNAIL_WIDTHS = _int_list(os.environ.get('COVER_THUMBNAIL_WIDTHS', '160,320,480'))
+    COVER_THUMBNAIL_FORMATS = [fmt.strip() for fmt in os.environ.get('COVER_THUMBNAIL_FORMATS', 'webp,jpeg').split(',') if fmt.strip()]
+    COVER_THUMBNAIL_QUALITY = int(os.environ.get('COVER_THUMBNAIL_QUALITY', 80))
+    COVER_THUMBNAIL_WORKERS = int(os.environ.get('COVER_THUMBNAIL_WORKERS', 2))
+    
+    # Ebook metadata (EPUB/FB2/PDF) is read from uploaded files by a pool of
+    # worker processes and offered on the book's edit form
+    METADATA_EXTRACTION = os.environ.get('METADATA_EXTRACTION', '1').lower() in ('1', 'true', 'yes')
+    METADATA_WORKERS = int(os.environ.get('METADATA_WORKERS', 2))
+    
+    # Full-text index of book contents (EPUB/FB2): segment files in
+    # FULLTEXT_INDEX_DIR (default instance/fulltext) memory-mapped by every
+    # worker; built in a process pool, merged into one once there are more
+    # than FULLTEXT_MERGE_SEGMENTS
+    FULLTEXT_INDEX = os.environ.get('FULLTEXT_INDEX', '1').lower() in ('1', 'true', 'yes')
+    FULLTEXT_INDEX_DIR = os.environ.get('FULLTEXT_INDEX_DIR')
+    FULLTEXT_WORKERS = int(os.environ.get('FULLTEXT_WORKERS', 1))
+    FULLTEXT_MERGE_SEGMENTS = int(os.environ.get('FULLTEXT_MERGE_SEGMENTS', 8))
+    
+    # JSON API (/api/v1): page size of book listings and the largest batch
+    # of ids accepted in one request
+    API_PAGE_SIZE = int(os.environ.get('API_PAGE_SIZE', 20))
+    API_MAX_PAGE_SIZE = int(os.environ.get('API_MAX_PAGE_SIZE', 100))
+    API_MAX_BATCH = int(os.environ.get('API_MAX_BATCH', 100))
+    
+    # Logged-in user: per-process snapshot (id, username, role, is_active)
+    # reused for this many seconds instead of a users query per request;
+    # other workers see a deactivation or role change within this time
+    USER_CACHE_TTL = int(os.environ.get('USER_CACHE_TTL', 60))
+    
+    # Fingerprinted static assets (flask assets build) and content-addressed
+    # uploads are served with Cache-Control: immutable and this max-age
+    ASSETS_MAX_AGE = int(os.environ.get('ASSETS_MAX_AGE', 365 * 24 * 3600))
+    
     # Pagination
     BOOKS_PER_PAGE = 12
     REVIEWS_PER_PAGE = 10
     AUTHORS_PER_PAGE = 20
+    
+    # Search (in-process index, rebuilt when older than this many seconds)
+    SEARCH_INDEX_MAX_AGE = int(os.environ.get('SEARCH_INDEX_MAX_AGE', 600))
+    
+    # Response cache for anonymous visitors: 'memory' (per process),
+    # 'filesystem' (shared by all workers on the host) or 'null'.
+    # With several workers use 'filesystem', otherwise an edit only
+    # invalidates the pages cached by the worker that handled it.
+    CACHE_TYPE = os.environ.get('CACHE_TYPE', 'memory')
+    CACHE_DIR = os.environ.get('CACHE_DIR')
+    CACHE_DEFAULT_TIMEOUT = int(os.environ.get('CACHE_DEFAULT_TIMEOUT', 300))
+    CACHE_MAX_ENTRIES = int(os.environ.get('CACHE_MAX_ENTRIES', 1000))
+    
+    # Rating (Bayesian average: prior mean and weight in "virtual" reviews)
+    RATING_PRIOR_MEAN = float(os.environ.get('RATING_PRIOR_MEAN', 3.0))
+    RATING_PRIOR_WEIGHT = int(os.environ.get('RATING_PRIOR_WEIGHT', 5))
+    
+    # Site-wide counters: snapshot lifetime in seconds; in approximate mode
+    # whole-table counts come from MySQL table statistics
+    COUNTERS_TTL = int(os.environ.get('COUNTERS_TTL', 30))
+    COUNTERS_APPROXIMATE = os.environ.get('COUNTERS_APPROXIMATE', '').lower() in ('1', 'true', 'yes')
+    
+    # Log rollups: rows newer than the lag are left for the next run (their
+    # transactions may still be open); the dashboard folds in at most
+    # ROLLUP_REQUEST_MAX_ROWS new rows per view (0 = only `flask rollups run`)
+    ROLLUP_SAFETY_LAG = int(os.environ.get('ROLLUP_SAFETY_LAG', 60))
+    ROLLUP_REQUEST_MAX_ROWS = int(os.environ.get('ROLLUP_REQUEST_MAX_ROWS', 20000))
+    
+    # Activity log: rows are queued and inserted in batches by a background
+    # thread; when the queue is full the overflow policy applies ('sync'
+    # writes in the request, 'block' waits, 'drop' discards the event)
+    ACTIVITY_LOG_ASYNC = os.environ.get('ACTIVITY_LOG_ASYNC', '1').lower() in ('1', 'true', 'yes')
+    ACTIVITY_LOG_QUEUE_SIZE = int(os.environ.get('ACTIVITY_LOG_QUEUE_SIZE', 10000))
+    ACTIVITY_LOG_BATCH_SIZE = int(os.environ.get('ACTIVITY_LOG_BATCH_SIZE', 500))
+    ACTIVITY_LOG_FLUSH_INTERVAL = float(os.environ.get('ACTIVITY_LOG_FLUSH_INTERVAL', 2.0))
+    ACTIVITY_LOG_OVERFLOW = os.environ.get('ACTIVITY_LOG_OVERFLOW', 'sync')
+    ACTIVITY_LOG_BLOCK_TIMEOUT = float(os.environ.get('ACTIVITY_LOG_BLOCK_TIMEOUT', 0.5))
+    
+    # SQL instrumentation (opt-in): Server-Timing header and a JSON log line
+    # per request; statements repeated this many times are N+1 suspects
+    SQL_INSTRUMENTATION = os.environ.get('SQL_INSTRUMENTATION', '').lower() in ('1', 'true', 'yes')
+    SQL_N_PLUS_ONE_THRESHOLD = int(os.environ.get('SQL_N_PLUS_ONE_THRESHOLD', 5))
+    
+    # Log retention: rows older than LOG_RETENTION_DAYS (per-action overrides
+    # as "view=30,download=365"; 0 = keep forever) are archived to gzip JSONL
+    # files per day and deleted in batches with a pause between them
+    LOG_RETENTION_DAYS = int(os.environ.get('LOG_RETENTION_DAYS', 90))
+    LOG_RETENTION_ACTIONS = _days_by_action(os.environ.get('LOG_RETENTION_ACTIONS', ''))
+    LOG_RETENTION_BATCH_SIZE = int(os.environ.get('LOG_RETENTION_BATCH_SIZE', 2000))
+    LOG_RETENTION_PAUSE = float(os.environ.get('LOG_RETENTION_PAUSE', 0.2))
+    LOG_ARCHIVE_DIR = os.environ.get('LOG_ARCHIVE_DIR')
+    
+    # Popularity (score = reviews * weight + downloads * weight)
+    POPULARITY_REVIEW_WEIGHT = float(os.environ.get('POPULARITY_REVIEW_WEIGHT', 5.0))
+    POPULARITY_DOWNLOAD_WEIGHT = float(os.environ.get('POPULARITY_DOWNLOAD_WEIGHT', 1.0))
@@ -4,6 +4,14 @@ from wtforms import StringField, PasswordField, TextAreaField, SelectField, Inte
 from wtforms.validators import DataRequired, Email, EqualTo, Length, ValidationError, Optional, NumberRange
 from app.models import User, Author, Genre
 
+LANGUAGE_CHOICES = [
+    ('uk', 'Українська'),
+    ('en', 'English'),
+    ('ru', 'Русский'),
+    ('de', 'Deutsch'),
+    ('fr', 'Français')
+]
+
 class RegistrationForm(FlaskForm):
     username = StringField('Логін', validators=[
         DataRequired(message='Це поле обов\'язкове'),
@@ -51,13 +59,7 @@ class BookForm(FlaskForm):
     original_title = StringField('Оригінальна назва', validators=[Length(max=255)])
     description = TextAreaField('Опис')
     isbn = StringField('ISBN', validators=[Length(max=20)])
-    language = SelectField('Мова', choices=[
-        ('uk', 'Українська'),
-        ('en', 'English'),
-        ('ru', 'Русский'),
-        ('de', 'Deutsch'),
-        ('fr', 'Français')
-    ])
+    language = SelectField('Мова', choices=LANGUAGE_CHOICES)
     publisher = StringField('Видавництво', validators=[Length(max=200)])
     publication_year = IntegerField('Рік публікації', validators=[
         Optional(),
@@ -110,7 +112,8 @@ class SearchForm(FlaskForm):
         ('all', 'Всюди'),
         ('title', 'Назва книги'),
         ('author', 'Автор'),
-        ('isbn', 'ISBN')
+        ('isbn', 'ISBN'),
+        ('text', 'У тексті книги')
     ])
 
 class GenreForm(FlaskForm):
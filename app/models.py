@@ -1,11 +1,12 @@
 from datetime import datetime
+from flask import current_app
 from flask_login import UserMixin
 from werkzeug.security import generate_password_hash, check_password_hash
-from app import db, login_manager
+from app import db
 
-@login_manager.user_loader
-def load_user(user_id):
-    return User.query.get(int(user_id))
+def _default_rating_score():
+    # Книга без відгуків має рейтинг, що дорівнює апріорному середньому
+    return current_app.config['RATING_PRIOR_MEAN']
 
 class User(UserMixin, db.Model):
     __tablename__ = 'users'
@@ -17,9 +18,11 @@ class User(UserMixin, db.Model):
     first_name = db.Column(db.String(100))
     last_name = db.Column(db.String(100))
     role = db.Column(db.String(20), default='user', nullable=False)
-    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)
     last_login_at = db.Column(db.DateTime)
     is_active = db.Column(db.Boolean, default=True)
+    # Зростає з кожною зміною запису; кешовані знімки старших версій відкидаються (app/utils/identity.py)
+    version = db.Column(db.Integer, default=1, nullable=False)
     
     # Relationships
     favorites = db.relationship('Favorite', backref='user', lazy='dynamic', cascade='all, delete-orphan')
@@ -50,6 +53,8 @@ class Author(db.Model):
     death_date = db.Column(db.Date)
     country = db.Column(db.String(100))
     
+    __table_args__ = (db.Index('ix_authors_name', 'last_name', 'first_name'),)
+    
     # Relationships
     book_authors = db.relationship('BookAuthor', backref='author', lazy='dynamic', cascade='all, delete-orphan')
     
@@ -89,10 +94,24 @@ class Book(db.Model):
     publisher = db.Column(db.String(200))
     publication_year = db.Column(db.Integer)
     cover_image_path = db.Column(db.String(500))
+    # Зменшені копії обкладинки для srcset: [{'format': 'webp', 'images': [[160, path], ...]}, ...]
+    cover_variants = db.Column(db.JSON)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     is_active = db.Column(db.Boolean, default=True)
     
+    # Денормалізований рейтинг (підтримується в app/utils/ratings.py)
+    rating_sum = db.Column(db.Integer, default=0, nullable=False)
+    rating_count = db.Column(db.Integer, default=0, nullable=False)
+    # DOUBLE, а не FLOAT: значення повертається з курсора сторінок і порівнюється на рівність
+    rating_score = db.Column(db.Double, default=_default_rating_score, nullable=False)
+    
+    __table_args__ = (
+        db.Index('ix_books_active_rating', 'is_active', 'rating_score'),
+        db.Index('ix_books_active_created', 'is_active', 'created_at'),
+        db.Index('ix_books_active_title', 'is_active', 'title'),
+    )
+    
     # Relationships
     book_authors = db.relationship('BookAuthor', backref='book', lazy='dynamic', cascade='all, delete-orphan')
     book_genres = db.relationship('BookGenre', backref='book', lazy='dynamic', cascade='all, delete-orphan')
@@ -100,17 +119,17 @@ class Book(db.Model):
     favorites = db.relationship('Favorite', backref='book', lazy='dynamic', cascade='all, delete-orphan')
     reviews = db.relationship('Review', backref='book', lazy='dynamic', cascade='all, delete-orphan')
     logs = db.relationship('Log', backref='book', lazy='dynamic')
+    popularity = db.relationship('BookPopularity', backref='book', uselist=False, cascade='all, delete-orphan')
     
     @property
     def average_rating(self):
-        reviews = self.reviews.all()
-        if not reviews:
+        if not self.rating_count:
             return 0
-        return sum(r.rating for r in reviews) / len(reviews)
+        return self.rating_sum / self.rating_count
     
     @property
     def reviews_count(self):
-        return self.reviews.count()
+        return self.rating_count or 0
     
     def __repr__(self):
         return f'<Book {self.title}>'
@@ -124,7 +143,11 @@ class BookAuthor(db.Model):
     role = db.Column(db.String(50), default='author')
     order_index = db.Column(db.Integer, default=0)
     
-    __table_args__ = (db.UniqueConstraint('book_id', 'author_id', name='_book_author_uc'),)
+    __table_args__ = (
+        db.UniqueConstraint('book_id', 'author_id', name='_book_author_uc'),
+        db.Index('ix_book_authors_author', 'author_id', 'book_id'),
+        db.Index('ix_book_authors_book_order', 'book_id', 'order_index'),
+    )
     
     def __repr__(self):
         return f'<BookAuthor book_id={self.book_id} author_id={self.author_id}>'
@@ -136,7 +159,10 @@ class BookGenre(db.Model):
     book_id = db.Column(db.Integer, db.ForeignKey('books.id'), nullable=False)
     genre_id = db.Column(db.Integer, db.ForeignKey('genres.id'), nullable=False)
     
-    __table_args__ = (db.UniqueConstraint('book_id', 'genre_id', name='_book_genre_uc'),)
+    __table_args__ = (
+        db.UniqueConstraint('book_id', 'genre_id', name='_book_genre_uc'),
+        db.Index('ix_book_genres_genre', 'genre_id', 'book_id'),
+    )
     
     def __repr__(self):
         return f'<BookGenre book_id={self.book_id} genre_id={self.genre_id}>'
@@ -153,9 +179,51 @@ class File(db.Model):
     uploaded_at = db.Column(db.DateTime, default=datetime.utcnow)
     is_active = db.Column(db.Boolean, default=True)
     
+    __table_args__ = (db.Index('ix_files_book_active_format', 'book_id', 'is_active', 'format'),)
+    
     def __repr__(self):
         return f'<File {self.format} for book_id={self.book_id}>'
 
+class FileMetadata(db.Model):
+    """Метадані, прочитані з файлу книги (app/utils/metadata.py): пропозиції для форми редагування."""
+    __tablename__ = 'file_metadata'
+    
+    file_id = db.Column(db.Integer, db.ForeignKey('files.id', ondelete='CASCADE'), primary_key=True)
+    status = db.Column(db.String(16), default='done', nullable=False)  # done, failed, applied
+    title = db.Column(db.String(255))
+    authors = db.Column(db.JSON)  # [{'first_name': ..., 'middle_name': ..., 'last_name': ...}]
+    language = db.Column(db.String(10))
+    isbn = db.Column(db.String(20))
+    publisher = db.Column(db.String(200))
+    publication_year = db.Column(db.Integer)
+    cover_path = db.Column(db.String(500))  # вбудована обкладинка у сховищі (Blob)
+    error = db.Column(db.String(255))
+    extracted_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    file = db.relationship('File', backref=db.backref('extracted_metadata', uselist=False,
+                                                      cascade='all, delete-orphan'))
+    
+    @property
+    def author_names(self):
+        return [' '.join(part for part in (a.get('first_name'), a.get('middle_name'), a.get('last_name')) if part)
+                for a in self.authors or []]
+    
+    def __repr__(self):
+        return f'<FileMetadata file_id={self.file_id} {self.status}>'
+
+class Blob(db.Model):
+    """Вміст завантаженого файлу, спільний для всіх записів з однаковим SHA-256 (app/utils/storage.py)."""
+    __tablename__ = 'blobs'
+    
+    sha256 = db.Column(db.String(64), primary_key=True)
+    path = db.Column(db.String(500), nullable=False, unique=True)  # відносно static/
+    size = db.Column(db.BigInteger, nullable=False)
+    ref_count = db.Column(db.Integer, default=0, nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    def __repr__(self):
+        return f'<Blob {self.sha256[:12]} refs={self.ref_count}>'
+
 class Favorite(db.Model):
     __tablename__ = 'favorites'
     
@@ -164,7 +232,10 @@ class Favorite(db.Model):
     book_id = db.Column(db.Integer, db.ForeignKey('books.id'), nullable=False)
     added_at = db.Column(db.DateTime, default=datetime.utcnow)
     
-    __table_args__ = (db.UniqueConstraint('user_id', 'book_id', name='_user_book_favorite_uc'),)
+    __table_args__ = (
+        db.UniqueConstraint('user_id', 'book_id', name='_user_book_favorite_uc'),
+        db.Index('ix_favorites_user_added', 'user_id', 'added_at'),
+    )
     
     def __repr__(self):
         return f'<Favorite user_id={self.user_id} book_id={self.book_id}>'
@@ -183,12 +254,99 @@ class Review(db.Model):
     
     __table_args__ = (
         db.UniqueConstraint('user_id', 'book_id', name='_user_book_review_uc'),
-        db.CheckConstraint('rating >= 1 AND rating <= 5', name='rating_range')
+        db.CheckConstraint('rating >= 1 AND rating <= 5', name='rating_range'),
+        db.Index('ix_reviews_book_created', 'book_id', 'created_at'),
     )
     
     def __repr__(self):
         return f'<Review by user_id={self.user_id} for book_id={self.book_id}>'
 
+class BookPopularity(db.Model):
+    """Популярність книги: підтримується в app/utils/popularity.py."""
+    __tablename__ = 'book_popularity'
+    
+    book_id = db.Column(db.Integer, db.ForeignKey('books.id'), primary_key=True)
+    review_count = db.Column(db.Integer, default=0, nullable=False)
+    download_count = db.Column(db.Integer, default=0, nullable=False)
+    score = db.Column(db.Float, default=0, nullable=False)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    
+    __table_args__ = (db.Index('ix_book_popularity_score', 'score', 'book_id'),)
+    
+    def __repr__(self):
+        return f'<BookPopularity book_id={self.book_id} score={self.score}>'
+
+class StatCounter(db.Model):
+    """Лічильник рядків (підтримується в app/utils/counters.py)."""
+    __tablename__ = 'counters'
+    
+    name = db.Column(db.String(64), primary_key=True)
+    value = db.Column(db.BigInteger, default=0, nullable=False)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    
+    def __repr__(self):
+        return f'<StatCounter {self.name}={self.value}>'
+
+class LogRollupAction(db.Model):
+    """Кількість дій за годину/день/увесь час (app/utils/rollups.py)."""
+    __tablename__ = 'log_rollup_actions'
+    
+    granularity = db.Column(db.String(8), primary_key=True)
+    bucket = db.Column(db.DateTime, primary_key=True)
+    action = db.Column(db.String(50), primary_key=True)
+    count = db.Column(db.Integer, default=0, nullable=False)
+
+class LogRollupBook(db.Model):
+    __tablename__ = 'log_rollup_books'
+    
+    granularity = db.Column(db.String(8), primary_key=True)
+    bucket = db.Column(db.DateTime, primary_key=True)
+    book_id = db.Column(db.Integer, db.ForeignKey('books.id'), primary_key=True)
+    action = db.Column(db.String(50), primary_key=True)
+    count = db.Column(db.Integer, default=0, nullable=False)
+    
+    __table_args__ = (db.Index('ix_log_rollup_books_top', 'granularity', 'action', 'count'),)
+
+class LogRollupUser(db.Model):
+    __tablename__ = 'log_rollup_users'
+    
+    granularity = db.Column(db.String(8), primary_key=True)
+    bucket = db.Column(db.DateTime, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), primary_key=True)
+    count = db.Column(db.Integer, default=0, nullable=False)
+    
+    __table_args__ = (db.Index('ix_log_rollup_users_top', 'granularity', 'count'),)
+
+class RollupWatermark(db.Model):
+    """Останній id з logs, уже врахований у зведених таблицях."""
+    __tablename__ = 'rollup_watermarks'
+    
+    name = db.Column(db.String(64), primary_key=True)
+    last_log_id = db.Column(db.BigInteger, default=0, nullable=False)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+class MaintenanceJob(db.Model):
+    """Стан фонового завдання обслуговування (app/utils/jobs.py)."""
+    __tablename__ = 'maintenance_jobs'
+    
+    name = db.Column(db.String(64), primary_key=True)
+    status = db.Column(db.String(16), default='idle', nullable=False)  # running, done, failed
+    processed = db.Column(db.BigInteger, default=0, nullable=False)
+    total = db.Column(db.BigInteger)
+    message = db.Column(db.String(255))
+    started_at = db.Column(db.DateTime)
+    updated_at = db.Column(db.DateTime)
+    finished_at = db.Column(db.DateTime)
+    
+    @property
+    def percent(self):
+        if not self.total:
+            return None
+        return min(100, int(self.processed * 100 / self.total))
+    
+    def __repr__(self):
+        return f'<MaintenanceJob {self.name} {self.status}>'
+
 class Log(db.Model):
     __tablename__ = 'logs'
     
@@ -201,5 +359,11 @@ class Log(db.Model):
     ip_address = db.Column(db.String(45))
     user_agent = db.Column(db.String(500))
     
+    __table_args__ = (
+        db.Index('ix_logs_action_created', 'action', 'created_at'),
+        db.Index('ix_logs_user_created', 'user_id', 'created_at'),
+        db.Index('ix_logs_book_action', 'book_id', 'action'),
+    )
+    
     def __repr__(self):
         return f'<Log {self.action} at {self.created_at}>'
@@ -1,10 +1,14 @@
-from flask import Blueprint, render_template, redirect, url_for, flash, request
+from flask import Blueprint, Response, render_template, redirect, url_for, flash, request, current_app, abort
 from flask_login import login_required, current_user
-from sqlalchemy import func
 from app import db
-from app.models import User, Book, Author, Review, Log
+from app.models import User, Log
+from app.utils import rollups
+from app.utils.counters import counters
 from app.utils.decorators import admin_required
-from datetime import datetime, timedelta
+from app.utils.exports import (DATASETS, FORMATS, LOG_ORDER, MIMETYPES, apply_log_filters, export_chunks,
+                               export_filename)
+from app.utils.jobs import job_status, start_job
+from app.utils.pagination import keyset_paginate, cursor_url_args
 
 admin_bp = Blueprint('admin', __name__, url_prefix='/admin')
 
@@ -12,43 +16,32 @@ admin_bp = Blueprint('admin', __name__, url_prefix='/admin')
 @login_required
 @admin_required
 def dashboard():
-    # Основна статистика
+    # Дозбираємо нові записи журналу у зведені таблиці (не більше ліміту за запит)
+    max_rows = current_app.config['ROLLUP_REQUEST_MAX_ROWS']
+    if max_rows:
+        rollups.run_rollups(max_rows=max_rows)
+    
+    # Статистика за типами дій (за весь час, зі зведених таблиць)
+    action_stats = rollups.action_totals()
+    
+    # Основна статистика (з лічильників, без COUNT по таблицях)
+    counts = counters.snapshot()
     stats = {
-        'total_users': User.query.count(),
-        'total_books': Book.query.filter_by(is_active=True).count(),
-        'total_authors': Author.query.count(),
-        'total_reviews': Review.query.count(),
-        'total_downloads': Log.query.filter_by(action='download').count()
+        'total_users': counts['users'],
+        'total_books': counts['books'],
+        'total_authors': counts['authors'],
+        'total_reviews': counts['reviews'],
+        'total_downloads': dict(action_stats).get('download', 0)
     }
     
     # TOP 5 книг за завантаженнями
-    top_books = db.session.query(
-        Book, func.count(Log.id).label('downloads')
-    ).join(Log).filter(Log.action=='download')\
-     .group_by(Book.id)\
-     .order_by(func.count(Log.id).desc())\
-     .limit(5).all()
-    
-    # Статистика за типами дій
-    action_stats = db.session.query(
-        Log.action, func.count(Log.id).label('count')
-    ).group_by(Log.action).all()
+    top_books = rollups.top_books('download', limit=5)
     
     # Активність за останній тиждень
-    week_ago = datetime.utcnow() - timedelta(days=7)
-    recent_activity = db.session.query(
-        func.date(Log.created_at).label('date'),
-        func.count(Log.id).label('count')
-    ).filter(Log.created_at >= week_ago)\
-     .group_by(func.date(Log.created_at))\
-     .order_by(func.date(Log.created_at)).all()
+    recent_activity = rollups.daily_activity(days=7)
     
     # ТОП-5 активних користувачів
-    top_users = db.session.query(
-        User, func.count(Log.id).label('activity')
-    ).join(Log).group_by(User.id)\
-     .order_by(func.count(Log.id).desc())\
-     .limit(5).all()
+    top_users = rollups.top_users(limit=5)
     
     return render_template('admin/dashboard.html', 
                          stats=stats, 
@@ -91,55 +84,34 @@ def toggle_user(user_id):
 @login_required
 @admin_required
 def logs():
-    page = request.args.get('page', 1, type=int)
     action_filter = request.args.get('action')
     user_filter = request.args.get('user_id', type=int)
     date_from = request.args.get('date_from')
     date_to = request.args.get('date_to')
     
-    query = Log.query
-    
-    # Фільтр за дією
-    if action_filter:
-        query = query.filter_by(action=action_filter)
-    
-    # Фільтр за користувачем
-    if user_filter:
-        query = query.filter_by(user_id=user_filter)
-    
-    # Фільтр за датами
-    if date_from:
-        try:
-            date_from_obj = datetime.strptime(date_from, '%Y-%m-%d')
-            query = query.filter(Log.created_at >= date_from_obj)
-        except ValueError:
-            pass
-    
-    if date_to:
-        try:
-            date_to_obj = datetime.strptime(date_to, '%Y-%m-%d') + timedelta(days=1)
-            query = query.filter(Log.created_at < date_to_obj)
-        except ValueError:
-            pass
-    
-    pagination = query.order_by(Log.created_at.desc()).paginate(
-        page=page, per_page=50, error_out=False
+    # Фільтри за дією, користувачем і датами (ті самі, що й для експорту)
+    query = apply_log_filters(Log.query, action_filter, user_filter, date_from, date_to)
+    
+    pagination = keyset_paginate(
+        query, LOG_ORDER,
+        per_page=50,
+        after=request.args.get('after'),
+        before=request.args.get('before')
     )
     
     # Статистика логів
-    total_logs = Log.query.count()
-    downloads = Log.query.filter_by(action='download').count()
-    logins = Log.query.filter_by(action='login').count()
+    counts = counters.snapshot()
+    total_logs = counts['logs']
+    downloads = counts['logs:download']
+    logins = counts['logs:login']
     
     # Топ користувачів за активністю
-    top_users = db.session.query(
-        User, func.count(Log.id).label('activity_count')
-    ).join(Log).group_by(User.id)\
-     .order_by(func.count(Log.id).desc()).limit(5).all()
+    top_users = rollups.top_users(limit=5)
     
     return render_template('admin/logs.html', 
                          logs=pagination.items, 
                          pagination=pagination,
+                         url_args=cursor_url_args(),
                          total_logs=total_logs,
                          downloads=downloads,
                          logins=logins,
@@ -147,16 +119,46 @@ def logs():
                          action_filter=action_filter,
                          user_filter=user_filter,
                          date_from=date_from,
-                         date_to=date_to)
+                         date_to=date_to,
+                         retention_job=job_status('log_retention'))
 
 @admin_bp.route('/logs/clear', methods=['POST'])
 @login_required
 @admin_required
 def clear_logs():
-    """Очистити старі логи (старші за 90 днів)."""
-    days_ago = datetime.utcnow() - timedelta(days=90)
-    deleted = Log.query.filter(Log.created_at < days_ago).delete()
-    db.session.commit()
+    """Архівувати й видалити старі логи у фоні (терміни - LOG_RETENTION_*)."""
+    from app.utils.retention import purge_logs
     
-    flash(f'Видалено {deleted} старих записів логів.', 'success')
+    if start_job('log_retention', purge_logs):
+        flash('Очищення старих логів запущено у фоні.', 'success')
+    else:
+        flash('Очищення старих логів уже виконується.', 'info')
     return redirect(url_for('admin.logs'))
+
+@admin_bp.route('/export/<dataset>')
+@login_required
+@admin_required
+def export(dataset):
+    """Потоковий експорт логів, відгуків або каталогу у CSV/JSONL (?gzip=1 - стиснутий)."""
+    if dataset not in DATASETS:
+        abort(404)
+    file_format = request.args.get('format', 'csv')
+    if file_format not in FORMATS:
+        abort(400)
+    compress = request.args.get('gzip') == '1'
+    
+    # Для логів - ті самі фільтри, що й на сторінці логів
+    filters = {}
+    if dataset == 'logs':
+        filters = dict(action=request.args.get('action', ''),
+                       user_id=request.args.get('user_id', type=int),
+                       date_from=request.args.get('date_from', ''),
+                       date_to=request.args.get('date_to', ''))
+    
+    chunks = export_chunks(dataset, file_format, compress, **filters)
+    filename = export_filename(dataset, file_format, compress)
+    return Response(chunks,
+                    mimetype='application/gzip' if compress else MIMETYPES[file_format],
+                    headers={'Content-Disposition': f'attachment; filename={filename}',
+                             # nginx не буферизує відповідь - байти йдуть клієнту одразу
+                             'X-Accel-Buffering': 'no'})
@@ -0,0 +1,198 @@
+"""Read-only JSON API (/api/v1) for the mobile app and partner integrations.
+
+Books are fetched by id in batches (`?ids=1,2,3`) or page by page with the
+catalog's filters and keyset cursors; `fields=` selects what each book
+carries. A response costs a fixed number of queries whatever the number of
+books: one for the books (only the columns the fields need) and one per
+requested relation (authors, genres, files). ETag and Last-Modified are
+derived from the books' `updated_at`, so a conditional request is answered
+with 304 before the relations are loaded.
+"""
+import hashlib
+from flask import Blueprint, current_app, jsonify, request, url_for, abort
+from sqlalchemy.orm import load_only
+from werkzeug.exceptions import HTTPException
+from werkzeug.http import is_resource_modified
+from app.models import Book
+from app.utils.assets import assets
+from app.utils.catalog import SORTS, catalog_filters, catalog_order, filter_books
+from app.utils.pagination import keyset_paginate, cursor_url_args
+from app.utils.prefetch import authors_by_book, files_by_book, genres_by_book
+
+api_bp = Blueprint('api', __name__, url_prefix='/api/v1')
+
+# Поле -> стовпці books, потрібні для нього
+COLUMN_FIELDS = {
+    'title': (Book.title,),
+    'original_title': (Book.original_title,),
+    'description': (Book.description,),
+    'isbn': (Book.isbn,),
+    'language': (Book.language,),
+    'publisher': (Book.publisher,),
+    'publication_year': (Book.publication_year,),
+    'rating': (Book.rating_sum, Book.rating_count, Book.rating_score),
+    'cover': (Book.cover_image_path, Book.cover_variants),
+    'created_at': (Book.created_at,),
+    'updated_at': (Book.updated_at,),
+}
+# Поле -> завантаження пов'язаних записів для всіх книг одним запитом
+RELATION_FIELDS = {
+    'authors': authors_by_book,
+    'genres': genres_by_book,
+    'files': files_by_book,
+}
+FIELDS = ('id', *COLUMN_FIELDS, *RELATION_FIELDS, 'url')
+DEFAULT_FIELDS = ('id', 'title', 'authors', 'genres', 'language', 'publication_year', 'rating', 'cover', 'url')
+
+
+@api_bp.errorhandler(HTTPException)
+def json_error(error):
+    return jsonify(error=error.description), error.code
+
+
+def _parse_fields():
+    value = request.args.get('fields')
+    if not value:
+        return DEFAULT_FIELDS
+    fields = ['id']
+    for field in value.split(','):
+        field = field.strip()
+        if field not in FIELDS:
+            abort(400, f'Unknown field: {field}. Available: {", ".join(FIELDS)}')
+        if field not in fields:
+            fields.append(field)
+    return tuple(fields)
+
+
+def _parse_ids(value):
+    ids = []
+    for part in value.split(','):
+        try:
+            book_id = int(part)
+        except ValueError:
+            abort(400, f'Invalid book id: {part.strip()}')
+        if book_id not in ids:
+            ids.append(book_id)
+    limit = current_app.config['API_MAX_BATCH']
+    if len(ids) > limit:
+        abort(400, f'At most {limit} ids per request')
+    return ids
+
+
+def _books_query(fields, order_by=()):
+    """Active books with only the columns needed by `fields`, the key and the validators."""
+    columns = {Book.id, Book.updated_at}
+    for field in fields:
+        columns.update(COLUMN_FIELDS.get(field, ()))
+    columns.update(column for column, _ in order_by)
+    return Book.query.options(load_only(*columns)).filter(Book.is_active == True)
+
+
+def _rating(book):
+    average = book.rating_sum / book.rating_count if book.rating_count else None
+    return {'average': round(average, 2) if average is not None else None,
+            'count': book.rating_count,
+            'score': round(book.rating_score, 3)}
+
+
+def _cover(book):
+    if not book.cover_image_path:
+        return None
+    variants = [{'format': variant['format'],
+                 'images': [{'width': width, 'url': assets.url(path, external=True)}
+                            for width, path in variant['images']]}
+                for variant in book.cover_variants or []]
+    return {'url': assets.url(book.cover_image_path, external=True), 'variants': variants}
+
+
+def _value(book, field, related):
+    if field == 'id':
+        return book.id
+    if field == 'url':
+        return url_for('books.detail', book_id=book.id, _external=True)
+    if field == 'rating':
+        return _rating(book)
+    if field == 'cover':
+        return _cover(book)
+    if field == 'authors':
+        return [{'id': author.id, 'name': author.full_name} for author in related['authors'][book.id]]
+    if field == 'genres':
+        return [{'id': genre.id, 'name': genre.name} for genre in related['genres'][book.id]]
+    if field == 'files':
+        return [{'id': file.id, 'format': file.format, 'size': file.file_size,
+                 'url': url_for('books.download', book_id=book.id, file_id=file.id, _external=True)}
+                for file in related['files'][book.id]]
+    value = getattr(book, field)
+    return value.isoformat() if field in ('created_at', 'updated_at') and value else value
+
+
+def _serialize(books, fields):
+    related = {field: load(books) for field, load in RELATION_FIELDS.items() if field in fields}
+    return [{field: _value(book, field, related) for field in fields} for book in books]
+
+
+def _respond(books, build, *variant):
+    """JSON response with validators from the books' `updated_at`; 304 when the client has it.
+
+    `variant` (fields, cursors, ...) is mixed into the ETag: the same books
+    rendered differently are a different representation.
+    """
+    stamps = [(book.id, book.updated_at.isoformat() if book.updated_at else None) for book in books]
+    etag = hashlib.sha1(repr((stamps, variant)).encode()).hexdigest()
+    last_modified = max((book.updated_at for book in books if book.updated_at), default=None)
+
+    if not is_resource_modified(request.environ, etag=etag, last_modified=last_modified):
+        response = current_app.response_class(status=304)
+    else:
+        response = jsonify(build())
+    response.set_etag(etag)
+    if last_modified is not None:
+        response.last_modified = last_modified
+    # Кешувати можна, але щоразу з перевіркою (304 дешевий)
+    response.cache_control.no_cache = True
+    return response
+
+
+@api_bp.route('/books')
+def books():
+    """Книги за id (?ids=1,2,3) або сторінка каталогу з фільтрами та курсором."""
+    fields = _parse_fields()
+
+    ids = request.args.get('ids')
+    if ids:
+        book_ids = _parse_ids(ids)
+        found = {book.id: book for book in _books_query(fields).filter(Book.id.in_(book_ids))}
+        books = [found[book_id] for book_id in book_ids if book_id in found]
+        missing = [book_id for book_id in book_ids if book_id not in found]
+        return _respond(books, lambda: {'data': _serialize(books, fields), 'missing': missing},
+                        fields, missing)
+
+    sort_by = request.args.get('sort', 'recent')
+    if sort_by not in SORTS:
+        abort(400, f'Unknown sort: {sort_by}. Available: {", ".join(SORTS)}')
+    order_by = catalog_order(sort_by)
+    per_page = min(max(request.args.get('limit', current_app.config['API_PAGE_SIZE'], type=int), 1),
+                   current_app.config['API_MAX_PAGE_SIZE'])
+    query = filter_books(_books_query(fields, order_by), catalog_filters(request.args))
+    pagination = keyset_paginate(query, order_by, per_page=per_page,
+                                 after=request.args.get('after'), before=request.args.get('before'))
+
+    books = pagination.items
+    args = cursor_url_args()
+    links = {
+        'next': url_for('api.books', after=pagination.next_cursor, _external=True, **args)
+        if pagination.has_next else None,
+        'prev': url_for('api.books', before=pagination.prev_cursor, _external=True, **args)
+        if pagination.has_prev else None,
+    }
+    return _respond(books, lambda: {'data': _serialize(books, fields), 'links': links},
+                    fields, links)
+
+
+@api_bp.route('/books/<int:book_id>')
+def book(book_id):
+    fields = _parse_fields()
+    book = _books_query(fields).filter(Book.id == book_id).first()
+    if book is None:
+        abort(404, 'Book not found')
+    return _respond([book], lambda: {'data': _serialize([book], fields)[0]}, fields)
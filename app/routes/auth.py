@@ -2,8 +2,9 @@ from datetime import datetime
 from flask import Blueprint, render_template, redirect, url_for, flash, request
 from flask_login import login_user, logout_user, current_user
 from app import db
-from app.models import User, Log
+from app.models import User
 from app.forms import RegistrationForm, LoginForm
+from app.utils.activity import activity_log
 
 auth_bp = Blueprint('auth', __name__, url_prefix='/auth')
 
@@ -26,14 +27,7 @@ def register():
         db.session.commit()
         
         # Логування реєстрації
-        log = Log(
-            user_id=user.id,
-            action='register',
-            ip_address=request.remote_addr,
-            user_agent=request.user_agent.string
-        )
-        db.session.add(log)
-        db.session.commit()
+        activity_log.log('register', user_id=user.id)
         
         flash('Реєстрація успішна! Тепер ви можете увійти.', 'success')
         return redirect(url_for('auth.login'))
@@ -64,14 +58,7 @@ def login():
             login_user(user, remember=form.remember_me.data)
             
             # Логування входу
-            log = Log(
-                user_id=user.id,
-                action='login',
-                ip_address=request.remote_addr,
-                user_agent=request.user_agent.string
-            )
-            db.session.add(log)
-            db.session.commit()
+            activity_log.log('login', user_id=user.id)
             
             next_page = request.args.get('next')
             flash(f'Ласкаво просимо, {user.username}!', 'success')
@@ -85,14 +72,7 @@ def login():
 def logout():
     if current_user.is_authenticated:
         # Логування виходу
-        log = Log(
-            user_id=current_user.id,
-            action='logout',
-            ip_address=request.remote_addr,
-            user_agent=request.user_agent.string
-        )
-        db.session.add(log)
-        db.session.commit()
+        activity_log.log('logout', user_id=current_user.id)
     
     logout_user()
     flash('Ви успішно вийшли з системи.', 'info')
@@ -1,28 +1,41 @@
 from flask import Blueprint, render_template, redirect, url_for, flash, request, current_app
 from flask_login import login_required
+from sqlalchemy import select
 from app import db
 from app.models import Author, Book, BookAuthor
 from app.forms import AuthorForm
 from app.utils.decorators import admin_required
+from app.utils.cache import response_cache
+from app.utils.catalog import touch_books
+from app.utils.counters import counters
+from app.utils.search import search_index
+from app.utils.suggest import suggest_index
 
 authors_bp = Blueprint('authors', __name__, url_prefix='/authors')
 
 @authors_bp.route('/')
+@response_cache.cached('authors', 'books')
 def list_authors():
     page = request.args.get('page', 1, type=int)
     
+    counts = counters.snapshot()
+    
+    # Загальна кількість береться з лічильника замість COUNT(*) по authors
     pagination = Author.query.order_by(Author.last_name, Author.first_name).paginate(
         page=page,
         per_page=current_app.config['AUTHORS_PER_PAGE'],
-        error_out=False
+        error_out=False,
+        count=False
     )
+    pagination.total = counts['authors']
     
     return render_template('authors/list.html',
                          authors=pagination.items,
                          pagination=pagination,
-                         Book=Book)
+                         counts=counts)
 
 @authors_bp.route('/<int:author_id>')
+@response_cache.cached('authors', 'books', 'reviews')
 def detail(author_id):
     author = Author.query.get_or_404(author_id)
     
@@ -53,6 +66,8 @@ def create():
         
         db.session.add(author)
         db.session.commit()
+        suggest_index.put('author', author.id, author.full_name)
+        response_cache.invalidate('authors')
         
         flash('Автора додано!', 'success')
         return redirect(url_for('authors.detail', author_id=author.id))
@@ -75,7 +90,12 @@ def edit(author_id):
         author.death_date = form.death_date.data
         author.country = form.country.data
         
+        # Ім'я автора входить у дані його книг в API
+        touch_books(select(BookAuthor.book_id).where(BookAuthor.author_id == author.id))
         db.session.commit()
+        search_index.update_author(author.id)
+        suggest_index.put('author', author.id, author.full_name)
+        response_cache.invalidate('authors')
         
         flash('Автора оновлено!', 'success')
         return redirect(url_for('authors.detail', author_id=author.id))
@@ -95,6 +115,8 @@ def delete(author_id):
     
     db.session.delete(author)
     db.session.commit()
+    suggest_index.discard('author', author_id)
+    response_cache.invalidate('authors')
     
     flash('Автора видалено.', 'info')
     return redirect(url_for('authors.list_authors'))
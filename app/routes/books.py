@@ -1,50 +1,67 @@
-from flask import Blueprint, render_template, redirect, url_for, flash, request, current_app, send_file
+from flask import Blueprint, render_template, redirect, url_for, flash, request, current_app, abort
 from flask_login import login_required, current_user
 from werkzeug.utils import secure_filename
-from datetime import datetime
 import os
 from app import db
-from app.models import Book, File, Log, BookAuthor, BookGenre, Author, Genre
-from app.forms import BookForm
+from app.models import Book, File, FileMetadata, BookAuthor, BookGenre, Author, Genre
+from app.forms import BookForm, LANGUAGE_CHOICES
+from app.utils.activity import activity_log
+from app.utils.cache import response_cache
+from app.utils.catalog import catalog_filters, catalog_order, filter_books, touch_books
 from app.utils.decorators import admin_required
+from app.utils.downloads import file_response, is_new_download
+from app.utils.prefetch import authors_by_book
+from app.utils.pagination import keyset_paginate, cursor_url_args
+from app.utils.facets import facet_index
+from app.utils.fulltext import content_index
+from app.utils.metadata import apply_suggestion, metadata_extractor
+from app.utils.search import search_index
+from app.utils.storage import extension_of, release, static_path, store
+from app.utils.thumbnails import cover_thumbnails
+from app.utils.suggest import suggest_index
 
 books_bp = Blueprint('books', __name__, url_prefix='/books')
 
 @books_bp.route('/')
+@response_cache.cached('books', 'authors', 'genres', 'reviews')
 def catalog():
-    page = request.args.get('page', 1, type=int)
-    genre_id = request.args.get('genre')
-    language = request.args.get('language')
+    filters = catalog_filters(request.args)
     sort_by = request.args.get('sort', 'recent')
     
-    query = Book.query.filter_by(is_active=True)
+    query = filter_books(Book.query.filter_by(is_active=True), filters)
     
-    # Фільтри
-    if genre_id:
-        query = query.join(Book.book_genres).filter_by(genre_id=genre_id)
-    if language:
-        query = query.filter_by(language=language)
+    # Кількості для панелі фільтрів рахуються по бітових масках, без SQL
+    facets = facet_index.select(filters.genres, filters.genre_mode, filters.languages,
+                                filters.year_from, filters.year_to, filters.formats)
     
-    # Сортування
-    if sort_by == 'rating':
-        # TODO: сортування за рейтингом
-        pass
-    elif sort_by == 'title':
-        query = query.order_by(Book.title)
-    else:  # recent
-        query = query.order_by(Book.created_at.desc())
+    order_by = catalog_order(sort_by)
     
-    pagination = query.paginate(
-        page=page,
+    pagination = keyset_paginate(
+        query, order_by,
         per_page=current_app.config['BOOKS_PER_PAGE'],
-        error_out=False
+        after=request.args.get('after'),
+        before=request.args.get('before')
     )
     
     return render_template('books/catalog.html',
                          books=pagination.items,
-                         pagination=pagination)
+                         authors_by_book=authors_by_book(pagination.items),
+                         pagination=pagination,
+                         url_args=cursor_url_args(),
+                         facets=facets,
+                         genres=Genre.query.order_by(Genre.name).all(),
+                         languages=LANGUAGE_CHOICES,
+                         selected={
+                             'genre': filters.genres,
+                             'genre_mode': filters.genre_mode,
+                             'language': filters.languages,
+                             'format': filters.formats,
+                             'year_from': filters.year_from,
+                             'year_to': filters.year_to,
+                         })
 
 @books_bp.route('/<int:book_id>')
+@response_cache.cached('book:{book_id}', 'authors', 'genres')
 def detail(book_id):
     book = Book.query.get_or_404(book_id)
     
@@ -54,15 +71,7 @@ def detail(book_id):
     
     # Логування перегляду книги
     if current_user.is_authenticated:
-        log = Log(
-            user_id=current_user.id,
-            book_id=book_id,
-            action='view',
-            ip_address=request.remote_addr,
-            user_agent=request.user_agent.string
-        )
-        db.session.add(log)
-        db.session.commit()
+        activity_log.log('view', user_id=current_user.id, book_id=book_id)
     
     return render_template('books/detail.html', book=book)
 
@@ -77,25 +86,21 @@ def download(book_id, file_id):
         return redirect(url_for('books.detail', book_id=book_id))
     
     # Правильний повний шлях до файлу
-    file_path = os.path.join(current_app.root_path, 'static', file.file_path.replace('/', os.sep))
+    file_path = static_path(file.file_path)
     
     if not os.path.exists(file_path):
         flash('Файл не знайдено на сервері.', 'danger')
         return redirect(url_for('books.detail', book_id=book_id))
     
-    # Логування
-    log = Log(
-        user_id=current_user.id,
-        book_id=book_id,
-        file_id=file_id,
-        action='download',
-        ip_address=request.remote_addr,
-        user_agent=request.user_agent.string
-    )
-    db.session.add(log)
-    db.session.commit()
+    # Файли зберігаються під іменем-хешем, тож ім'я для збереження будується з назви книги
+    response = file_response(file, file_path, download_name=f'{book.title}.{file.format}')
     
-    return send_file(file_path, as_attachment=True)
+    # Логування (популярність книги оновлюється разом із записом журналу);
+    # 304 і продовження перерваного завантаження не рахуються вдруге
+    if response.status_code != 304 and is_new_download():
+        activity_log.log('download', user_id=current_user.id, book_id=book_id, file_id=file_id)
+    
+    return response
 
 @books_bp.route('/create', methods=['GET', 'POST'])
 @login_required
@@ -114,19 +119,10 @@ def create():
             publication_year=form.publication_year.data
         )
         
-        # Обробка завантаження обкладинки
+        # Обробка завантаження обкладинки (однаковий вміст зберігається один раз)
         if form.cover_image.data:
             file = form.cover_image.data
-            filename = secure_filename(file.filename)
-            
-            covers_folder = os.path.join(current_app.config['UPLOAD_FOLDER'], 'covers')
-            os.makedirs(covers_folder, exist_ok=True)
-            
-            unique_filename = f"{datetime.now().strftime('%Y%m%d%H%M%S')}_{filename}"
-            file_path = os.path.join(covers_folder, unique_filename)
-            file.save(file_path)
-            
-            book.cover_image_path = f'uploads/covers/{unique_filename}'
+            book.cover_image_path = store(file.stream, extension_of(file.filename)).path
         
         db.session.add(book)
         db.session.flush()  # Отримати ID книги
@@ -142,17 +138,16 @@ def create():
             db.session.add(book_genre)
         
         db.session.commit()
+        search_index.update_book(book.id)
+        facet_index.update_book(book.id)
+        suggest_index.put('book', book.id, book.title)
+        response_cache.invalidate('books', f'book:{book.id}')
+        # Зменшені копії обкладинки готуються у фоні
+        if form.cover_image.data:
+            cover_thumbnails.schedule(book)
         
         # Логування створення книги
-        log = Log(
-            user_id=current_user.id,
-            book_id=book.id,
-            action='create_book',
-            ip_address=request.remote_addr,
-            user_agent=request.user_agent.string
-        )
-        db.session.add(log)
-        db.session.commit()
+        activity_log.log('create_book', user_id=current_user.id, book_id=book.id)
         
         flash('Книга успішно додана!', 'success')
         return redirect(url_for('books.detail', book_id=book.id))
@@ -180,24 +175,13 @@ def edit(book_id):
         book.publisher = form.publisher.data or None
         book.publication_year = form.publication_year.data
         
-        # Обробка нової обкладинки
+        # Обробка нової обкладинки (стара видаляється, коли на неї більше ніщо не посилається)
         if form.cover_image.data:
             file = form.cover_image.data
-            filename = secure_filename(file.filename)
-            
-            covers_folder = os.path.join(current_app.config['UPLOAD_FOLDER'], 'covers')
-            os.makedirs(covers_folder, exist_ok=True)
-            
-            unique_filename = f"{datetime.now().strftime('%Y%m%d%H%M%S')}_{filename}"
-            file_path = os.path.join(covers_folder, unique_filename)
-            file.save(file_path)
-            
-            if book.cover_image_path:
-                old_path = os.path.join(current_app.root_path, 'static', book.cover_image_path)
-                if os.path.exists(old_path):
-                    os.remove(old_path)
-            
-            book.cover_image_path = f'uploads/covers/{unique_filename}'
+            old_cover = book.cover_image_path
+            book.cover_image_path = store(file.stream, extension_of(file.filename)).path
+            book.cover_variants = None
+            release(old_cover)
         
         # Оновити авторів
         BookAuthor.query.filter_by(book_id=book.id).delete()
@@ -211,23 +195,58 @@ def edit(book_id):
             book_genre = BookGenre(book_id=book.id, genre_id=genre_id)
             db.session.add(book_genre)
         
+        # Зміна лише авторів чи жанрів теж має змінити updated_at (ETag в API)
+        touch_books([book.id])
         db.session.commit()
+        search_index.update_book(book.id)
+        facet_index.update_book(book.id)
+        suggest_index.put('book', book.id, book.title)
+        response_cache.invalidate('books', f'book:{book.id}')
+        if form.cover_image.data:
+            cover_thumbnails.schedule(book)
         
         # Логування редагування
-        log = Log(
-            user_id=current_user.id,
-            book_id=book.id,
-            action='edit_book',
-            ip_address=request.remote_addr,
-            user_agent=request.user_agent.string
-        )
-        db.session.add(log)
-        db.session.commit()
+        activity_log.log('edit_book', user_id=current_user.id, book_id=book.id)
         
         flash('Книга оновлена!', 'success')
         return redirect(url_for('books.detail', book_id=book.id))
     
-    return render_template('books/edit.html', form=form, book=book)
+    suggestions = FileMetadata.query.join(File)\
+        .filter(File.book_id == book.id, FileMetadata.status.in_(['done', 'failed']))\
+        .order_by(File.id).all()
+    return render_template('books/edit.html', form=form, book=book, suggestions=suggestions)
+
+@books_bp.route('/<int:book_id>/metadata/<int:file_id>/apply', methods=['POST'])
+@login_required
+@admin_required
+def apply_metadata(book_id, file_id):
+    book = Book.query.get_or_404(book_id)
+    metadata = FileMetadata.query.get_or_404(file_id)
+    if metadata.file.book_id != book.id:
+        abort(404)
+    
+    cover = book.cover_image_path
+    applied, new_authors = apply_suggestion(book, metadata)
+    if applied:
+        touch_books([book.id])
+    db.session.commit()
+    
+    for author in new_authors:
+        suggest_index.put('author', author.id, author.full_name)
+    search_index.update_book(book.id)
+    facet_index.update_book(book.id)
+    suggest_index.put('book', book.id, book.title)
+    response_cache.invalidate('books', 'authors', f'book:{book.id}')
+    if book.cover_image_path != cover:
+        cover_thumbnails.schedule(book)
+    
+    activity_log.log('edit_book', user_id=current_user.id, book_id=book.id)
+    
+    if applied:
+        flash('Дані з файлу застосовано до книги.', 'success')
+    else:
+        flash('У файлі не знайдено даних, які можна застосувати.', 'warning')
+    return redirect(url_for('books.edit', book_id=book.id))
 
 @books_bp.route('/<int:book_id>/delete', methods=['POST'])
 @login_required
@@ -235,17 +254,14 @@ def edit(book_id):
 def delete(book_id):
     book = Book.query.get_or_404(book_id)
     book.is_active = False
+    db.session.commit()
     
     # Логування видалення
-    log = Log(
-        user_id=current_user.id,
-        book_id=book.id,
-        action='delete_book',
-        ip_address=request.remote_addr,
-        user_agent=request.user_agent.string
-    )
-    db.session.add(log)
-    db.session.commit()
+    activity_log.log('delete_book', user_id=current_user.id, book_id=book.id)
+    search_index.update_book(book.id)
+    facet_index.update_book(book.id)
+    suggest_index.discard('book', book.id)
+    response_cache.invalidate('books', f'book:{book.id}')
     
     flash('Книга видалена.', 'info')
     return redirect(url_for('books.catalog'))
@@ -263,10 +279,7 @@ def upload_files(book_id):
             flash('Файли не вибрано.', 'warning')
             return redirect(request.url)
         
-        # Правильний шлях до папки uploads/books
-        upload_folder = os.path.join(current_app.root_path, 'static', 'uploads', 'books')
-        os.makedirs(upload_folder, exist_ok=True)
-        
+        uploaded = []
         for file in files:
             if file and file.filename:
                 filename = secure_filename(file.filename)
@@ -276,23 +289,31 @@ def upload_files(book_id):
                     flash(f'Формат {file_format} не підтримується.', 'danger')
                     continue
                 
-                # Унікальне ім'я файлу
-                unique_filename = f"{book.id}_{datetime.now().strftime('%Y%m%d%H%M%S')}_{filename}"
-                file_path = os.path.join(upload_folder, unique_filename)
-                
-                file.save(file_path)
+                # Вміст зберігається за SHA-256; однакові файли різних книг спільні
+                stored = store(file.stream, file_format)
                 
                 # Зберегти в БД відносний шлях
                 db_file = File(
                     book_id=book.id,
-                    file_path=os.path.join('uploads', 'books', unique_filename).replace('\\', '/'),
+                    file_path=stored.path,
                     format=file_format,
-                    file_size=os.path.getsize(file_path),
+                    file_size=stored.size,
+                    checksum=stored.sha256,
                     is_active=True
                 )
                 db.session.add(db_file)
+                uploaded.append(db_file)
         
+        if uploaded:
+            touch_books([book.id])
         db.session.commit()
+        facet_index.update_book(book.id)
+        response_cache.invalidate('books', f'book:{book.id}')
+        # Метадані (назва, автори, ISBN, обкладинка) читаються з файлів у фоні
+        for db_file in uploaded:
+            metadata_extractor.schedule(db_file)
+        # Текст EPUB/FB2 потрапляє в повнотекстовий індекс (теж у фоні)
+        content_index.schedule(uploaded)
         flash('Файли успішно завантажено!', 'success')
         return redirect(url_for('books.detail', book_id=book.id))
     
@@ -305,16 +326,20 @@ def delete_file(file_id):
     file = File.query.get_or_404(file_id)
     book_id = file.book_id
     
-    # Видалити фізичний файл
-    file_path = os.path.join(current_app.root_path, 'static', file.file_path.replace('/', os.sep))
-    if os.path.exists(file_path):
-        try:
-            os.remove(file_path)
-        except Exception as e:
-            flash(f'Помилка при видаленні файлу: {e}', 'danger')
+    # Видалити фізичний файл, якщо інші записи не посилаються на той самий вміст
+    try:
+        release(file.file_path)
+        if file.extracted_metadata is not None:
+            release(file.extracted_metadata.cover_path)
+    except OSError as e:
+        flash(f'Помилка при видаленні файлу: {e}', 'danger')
     
     db.session.delete(file)
+    touch_books([book_id])
     db.session.commit()
+    content_index.remove([file_id])
+    facet_index.update_book(book_id)
+    response_cache.invalidate('books', f'book:{book_id}')
     
     flash('Файл видалено.', 'info')
     return redirect(url_for('books.upload_files', book_id=book_id))
@@ -1,13 +1,20 @@
 from flask import Blueprint, render_template, redirect, url_for, flash, request, current_app
 from flask_login import login_required
+from sqlalchemy import select
 from app import db
 from app.models import Genre, Book, BookGenre
 from app.forms import GenreForm
 from app.utils.decorators import admin_required
+from app.utils.prefetch import authors_by_book
+from app.utils.pagination import keyset_paginate, cursor_url_args
+from app.utils.cache import response_cache
+from app.utils.catalog import NO_FILTERS, catalog_order, filter_books, touch_books
+from app.utils.suggest import suggest_index
 
 genres_bp = Blueprint('genres', __name__, url_prefix='/genres')
 
 @genres_bp.route('/')
+@response_cache.cached('genres', 'books')
 def list_all():
     page = request.args.get('page', 1, type=int)
     
@@ -22,25 +29,28 @@ def list_all():
                          pagination=pagination)
 
 @genres_bp.route('/<int:genre_id>')
+@response_cache.cached('genres', 'books', 'authors', 'reviews')
 def detail(genre_id):
     genre = Genre.query.get_or_404(genre_id)
     
-    # Отримати книги цього жанру
-    page = request.args.get('page', 1, type=int)
-    books_query = Book.query.join(Book.book_genres)\
-        .filter(BookGenre.genre_id == genre_id)\
-        .filter(Book.is_active == True)
+    # Книги жанру через EXISTS, як у фільтрі каталогу: сторінка читається
+    # по ix_books_active_title без сортування результату з'єднання
+    books_query = filter_books(Book.query.filter(Book.is_active == True),
+                               NO_FILTERS._replace(genres=[genre_id]))
     
-    pagination = books_query.paginate(
-        page=page,
+    pagination = keyset_paginate(
+        books_query, catalog_order('title'),
         per_page=current_app.config['BOOKS_PER_PAGE'],
-        error_out=False
+        after=request.args.get('after'),
+        before=request.args.get('before')
     )
     
     return render_template('genres/detail.html', 
                          genre=genre, 
                          books=pagination.items,
-                         pagination=pagination)
+                         authors_by_book=authors_by_book(pagination.items),
+                         pagination=pagination,
+                         url_args=cursor_url_args())
 
 @genres_bp.route('/create', methods=['GET', 'POST'])
 @login_required
@@ -56,6 +66,8 @@ def create():
         
         db.session.add(genre)
         db.session.commit()
+        suggest_index.put('genre', genre.id, genre.name)
+        response_cache.invalidate('genres')
         
         flash('Жанр успішно додано!', 'success')
         return redirect(url_for('genres.detail', genre_id=genre.id))
@@ -73,7 +85,11 @@ def edit(genre_id):
         genre.name = form.name.data
         genre.description = form.description.data
         
+        # Назва жанру входить у дані його книг в API
+        touch_books(select(BookGenre.book_id).where(BookGenre.genre_id == genre.id))
         db.session.commit()
+        suggest_index.put('genre', genre.id, genre.name)
+        response_cache.invalidate('genres')
         
         flash('Жанр оновлено!', 'success')
         return redirect(url_for('genres.detail', genre_id=genre.id))
@@ -94,6 +110,8 @@ def delete(genre_id):
     
     db.session.delete(genre)
     db.session.commit()
+    suggest_index.discard('genre', genre_id)
+    response_cache.invalidate('genres')
     
     flash('Жанр видалено.', 'info')
     return redirect(url_for('genres.list_genres'))
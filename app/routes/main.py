@@ -1,34 +1,35 @@
-from flask import Blueprint, render_template, request, redirect, url_for, current_app
-from app.models import Book, Author, Genre, Review, User, Log
+from flask import Blueprint, render_template, request, redirect, url_for, current_app, jsonify
+from app.models import Book
 from app.forms import SearchForm
-from sqlalchemy import func
+from app.utils.prefetch import authors_by_book, books_by_ids
+from app.utils.cache import response_cache
+from app.utils.counters import counters
+from app.utils.fulltext import content_index
+from app.utils.pagination import ListPagination
+from app.utils.popularity import popular_books
+from app.utils.search import search_index
+from app.utils.suggest import suggest_index
 
 main_bp = Blueprint('main', __name__)
 
 @main_bp.route('/')
+@response_cache.cached('books', 'authors', 'reviews')
 def index():
     # Останні додані книги
     recent_books = Book.query.filter_by(is_active=True)\
         .order_by(Book.created_at.desc()).limit(6).all()
     
-    # Популярні книги (за кількістю відгуків)
-    popular_books = Book.query.filter_by(is_active=True)\
-        .outerjoin(Review, Review.book_id == Book.id)\
-        .group_by(Book.id)\
-        .order_by(func.count(Review.id).desc())\
-        .limit(6).all()
+    # Популярні книги (відгуки та завантаження, таблиця book_popularity)
+    popular = popular_books(6)
     
     return render_template('index.html', 
                          recent_books=recent_books,
-                         popular_books=popular_books)
+                         popular_books=popular,
+                         authors_by_book=authors_by_book(recent_books))
 
 @main_bp.route('/about')
 def about():
-    return render_template('about.html', 
-                         Book=Book,
-                         Author=Author, 
-                         User=User,
-                         Log=Log)
+    return render_template('about.html', counts=counters.snapshot())
 
 @main_bp.route('/search')
 def search():
@@ -39,21 +40,48 @@ def search():
     if not query:
         return redirect(url_for('main.index'))
     
-    books_query = Book.query.filter_by(is_active=True)
-    
-    if search_type == 'title' or search_type == 'all':
-        books_query = books_query.filter(Book.title.contains(query))
-    
-    # TODO: Додати пошук по авторам та ISBN
-    
-    pagination = books_query.paginate(
-        page=page, 
-        per_page=current_app.config['BOOKS_PER_PAGE'],
-        error_out=False
+    # Ранжований список id з індексу (BM25); з БД читаємо лише поточну сторінку
+    text_hits = {}
+    if search_type == 'text':
+        # Пошук фрази в тексті файлів книг; з розділами, де вона трапляється
+        text_hits = dict(content_index.search(query))
+        ranked_ids = list(text_hits)
+    else:
+        ranked_ids = search_index.search(query, search_type)
+    pagination = ListPagination(
+        ranked_ids,
+        page=page,
+        per_page=current_app.config['BOOKS_PER_PAGE']
     )
+    books = books_by_ids(pagination.items)
     
     return render_template('search_results.html',
-                         books=pagination.items,
+                         books=books,
+                         authors_by_book=authors_by_book(books),
                          pagination=pagination,
+                         text_hits=text_hits,
                          query=query,
                          search_type=search_type)
+
+@main_bp.route('/suggest')
+def suggest():
+    """Підказки для поля пошуку (JSON)."""
+    query = request.args.get('q', '')
+    limit = min(request.args.get('limit', 8, type=int), 20)
+    
+    endpoints = {
+        'book': ('books.detail', 'book_id'),
+        'author': ('authors.detail', 'author_id'),
+        'genre': ('genres.detail', 'genre_id'),
+    }
+    items = []
+    for kind, item_id, label in suggest_index.suggest(query, limit=limit):
+        endpoint, arg = endpoints[kind]
+        items.append({
+            'type': kind,
+            'id': item_id,
+            'label': label,
+            'url': url_for(endpoint, **{arg: item_id})
+        })
+    
+    return jsonify(query=query, items=items)
@@ -1,8 +1,12 @@
-from flask import Blueprint, render_template, redirect, url_for, flash, request
+from flask import Blueprint, render_template, redirect, url_for, flash
 from flask_login import login_required, current_user
 from app import db
-from app.models import Review, Book, Log
+from app.models import Review, Book
 from app.forms import ReviewForm
+from app.utils.activity import activity_log
+from app.utils.cache import response_cache
+from app.utils.popularity import record_popularity
+from app.utils.ratings import apply_rating_change
 
 reviews_bp = Blueprint('reviews', __name__, url_prefix='/reviews')
 
@@ -33,18 +37,13 @@ def create(book_id):
         )
         
         db.session.add(review)
+        apply_rating_change(book_id, review.rating, 1)
+        record_popularity(book_id, reviews=1)
         db.session.commit()
+        response_cache.invalidate('reviews', f'book:{book_id}')
         
         # Логування додавання відгуку
-        log = Log(
-            user_id=current_user.id,
-            book_id=book_id,
-            action='add_review',
-            ip_address=request.remote_addr,
-            user_agent=request.user_agent.string
-        )
-        db.session.add(log)
-        db.session.commit()
+        activity_log.log('add_review', user_id=current_user.id, book_id=book_id)
         
         flash('Дякуємо за відгук!', 'success')
         return redirect(url_for('books.detail', book_id=book_id))
@@ -63,11 +62,16 @@ def edit(review_id):
     form = ReviewForm(obj=review)
     
     if form.validate_on_submit():
+        old_rating = review.rating
         review.rating = int(form.rating.data)
         review.title = form.title.data
         review.review_text = form.review_text.data
         
+        if review.rating != old_rating:
+            apply_rating_change(review.book_id, review.rating - old_rating)
+        
         db.session.commit()
+        response_cache.invalidate('reviews', f'book:{review.book_id}')
         
         flash('Відгук оновлено!', 'success')
         return redirect(url_for('books.detail', book_id=review.book_id))
@@ -85,7 +89,10 @@ def delete(review_id):
     
     book_id = review.book_id
     db.session.delete(review)
+    apply_rating_change(book_id, -review.rating, -1)
+    record_popularity(book_id, reviews=-1)
     db.session.commit()
+    response_cache.invalidate('reviews', f'book:{book_id}')
     
     flash('Відгук видалено.', 'info')
     return redirect(url_for('books.detail', book_id=book_id))
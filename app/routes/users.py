@@ -1,7 +1,10 @@
 from flask import Blueprint, render_template, redirect, url_for, flash, request
 from flask_login import login_required, current_user
+from sqlalchemy.orm import contains_eager
 from app import db
-from app.models import Favorite, Book, Log
+from app.models import Favorite, Book
+from app.utils.activity import activity_log
+from app.utils.prefetch import authors_by_book
 
 users_bp = Blueprint('users', __name__, url_prefix='/users')
 
@@ -15,9 +18,12 @@ def profile():
 def favorites():
     favorites = Favorite.query.filter_by(user_id=current_user.id)\
         .join(Book).filter(Book.is_active==True)\
+        .options(contains_eager(Favorite.book))\
         .order_by(Favorite.added_at.desc()).all()
     
-    return render_template('users/favorites.html', favorites=favorites)
+    return render_template('users/favorites.html',
+                         favorites=favorites,
+                         authors_by_book=authors_by_book([fav.book for fav in favorites]))
 
 @users_bp.route('/favorites/add/<int:book_id>', methods=['POST'])
 @login_required
@@ -34,17 +40,10 @@ def add_favorite(book_id):
     else:
         favorite = Favorite(user_id=current_user.id, book_id=book_id)
         db.session.add(favorite)
+        db.session.commit()
         
         # Логування додавання в обране
-        log = Log(
-            user_id=current_user.id,
-            book_id=book_id,
-            action='add_favorite',
-            ip_address=request.remote_addr,
-            user_agent=request.user_agent.string
-        )
-        db.session.add(log)
-        db.session.commit()
+        activity_log.log('add_favorite', user_id=current_user.id, book_id=book_id)
         
         flash('Додано до обраного!', 'success')
     
@@ -59,17 +58,10 @@ def remove_favorite(book_id):
     ).first_or_404()
     
     db.session.delete(favorite)
+    db.session.commit()
     
     # Логування видалення з обраного
-    log = Log(
-        user_id=current_user.id,
-        book_id=book_id,
-        action='remove_favorite',
-        ip_address=request.remote_addr,
-        user_agent=request.user_agent.string
-    )
-    db.session.add(log)
-    db.session.commit()
+    activity_log.log('remove_favorite', user_id=current_user.id, book_id=book_id)
     
     flash('Видалено з обраного.', 'info')
     return redirect(request.referrer or url_for('users.favorites'))
@@ -37,3 +37,52 @@ function updateStarDisplay(rating) {
         container.textContent = stars;
     }
 }
+
+// Підказки для пошуку в навігації
+document.addEventListener('DOMContentLoaded', function() {
+    const input = document.querySelector('input[data-suggest-url]');
+    if (!input) return;
+    const menu = input.parentElement.querySelector('[data-suggest-menu]');
+    const icons = { book: 'bi-book', author: 'bi-person', genre: 'bi-bookmark' };
+    let timer = null;
+    let controller = null;
+
+    function hide() {
+        menu.classList.remove('show');
+        menu.innerHTML = '';
+    }
+
+    input.addEventListener('input', function() {
+        clearTimeout(timer);
+        const query = input.value.trim();
+        if (query.length < 2) {
+            hide();
+            return;
+        }
+        timer = setTimeout(function() {
+            if (controller) controller.abort();
+            controller = new AbortController();
+            fetch(input.dataset.suggestUrl + '?q=' + encodeURIComponent(query), { signal: controller.signal })
+                .then(response => response.json())
+                .then(data => {
+                    menu.innerHTML = '';
+                    data.items.forEach(item => {
+                        const link = document.createElement('a');
+                        link.className = 'dropdown-item text-truncate';
+                        link.href = item.url;
+                        const icon = document.createElement('i');
+                        icon.className = 'bi ' + icons[item.type] + ' me-2';
+                        link.appendChild(icon);
+                        link.appendChild(document.createTextNode(item.label));
+                        menu.appendChild(link);
+                    });
+                    menu.classList.toggle('show', data.items.length > 0);
+                })
+                .catch(() => {});
+        }, 150);
+    });
+
+    input.addEventListener('blur', function() {
+        setTimeout(hide, 200);
+    });
+});
@@ -0,0 +1,198 @@
+"""Activity log writer: routes enqueue events, a background thread inserts them.
+
+`activity_log.log(action, ...)` captures the request details and puts the
+event on a bounded in-memory queue, so a page view or download no longer
+waits for its own INSERT and COMMIT. A daemon thread per worker process
+collects events until ACTIVITY_LOG_BATCH_SIZE are waiting or
+ACTIVITY_LOG_FLUSH_INTERVAL seconds have passed, then writes the batch
+with one multi-row INSERT. The same transaction adjusts the log counters
+and the download popularity, which the ORM hooks no longer see because
+the insert bypasses the session.
+
+When the queue is full, ACTIVITY_LOG_OVERFLOW decides what happens:
+'sync' writes the event directly in the request, 'block' waits up to
+ACTIVITY_LOG_BLOCK_TIMEOUT seconds for room and 'drop' discards it.
+Pending events are written at interpreter exit; events still queued when
+a process is killed are lost. With ACTIVITY_LOG_ASYNC off every event
+is written immediately (useful for tests and CLI commands).
+"""
+import atexit
+import os
+import queue
+import threading
+import time
+from collections import Counter
+from datetime import datetime
+from flask import has_request_context, request
+from sqlalchemy import insert
+from app import db
+from app.models import Log
+from app.utils.counters import LOG_ACTION_PREFIX, apply_deltas
+from app.utils.popularity import record_popularity
+
+OVERFLOW_POLICIES = ('sync', 'block', 'drop')
+# Маркер зупинки фонового потоку
+_STOP = object()
+
+
+class ActivityLog:
+    """Queue of pending log rows and the thread that writes them."""
+
+    def __init__(self):
+        self._app = None
+        self._queue = None
+        self._thread = None
+        self._pid = None
+        self._lock = threading.Lock()
+        self.dropped = 0
+
+    def init_app(self, app):
+        overflow = app.config['ACTIVITY_LOG_OVERFLOW']
+        if overflow not in OVERFLOW_POLICIES:
+            raise ValueError(f'Unknown ACTIVITY_LOG_OVERFLOW: {overflow}')
+        self._app = app
+        self._queue = None
+        self._thread = None
+        atexit.register(self.shutdown)
+
+    @property
+    def _config(self):
+        return self._app.config
+
+    # --- постановка в чергу ---
+
+    def log(self, action, user_id=None, book_id=None, file_id=None):
+        """Record an action; the row is written later by the background thread."""
+        row = {
+            'user_id': user_id,
+            'book_id': book_id,
+            'file_id': file_id,
+            'action': action,
+            'created_at': datetime.utcnow(),
+            'ip_address': None,
+            'user_agent': None,
+        }
+        if has_request_context():
+            row['ip_address'] = request.remote_addr
+            row['user_agent'] = (request.user_agent.string or '')[:500] or None
+
+        if not self._config['ACTIVITY_LOG_ASYNC']:
+            self.write([row])
+            return
+
+        events = self._ensure_worker()
+        overflow = self._config['ACTIVITY_LOG_OVERFLOW']
+        try:
+            if overflow == 'block':
+                events.put(row, timeout=self._config['ACTIVITY_LOG_BLOCK_TIMEOUT'])
+            else:
+                events.put_nowait(row)
+        except queue.Full:
+            if overflow == 'sync':
+                self.write([row])
+            else:
+                with self._lock:
+                    self.dropped += 1
+
+    def _ensure_worker(self):
+        # Після fork (gunicorn --preload) потік батьківського процесу не існує
+        pid = os.getpid()
+        if self._thread is None or self._pid != pid or not self._thread.is_alive():
+            with self._lock:
+                if self._thread is None or self._pid != pid or not self._thread.is_alive():
+                    if self._queue is None or self._pid != pid:
+                        self._queue = queue.Queue(self._config['ACTIVITY_LOG_QUEUE_SIZE'])
+                    self._pid = pid
+                    self._thread = threading.Thread(target=self._run, args=(self._queue,),
+                                                    name='activity-log', daemon=True)
+                    self._thread.start()
+        return self._queue
+
+    # --- фоновий запис ---
+
+    def _run(self, events):
+        batch_size = self._config['ACTIVITY_LOG_BATCH_SIZE']
+        interval = self._config['ACTIVITY_LOG_FLUSH_INTERVAL']
+        stopping = False
+        while not stopping:
+            first = events.get()
+            if first is _STOP:
+                break
+            batch = [first]
+            deadline = time.monotonic() + interval
+            while len(batch) < batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    row = events.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                if row is _STOP:
+                    stopping = True
+                    break
+                batch.append(row)
+            self._write_logged(batch)
+
+    def _write_logged(self, batch):
+        try:
+            with self._app.app_context():
+                self.write(batch)
+        except Exception:
+            self._app.logger.exception('Failed to write %d activity log rows', len(batch))
+        if self.dropped:
+            with self._lock:
+                dropped, self.dropped = self.dropped, 0
+            self._app.logger.warning('Activity log queue full: %d events dropped', dropped)
+
+    def write(self, rows):
+        """Insert log rows in one transaction together with their counter updates."""
+        if not rows:
+            return
+        deltas = Counter()
+        downloads = Counter()
+        for row in rows:
+            deltas['logs'] += 1
+            deltas[LOG_ACTION_PREFIX + row['action']] += 1
+            if row['action'] == 'download' and row['book_id'] is not None:
+                downloads[row['book_id']] += 1
+
+        with db.engine.begin() as connection:
+            connection.execute(insert(Log), rows)
+            apply_deltas(connection, deltas)
+            for book_id, count in sorted(downloads.items()):
+                record_popularity(book_id, downloads=count, connection=connection)
+
+    def flush(self):
+        """Write everything queued so far from the calling thread."""
+        events = self._queue
+        if events is None or self._pid != os.getpid():
+            return 0
+        batch = []
+        while True:
+            try:
+                row = events.get_nowait()
+            except queue.Empty:
+                break
+            if row is not _STOP:
+                batch.append(row)
+        for start in range(0, len(batch), self._config['ACTIVITY_LOG_BATCH_SIZE']):
+            self._write_logged(batch[start:start + self._config['ACTIVITY_LOG_BATCH_SIZE']])
+        return len(batch)
+
+    def shutdown(self, timeout=5):
+        """Stop the thread after it writes its current batch, then flush the rest."""
+        thread = self._thread
+        if thread is None or self._pid != os.getpid():
+            return
+        if thread.is_alive():
+            try:
+                self._queue.put(_STOP, timeout=timeout)
+            except queue.Full:
+                pass
+            thread.join(timeout)
+        self._thread = None
+        self.flush()
+
+
+activity_log = ActivityLog()
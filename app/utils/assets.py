@@ -0,0 +1,169 @@
+"""Fingerprinted, precompressed static assets with immutable caching.
+
+`flask assets build` copies every file of ASSET_DIRS to static/dist/
+under a name that contains a hash of its content
+(css/style.3f2a9c1b7e04.css), writes gzip and, if the optional `brotli`
+module is installed, brotli versions next to it, and records the mapping
+in static/dist/manifest.json. Templates link assets with
+`asset_url('css/style.css')`, which gives the fingerprinted URL when the
+manifest lists the file and the plain static URL otherwise (development,
+no build yet). Earlier builds are kept, so pages cached with old URLs
+keep working, until `--prune`.
+
+A fingerprinted file never changes, and neither do the content-addressed
+uploads (uploads/blobs, uploads/derived). The static view serves them
+with `Cache-Control: public, max-age=ASSETS_MAX_AGE, immutable`, so
+repeat visits do not request them at all. For clients that accept it,
+the precompressed version is sent with `Content-Encoding` and
+`Vary: Accept-Encoding`.
+"""
+import gzip
+import hashlib
+import json
+import mimetypes
+import os
+import threading
+from flask import current_app, request, send_from_directory, url_for
+from werkzeug.security import safe_join
+from app.utils.storage import BLOB_PREFIX, DERIVED_PREFIX
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover - необов'язкова залежність
+    brotli = None
+
+ASSET_DIRS = ('css', 'js', 'images')
+DIST_DIR = 'dist'
+MANIFEST = f'{DIST_DIR}/manifest.json'
+IMMUTABLE_PREFIXES = (f'{DIST_DIR}/', f'{BLOB_PREFIX}/', f'{DERIVED_PREFIX}/')
+COMPRESSIBLE = {'.css', '.js', '.json', '.map', '.svg', '.txt'}
+# Порядок переваги кодувань
+ENCODINGS = (('br', '.br'), ('gzip', '.gz'))
+
+
+def _write(path, data):
+    temp = f'{path}.{os.getpid()}.tmp'
+    with open(temp, 'wb') as f:
+        f.write(data)
+    os.replace(temp, path)
+
+
+def _fingerprinted(relative, digest):
+    root, extension = os.path.splitext(relative)
+    return f'{DIST_DIR}/{root}.{digest[:12]}{extension}'
+
+
+def build_assets(static_folder):
+    """Write the fingerprinted and precompressed copies and the manifest; returns the manifest."""
+    manifest = {}
+    for directory in ASSET_DIRS:
+        for root, _, names in os.walk(os.path.join(static_folder, directory)):
+            for name in sorted(names):
+                if name.startswith('.'):
+                    continue
+                source = os.path.join(root, name)
+                relative = os.path.relpath(source, static_folder).replace(os.sep, '/')
+                with open(source, 'rb') as f:
+                    data = f.read()
+                target_path = _fingerprinted(relative, hashlib.sha256(data).hexdigest())
+                manifest[relative] = target_path
+                target = os.path.join(static_folder, target_path.replace('/', os.sep))
+                if os.path.exists(target):
+                    continue
+                os.makedirs(os.path.dirname(target), exist_ok=True)
+                _write(target, data)
+                if os.path.splitext(name)[1].lower() not in COMPRESSIBLE:
+                    continue
+                # Стиснена версія зберігається, лише якщо вона менша
+                compressed = {'.gz': gzip.compress(data, 9, mtime=0)}
+                if brotli is not None:
+                    compressed['.br'] = brotli.compress(data, quality=11)
+                for suffix, content in compressed.items():
+                    if len(content) < len(data):
+                        _write(target + suffix, content)
+    _write(os.path.join(static_folder, MANIFEST.replace('/', os.sep)),
+           json.dumps(manifest, indent=2, sort_keys=True).encode('utf-8'))
+    return manifest
+
+
+def prune_assets(static_folder, manifest):
+    """Delete fingerprinted files of earlier builds; returns how many were removed."""
+    keep = {os.path.join(static_folder, path.replace('/', os.sep)) for path in manifest.values()}
+    keep.add(os.path.join(static_folder, MANIFEST.replace('/', os.sep)))
+    removed = 0
+    for root, _, names in os.walk(os.path.join(static_folder, DIST_DIR)):
+        for name in names:
+            path = os.path.join(root, name)
+            base = path[:-3] if path.endswith(('.gz', '.br')) else path
+            if base not in keep:
+                os.remove(path)
+                removed += 1
+    return removed
+
+
+class Assets:
+    """`asset_url()` for templates and the static view with immutable caching."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._manifest = {}
+        self._source = None
+
+    def init_app(self, app):
+        app.add_template_global(self.url, 'asset_url')
+        app.view_functions['static'] = send_static
+
+    def manifest(self):
+        """The manifest of the last build; reloaded when the file changes."""
+        path = os.path.join(current_app.static_folder, MANIFEST.replace('/', os.sep))
+        try:
+            source = (path, os.stat(path).st_mtime_ns)
+        except FileNotFoundError:
+            source = None
+        if source != self._source:
+            with self._lock:
+                if source != self._source:
+                    manifest = {}
+                    if source is not None:
+                        with open(path, encoding='utf-8') as f:
+                            manifest = json.load(f)
+                    self._manifest, self._source = manifest, source
+        return self._manifest
+
+    def url(self, filename, external=False):
+        return url_for('static', filename=self.manifest().get(filename, filename), _external=external)
+
+
+def _accepted_encoding(static_folder, filename):
+    """(encoding, suffix) of the best precompressed file the client accepts, or None."""
+    accepted = request.accept_encodings
+    for encoding, suffix in ENCODINGS:
+        path = safe_join(static_folder, filename + suffix)
+        if accepted[encoding] and path is not None and os.path.isfile(path):
+            return encoding, suffix
+    return None
+
+
+def send_static(filename):
+    """Replacement of Flask's static view: fingerprinted files are cached for good."""
+    if not filename.startswith(IMMUTABLE_PREFIXES):
+        return current_app.send_static_file(filename)
+
+    static_folder = current_app.static_folder
+    max_age = current_app.config['ASSETS_MAX_AGE']
+    chosen = _accepted_encoding(static_folder, filename) if filename.startswith(DIST_DIR + '/') else None
+    if chosen is None:
+        response = send_from_directory(static_folder, filename, max_age=max_age)
+    else:
+        encoding, suffix = chosen
+        mimetype = mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+        response = send_from_directory(static_folder, filename + suffix, mimetype=mimetype, max_age=max_age)
+        response.content_encoding = encoding
+    if filename.startswith(DIST_DIR + '/') and os.path.splitext(filename)[1].lower() in COMPRESSIBLE:
+        response.vary.add('Accept-Encoding')
+    response.cache_control.public = True
+    response.cache_control.immutable = True
+    return response
+
+
+assets = Assets()
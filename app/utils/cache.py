@@ -0,0 +1,267 @@
+"""Response cache for public pages viewed by anonymous users.
+
+Rendered pages are stored in a pluggable backend together with the versions
+of the tags they depend on ('books', 'book:5', 'authors'...). Write routes
+call `response_cache.invalidate(...)`, which gives those tags new versions,
+so stale entries are never served again and simply age out.
+"""
+import hashlib
+import os
+import pickle
+import tempfile
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from functools import wraps
+from flask import request, session, make_response
+from flask_login import current_user
+
+# Тег, від якого залежить кожна закешована сторінка (для clear())
+ALL_TAG = 'all'
+# Заголовки, що стосуються конкретного клієнта, а не сторінки
+_SKIP_HEADERS = {'set-cookie', 'content-length', 'etag', 'date'}
+
+
+class NullCache:
+    """Backend that stores nothing (CACHE_TYPE = 'null')."""
+
+    def get(self, key):
+        return None
+
+    def get_many(self, keys):
+        return [None] * len(keys)
+
+    def set(self, key, value, timeout=None):
+        pass
+
+    def delete(self, key):
+        pass
+
+
+class MemoryCache:
+    """LRU cache with per-entry TTL, private to one worker process.
+
+    Entries stored with timeout=0 never expire and are not evicted (used
+    for tag versions, which must outlive the pages depending on them).
+    """
+
+    def __init__(self, max_entries=1000, default_timeout=300):
+        self.max_entries = max_entries
+        self.default_timeout = default_timeout
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self._persistent = {}
+
+    def get(self, key):
+        with self._lock:
+            if key in self._persistent:
+                return self._persistent[key]
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires, value = entry
+            if expires < time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def get_many(self, keys):
+        return [self.get(key) for key in keys]
+
+    def set(self, key, value, timeout=None):
+        timeout = self.default_timeout if timeout is None else timeout
+        with self._lock:
+            if timeout == 0:
+                self._persistent[key] = value
+                return
+            self._entries[key] = (time.monotonic() + timeout, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._persistent.pop(key, None)
+            self._entries.pop(key, None)
+
+
+class FileSystemCache:
+    """Cache in a directory shared by all worker processes of one host.
+
+    Each entry is a pickle file written atomically (temp file + rename).
+    When the directory holds more than `max_entries` files, the least
+    recently written entries are removed.
+    """
+    _PERSISTENT_PREFIX = 'p-'
+    _PRUNE_EVERY = 100
+
+    def __init__(self, cache_dir, max_entries=1000, default_timeout=300):
+        self.cache_dir = cache_dir
+        self.max_entries = max_entries
+        self.default_timeout = default_timeout
+        self._writes = 0
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def _path(self, key, persistent=False):
+        name = hashlib.sha1(key.encode('utf-8')).hexdigest()
+        if persistent:
+            name = self._PERSISTENT_PREFIX + name
+        return os.path.join(self.cache_dir, name)
+
+    def _read(self, path):
+        try:
+            with open(path, 'rb') as f:
+                expires, value = pickle.load(f)
+        except (OSError, EOFError, pickle.UnpicklingError):
+            return None
+        if expires and expires < time.time():
+            return None
+        return value
+
+    def get(self, key):
+        value = self._read(self._path(key, persistent=True))
+        if value is None:
+            value = self._read(self._path(key))
+        return value
+
+    def get_many(self, keys):
+        return [self.get(key) for key in keys]
+
+    def set(self, key, value, timeout=None):
+        timeout = self.default_timeout if timeout is None else timeout
+        path = self._path(key, persistent=timeout == 0)
+        expires = time.time() + timeout if timeout else 0
+        fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir, prefix='.tmp-')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                pickle.dump((expires, value), f, pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_path, path)
+        except OSError:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            return
+        self._writes += 1
+        if self._writes % self._PRUNE_EVERY == 0:
+            self._prune()
+
+    def delete(self, key):
+        for path in (self._path(key, persistent=True), self._path(key)):
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+    def _prune(self):
+        entries = []
+        for entry in os.scandir(self.cache_dir):
+            if entry.name.startswith((self._PERSISTENT_PREFIX, '.tmp-')):
+                continue
+            try:
+                entries.append((entry.stat().st_mtime, entry.path))
+            except FileNotFoundError:
+                continue
+        excess = len(entries) - self.max_entries
+        if excess <= 0:
+            return
+        # Найстаріші записи першими (з однаковим TTL вони й спливають першими)
+        for _, path in sorted(entries)[:excess]:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+
+class ResponseCache:
+    """Caches whole responses of anonymous GET requests, keyed by URL."""
+
+    def __init__(self):
+        self.backend = NullCache()
+
+    def init_app(self, app):
+        cache_type = app.config['CACHE_TYPE']
+        timeout = app.config['CACHE_DEFAULT_TIMEOUT']
+        max_entries = app.config['CACHE_MAX_ENTRIES']
+        if cache_type == 'memory':
+            self.backend = MemoryCache(max_entries, timeout)
+        elif cache_type == 'filesystem':
+            cache_dir = app.config['CACHE_DIR'] or os.path.join(app.instance_path, 'cache')
+            self.backend = FileSystemCache(cache_dir, max_entries, timeout)
+        elif cache_type == 'null':
+            self.backend = NullCache()
+        else:
+            raise ValueError(f'Unknown CACHE_TYPE: {cache_type}')
+
+    # --- теги ---
+
+    def _tag_versions(self, tags):
+        keys = [f'tag:{tag}' for tag in tags]
+        versions = self.backend.get_many(keys)
+        for i, version in enumerate(versions):
+            if version is None:
+                # Тег ще не має версії: присвоюємо її, щоб наступна інвалідація її змінила
+                versions[i] = uuid.uuid4().hex
+                self.backend.set(keys[i], versions[i], timeout=0)
+        return versions
+
+    def invalidate(self, *tags):
+        """Make every cached page depending on any of `tags` stale."""
+        for tag in tags:
+            self.backend.set(f'tag:{tag}', uuid.uuid4().hex, timeout=0)
+
+    def clear(self):
+        """Make every cached page stale (e.g. after a bulk data change)."""
+        self.invalidate(ALL_TAG)
+
+    # --- кешування відповідей ---
+
+    @staticmethod
+    def _cacheable():
+        # Сторінка з flash-повідомленнями адресована конкретному відвідувачу
+        return (request.method == 'GET'
+                and not current_user.is_authenticated
+                and not session.get('_flashes'))
+
+    def cached(self, *tags, timeout=None):
+        """Decorator for views whose anonymous responses can be shared.
+
+        Tags may reference view arguments, e.g. 'book:{book_id}'.
+        """
+        def decorator(view):
+            @wraps(view)
+            def wrapper(*args, **kwargs):
+                if not self._cacheable():
+                    return view(*args, **kwargs)
+
+                key = f'view:{request.full_path}'
+                versions = self._tag_versions([ALL_TAG] + [tag.format(**kwargs) for tag in tags])
+                entry = self.backend.get(key)
+                if entry is not None and entry['versions'] == versions:
+                    response = make_response(entry['body'], entry['status'], entry['headers'])
+                    response.set_etag(entry['etag'])
+                    response.headers['X-Cache'] = 'HIT'
+                else:
+                    response = make_response(view(*args, **kwargs))
+                    if response.status_code == 200 and not response.is_streamed and self._cacheable():
+                        body = response.get_data()
+                        etag = hashlib.sha1(body).hexdigest()
+                        response.set_etag(etag)
+                        self.backend.set(key, {
+                            'versions': versions,
+                            'status': response.status_code,
+                            'headers': [(name, value) for name, value in response.headers
+                                        if name.lower() not in _SKIP_HEADERS],
+                            'body': body,
+                            'etag': etag,
+                        }, timeout)
+                    response.headers['X-Cache'] = 'MISS'
+
+                response.vary.add('Cookie')
+                response.cache_control.no_cache = True
+                return response.make_conditional(request)
+            return wrapper
+        return decorator
+
+
+response_cache = ResponseCache()
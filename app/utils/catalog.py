@@ -0,0 +1,66 @@
+"""Catalog filters and orderings shared by the catalog page and the JSON API."""
+from collections import namedtuple
+from datetime import datetime
+from sqlalchemy import update
+from app import db
+from app.models import Book, BookGenre, File
+
+CatalogFilters = namedtuple('CatalogFilters', 'genres genre_mode languages formats year_from year_to')
+
+SORTS = ('recent', 'rating', 'title')
+
+# Без фільтрів; окремий фільтр задається через NO_FILTERS._replace(genres=[...])
+NO_FILTERS = CatalogFilters(genres=[], genre_mode='or', languages=[], formats=[], year_from=None, year_to=None)
+
+
+def catalog_filters(args):
+    """Read the catalog filters from request arguments (a MultiDict)."""
+    return CatalogFilters(
+        genres=args.getlist('genre', type=int),
+        genre_mode='and' if args.get('genre_mode') == 'and' else 'or',
+        languages=args.getlist('language'),
+        formats=[fmt.lower() for fmt in args.getlist('format')],
+        year_from=args.get('year_from', type=int),
+        year_to=args.get('year_to', type=int),
+    )
+
+
+def filter_books(query, filters):
+    """Apply CatalogFilters to a Book query."""
+    # EXISTS замість JOIN: книга не дублюється при кількох жанрах
+    if filters.genres:
+        if filters.genre_mode == 'and':
+            for genre_id in filters.genres:
+                query = query.filter(Book.book_genres.any(BookGenre.genre_id == genre_id))
+        else:
+            query = query.filter(Book.book_genres.any(BookGenre.genre_id.in_(filters.genres)))
+    if filters.languages:
+        query = query.filter(Book.language.in_(filters.languages))
+    if filters.year_from is not None:
+        query = query.filter(Book.publication_year >= filters.year_from)
+    if filters.year_to is not None:
+        query = query.filter(Book.publication_year <= filters.year_to)
+    if filters.formats:
+        query = query.filter(Book.files.any(db.and_(File.is_active == True, File.format.in_(filters.formats))))
+    return query
+
+
+def catalog_order(sort):
+    """Keyset ordering [(column, descending), ...] for a catalog sort ('recent' by default)."""
+    # Останній стовпець ключа — id, щоб курсор був унікальним
+    if sort == 'rating':
+        # Байєсівський рейтинг зберігається в books.rating_score (індекс ix_books_active_rating)
+        return [(Book.rating_score, True), (Book.id, True)]
+    if sort == 'title':
+        return [(Book.title, False), (Book.id, False)]
+    return [(Book.created_at, True), (Book.id, True)]
+
+
+def touch_books(book_ids):
+    """Bump `updated_at` of books whose authors, genres or files changed.
+
+    `book_ids` is a list of ids or a select of them. The API's ETag and
+    Last-Modified come from `updated_at`, so changes to related rows must
+    move it too. Runs in the current transaction.
+    """
+    db.session.execute(update(Book).where(Book.id.in_(book_ids)).values(updated_at=datetime.utcnow()))
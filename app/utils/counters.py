@@ -0,0 +1,145 @@
+"""Site-wide row counters maintained on writes, read from a cached snapshot.
+
+Every ORM flush that inserts or deletes books, authors, users, reviews or
+log records (or activates/deactivates a book) adjusts the matching rows of
+the `counters` table in the same transaction. Pages read a per-process
+snapshot of that table, refreshed every COUNTERS_TTL seconds, instead of
+running COUNT(*) queries. Bulk deletes bypass the ORM, so code doing them
+calls `counters.recount(...)` afterwards.
+"""
+import threading
+import time
+from collections import defaultdict
+from datetime import datetime
+from flask import current_app
+from sqlalchemy import bindparam, delete, event, func, insert, inspect, text
+from sqlalchemy.orm import Session
+from app import db
+from app.models import Author, Book, Log, Review, StatCounter, User
+from app.utils.helpers import execute_upsert
+
+LOG_ACTION_PREFIX = 'logs:'
+# Лічильники, що відповідають цілим таблицям (для наближеного режиму)
+TABLE_COUNTERS = {'authors': 'authors', 'users': 'users', 'reviews': 'reviews', 'logs': 'logs'}
+
+
+class Counts(dict):
+    """Counter values; missing counters read as 0 (also from templates)."""
+
+    def __missing__(self, name):
+        return 0
+
+
+def _counter_names(obj):
+    if isinstance(obj, Book):
+        return ['books'] if obj.is_active else []
+    if isinstance(obj, Author):
+        return ['authors']
+    if isinstance(obj, User):
+        return ['users']
+    if isinstance(obj, Review):
+        return ['reviews']
+    if isinstance(obj, Log):
+        return ['logs', LOG_ACTION_PREFIX + obj.action]
+    return []
+
+
+def _after_flush(session, flush_context):
+    deltas = defaultdict(int)
+    for obj in session.new:
+        for name in _counter_names(obj):
+            deltas[name] += 1
+    for obj in session.deleted:
+        for name in _counter_names(obj):
+            deltas[name] -= 1
+    for obj in session.dirty:
+        if isinstance(obj, Book):
+            history = inspect(obj).attrs.is_active.history
+            if history.has_changes():
+                was_active = bool(history.deleted and history.deleted[0])
+                deltas['books'] += int(bool(obj.is_active)) - int(was_active)
+
+    deltas = {name: delta for name, delta in deltas.items() if delta}
+    if deltas:
+        apply_deltas(session.connection(), deltas)
+
+
+def apply_deltas(connection, deltas):
+    """Add {name: delta} to the counters (rows are created when missing)."""
+    table = StatCounter.__table__
+    now = datetime.utcnow()
+    for name, delta in sorted(deltas.items()):
+        execute_upsert(connection, table,
+                       {'name': name, 'value': delta, 'updated_at': now}, 'name',
+                       {'value': table.c.value + delta, 'updated_at': now})
+
+
+class Counters:
+    """Per-process snapshot of the counters table."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._snapshot = None
+        self._taken_at = 0
+
+    def init_app(self, app):
+        if not event.contains(Session, 'after_flush', _after_flush):
+            event.listen(Session, 'after_flush', _after_flush)
+
+    def _table_statistics(self):
+        """Approximate row counts from MySQL table statistics (no table scan)."""
+        if db.session.get_bind().dialect.name != 'mysql':
+            return {}
+        rows = db.session.execute(text(
+            'SELECT TABLE_NAME, TABLE_ROWS FROM information_schema.TABLES '
+            'WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME IN :names'
+        ).bindparams(bindparam('names', expanding=True)), {'names': list(TABLE_COUNTERS.values())})
+        by_table = {table_name: table_rows for table_name, table_rows in rows}
+        return {name: by_table[table_name] for name, table_name in TABLE_COUNTERS.items()
+                if by_table.get(table_name) is not None}
+
+    def snapshot(self):
+        """All counters as a Counts dict, at most COUNTERS_TTL seconds old."""
+        ttl = current_app.config['COUNTERS_TTL']
+        snapshot = self._snapshot
+        if snapshot is None or time.monotonic() - self._taken_at > ttl:
+            values = Counts(db.session.query(StatCounter.name, StatCounter.value))
+            if current_app.config['COUNTERS_APPROXIMATE']:
+                values.update(self._table_statistics())
+            with self._lock:
+                self._snapshot = snapshot = values
+                self._taken_at = time.monotonic()
+        return snapshot
+
+    def get(self, name):
+        return self.snapshot()[name]
+
+    def invalidate(self):
+        with self._lock:
+            self._snapshot = None
+
+    def recount(self, scope=None):
+        """Recompute counters with COUNT queries ('logs' limits it to log counters)."""
+        exact = {}
+        if scope is None:
+            exact['books'] = db.session.query(func.count(Book.id)).filter(Book.is_active == True).scalar()
+            exact['authors'] = db.session.query(func.count(Author.id)).scalar()
+            exact['users'] = db.session.query(func.count(User.id)).scalar()
+            exact['reviews'] = db.session.query(func.count(Review.id)).scalar()
+        by_action = dict(db.session.query(Log.action, func.count(Log.id)).group_by(Log.action))
+        exact['logs'] = sum(by_action.values())
+        for action, count in by_action.items():
+            exact[LOG_ACTION_PREFIX + action] = count
+
+        # Лічильники дій, яких більше немає в журналі, теж видаляються
+        stale = StatCounter.name.in_(list(exact)) | StatCounter.name.like(LOG_ACTION_PREFIX + '%')
+        now = datetime.utcnow()
+        db.session.execute(delete(StatCounter).where(stale))
+        db.session.execute(insert(StatCounter), [
+            {'name': name, 'value': value, 'updated_at': now} for name, value in exact.items()])
+        db.session.commit()
+        self.invalidate()
+        return exact
+
+
+counters = Counters()
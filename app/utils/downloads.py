@@ -0,0 +1,77 @@
+"""Delivery of book files: conditional GET, ranges and offloading to the web server.
+
+Authorization and the activity log stay in the view; this module only
+builds the response. DOWNLOAD_DELIVERY selects who sends the bytes:
+
+- 'send_file': the Python worker streams the file (werkzeug handles
+  Range and If-Range itself);
+- 'x-accel': nginx, through an `X-Accel-Redirect` to the internal
+  location DOWNLOAD_ACCEL_PREFIX that maps to the `static` directory;
+- 'x-sendfile': Apache mod_xsendfile or lighttpd, through `X-Sendfile`
+  with the absolute path.
+
+In 'send_file' mode the ETag is the SHA-256 of the file (File.checksum,
+computed at upload and import; `flask files checksums` fills it in for
+older files) and Last-Modified is File.uploaded_at. With X-Accel-Redirect nginx drops
+those upstream headers and sends its own mtime-based validators, and the
+client sends them back in If-None-Match and If-Range. So in the offload
+modes the response carries no validators from here, and conditional and
+Range requests are left to the web server.
+"""
+import mimetypes
+import os
+import unicodedata
+from urllib.parse import quote
+from flask import current_app, request, send_file
+
+DELIVERY_MODES = ('send_file', 'x-accel', 'x-sendfile')
+
+
+def is_new_download():
+    """False for requests that continue a download already counted (resumed ranges, HEAD).
+
+    In the offload modes the web server answers revalidations itself, so a
+    request with If-None-Match or If-Modified-Since is not counted: the
+    view cannot tell whether the server will send the file or a 304.
+    """
+    if request.method != 'GET':
+        return False
+    if current_app.config['DOWNLOAD_DELIVERY'] != 'send_file' and (
+            request.if_none_match or request.if_modified_since):
+        return False
+    ranges = request.range
+    return ranges is None or not ranges.ranges or ranges.ranges[0][0] == 0
+
+
+def _content_disposition(name):
+    # Як у werkzeug.send_file: не-ASCII ім'я передається у filename*
+    try:
+        name.encode('ascii')
+        return {'filename': name}
+    except UnicodeEncodeError:
+        simple = unicodedata.normalize('NFKD', name).encode('ascii', 'ignore').decode('ascii')
+        return {'filename': simple, 'filename*': f"UTF-8''{quote(name, safe='!#$&+-.^_`|~')}"}
+
+
+def file_response(file, path, download_name=None):
+    """Response that delivers `file` (stored at `path`) as an attachment named `download_name`."""
+    download_name = download_name or os.path.basename(path)
+    mode = current_app.config['DOWNLOAD_DELIVERY']
+    if mode not in DELIVERY_MODES:
+        raise ValueError(f'Unknown DOWNLOAD_DELIVERY: {mode}')
+
+    if mode == 'send_file':
+        # Без контрольної суми (файли до `flask files checksums`) werkzeug будує ETag за mtime
+        return send_file(path, as_attachment=True, download_name=download_name, conditional=True,
+                         etag=file.checksum or True, last_modified=file.uploaded_at)
+
+    # Умовні запити, Range та If-Range обробляє веб-сервер зі своїми валідаторами
+    response = current_app.response_class(
+        mimetype=mimetypes.guess_type(path)[0] or 'application/octet-stream')
+    response.headers.set('Content-Disposition', 'attachment', **_content_disposition(download_name))
+    if mode == 'x-accel':
+        prefix = current_app.config['DOWNLOAD_ACCEL_PREFIX'].rstrip('/')
+        response.headers['X-Accel-Redirect'] = f'{prefix}/{quote(file.file_path)}'
+    else:
+        response.headers['X-Sendfile'] = os.path.abspath(path)
+    return response
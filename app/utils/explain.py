@@ -0,0 +1,161 @@
+"""Query plan checks for the canonical queries of the routes.
+
+Each entry of CANONICAL_QUERIES builds the statement a route runs (with
+ids and keyset cursors sampled from the database) from the helpers the
+route itself uses (`catalog_order`, `filter_books`, `apply_log_filters`,
+`keyset_query`) and lists the plan problems it is allowed to have.
+`check_queries()` runs EXPLAIN (MySQL) or EXPLAIN QUERY PLAN
+(SQLite) for each of them and reports full table scans and sorts that do
+not use an index. Run it against a database seeded with realistic
+volumes: on nearly empty tables MySQL prefers full scans anyway, so scans
+of tables with fewer than `min_rows` estimated rows are ignored there.
+"""
+from collections import namedtuple
+from sqlalchemy import func, or_, select
+from app import db
+from app.models import (Author, Book, BookAuthor, BookPopularity, Favorite, File, Genre, Log,
+                        LogRollupAction, LogRollupBook, LogRollupUser, Review, User)
+from app.utils.catalog import NO_FILTERS, catalog_order, filter_books
+from app.utils.exports import LOG_ORDER, apply_log_filters
+from app.utils.pagination import keyset_query
+
+PlanIssue = namedtuple('PlanIssue', 'query kind detail')
+CanonicalQuery = namedtuple('CanonicalQuery', 'name build allow')
+
+# Розмір сторінки в запитах: значення не впливає на план, важлива наявність LIMIT
+PAGE = 20
+
+
+def _sample(column):
+    """An existing value of `column` to use as a query parameter."""
+    return db.session.query(func.min(column)).scalar() or 1
+
+
+def _active_books():
+    return select(Book).where(Book.is_active == True)
+
+
+def _page(query, order_by, per_page=PAGE):
+    """The page `keyset_paginate` fetches after a cursor taken from the first row of `query`."""
+    row = db.session.execute(query.with_only_columns(*(column for column, _ in order_by)).limit(1)).first()
+    return keyset_query(query, order_by, per_page, list(row) if row is not None else None)
+
+
+def _catalog(sort, filters=NO_FILTERS):
+    return _page(filter_books(_active_books(), filters), catalog_order(sort))
+
+
+CANONICAL_QUERIES = [
+    CanonicalQuery('main.index: recent books', lambda: _active_books()
+                   .order_by(Book.created_at.desc()).limit(6), ()),
+    # Без статистики планувальник може почати з books і сортувати результат з'єднання
+    CanonicalQuery('main.index: popular books', lambda: _active_books()
+                   .join(BookPopularity, BookPopularity.book_id == Book.id)
+                   .order_by(BookPopularity.score.desc(), BookPopularity.book_id.desc()).limit(6), ('sort',)),
+    CanonicalQuery('books.catalog: newest', lambda: _catalog('recent'), ()),
+    CanonicalQuery('books.catalog: by rating', lambda: _catalog('rating'), ()),
+    CanonicalQuery('books.catalog: by title', lambda: _catalog('title'), ()),
+    CanonicalQuery('books.catalog: genre filter', lambda: _catalog(
+        'recent', NO_FILTERS._replace(genres=[_sample(Genre.id)])), ()),
+    CanonicalQuery('books.catalog: format filter', lambda: _catalog(
+        'recent', NO_FILTERS._replace(formats=['pdf', 'epub'])), ()),
+    CanonicalQuery('books.detail: active files', lambda: select(File)
+                   .where(File.book_id == _sample(Book.id), File.is_active == True), ()),
+    CanonicalQuery('books.detail: reviews', lambda: select(Review)
+                   .where(Review.book_id == _sample(Book.id)), ()),
+    # Та сама вибірка, що й у фільтрі каталогу за жанром, у порядку за назвою
+    CanonicalQuery('genres.detail: books', lambda: _catalog(
+        'title', NO_FILTERS._replace(genres=[_sample(Genre.id)])), ()),
+    CanonicalQuery('authors.list_all', lambda: select(Author)
+                   .order_by(Author.last_name, Author.first_name).limit(PAGE), ()),
+    CanonicalQuery('authors.detail: books', lambda: _active_books()
+                   .join(Book.book_authors).where(BookAuthor.author_id == _sample(Author.id)), ()),
+    CanonicalQuery('prefetch: authors by book', lambda: select(BookAuthor.book_id, Author)
+                   .join(Author, Author.id == BookAuthor.author_id)
+                   .where(BookAuthor.book_id.in_([_sample(Book.id), _sample(Book.id) + 1]))
+                   .order_by(BookAuthor.book_id, BookAuthor.order_index, BookAuthor.id), ()),
+    CanonicalQuery('users.favorites', lambda: select(Favorite)
+                   .join(Book).where(Favorite.user_id == _sample(User.id), Book.is_active == True)
+                   .order_by(Favorite.added_at.desc()), ()),
+    CanonicalQuery('auth.login: user lookup', lambda: select(User)
+                   .where(or_(User.username == 'admin', User.email == 'admin')), ()),
+    CanonicalQuery('admin.users', lambda: select(User)
+                   .order_by(User.created_at.desc()).limit(PAGE), ()),
+    CanonicalQuery('admin.logs: latest', lambda: _page(select(Log), LOG_ORDER, 50), ()),
+    CanonicalQuery('admin.logs: by action', lambda: _page(
+        apply_log_filters(select(Log), action='download'), LOG_ORDER, 50), ()),
+    CanonicalQuery('admin.logs: by user', lambda: _page(
+        apply_log_filters(select(Log), user_id=_sample(User.id)), LOG_ORDER, 50), ()),
+    CanonicalQuery('admin.dashboard: top books', lambda: select(Book, LogRollupBook.count)
+                   .join(LogRollupBook, LogRollupBook.book_id == Book.id)
+                   .where(LogRollupBook.granularity == 'total', LogRollupBook.action == 'download')
+                   .order_by(LogRollupBook.count.desc()).limit(5), ()),
+    CanonicalQuery('admin.dashboard: top users', lambda: select(User, LogRollupUser.count)
+                   .join(LogRollupUser, LogRollupUser.user_id == User.id)
+                   .where(LogRollupUser.granularity == 'total')
+                   .order_by(LogRollupUser.count.desc()).limit(5), ()),
+    # Рядків 'total' стільки, скільки типів дій
+    CanonicalQuery('admin.dashboard: action totals', lambda: select(LogRollupAction.action, LogRollupAction.count)
+                   .where(LogRollupAction.granularity == 'total')
+                   .order_by(LogRollupAction.action), ('sort',)),
+    CanonicalQuery('rollups: new log rows', lambda: select(Log.id, Log.created_at, Log.action)
+                   .where(Log.id > 0).order_by(Log.id).limit(5000), ()),
+    # Повний перерахунок (flask counters recount) читає весь ix_logs_action_created
+    CanonicalQuery('counters: logs by action', lambda: select(Log.action, func.count(Log.id))
+                   .group_by(Log.action), ('scan',)),
+]
+
+
+def _explain(connection, statement):
+    compiled = statement.compile(dialect=connection.dialect,
+                                 compile_kwargs={'render_postcompile': True})
+    if compiled.positional:
+        params = tuple(compiled.params[name] for name in compiled.positiontup)
+    else:
+        params = compiled.params
+    prefix = 'EXPLAIN QUERY PLAN ' if connection.dialect.name == 'sqlite' else 'EXPLAIN '
+    return connection.exec_driver_sql(prefix + compiled.string, params).mappings().all()
+
+
+def _mysql_issues(rows, min_rows):
+    for row in rows:
+        extra = row.get('Extra') or ''
+        table = row.get('table')
+        if row.get('type') == 'ALL' and (row.get('rows') or 0) >= min_rows:
+            yield 'scan', f"full scan of {table} (~{row.get('rows')} rows)"
+        if 'Using filesort' in extra:
+            yield 'sort', f'filesort on {table}'
+        if 'Using temporary' in extra:
+            yield 'sort', f'temporary table for {table}'
+
+
+def _sqlite_issues(rows):
+    for row in rows:
+        detail = row['detail']
+        if detail.startswith('SCAN') and ' USING ' not in detail:
+            yield 'scan', detail
+        elif 'USE TEMP B-TREE' in detail:
+            yield 'sort', detail
+
+
+def check_queries(min_rows=100):
+    """Explain every canonical query; returns (plans, issues).
+
+    `plans` maps a query name to its raw EXPLAIN rows, `issues` lists the
+    PlanIssue entries that the query does not explicitly allow.
+    """
+    connection = db.session.connection()
+    dialect = connection.dialect.name
+    if dialect not in ('mysql', 'sqlite'):
+        raise ValueError(f'Query plan checks do not support {dialect}')
+
+    plans, issues = {}, []
+    for query in CANONICAL_QUERIES:
+        rows = _explain(connection, query.build())
+        plans[query.name] = rows
+        found = _mysql_issues(rows, min_rows) if dialect == 'mysql' else _sqlite_issues(rows)
+        for kind, detail in found:
+            if kind not in query.allow:
+                issues.append(PlanIssue(query.name, kind, detail))
+    db.session.rollback()
+    return plans, issues
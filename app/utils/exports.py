@@ -0,0 +1,195 @@
+"""Streaming CSV/JSONL exports of the activity log, reviews and the book catalog.
+
+Rows are read with a server-side cursor (`stream_results` + `yield_per`;
+PyMySQL's unbuffered SSCursor on MySQL) and encoded into chunks of about
+EXPORT_CHUNK bytes as they arrive, optionally gzip-compressed on the fly.
+Neither the admin endpoint nor `flask export` holds more than one batch
+in memory, and the first bytes go out as soon as the first batch is read,
+so a log of tens of millions of rows exports in constant memory.
+
+The log export applies the same filters as the admin log page
+(`apply_log_filters`). The book export writes the columns that
+`flask catalog import` reads, so an export can be imported elsewhere.
+CSV text cells that start with `=`, `+`, `-` or `@` get a leading `'` so
+spreadsheets do not evaluate them as formulas; JSONL keeps values as is.
+"""
+import csv
+import io
+import json
+import zlib
+from collections import defaultdict
+from datetime import date, datetime, timedelta
+from sqlalchemy import select
+from app import db
+from app.models import Author, Book, BookAuthor, BookGenre, Genre, Log, Review, User
+
+DATASETS = ('logs', 'reviews', 'books')
+FORMATS = ('csv', 'jsonl')
+BATCH_SIZE = 1000
+EXPORT_CHUNK = 64 * 1024
+
+LOG_COLUMNS = ('id', 'created_at', 'action', 'user_id', 'book_id', 'file_id', 'ip_address', 'user_agent')
+REVIEW_COLUMNS = ('id', 'book_id', 'book_title', 'user_id', 'username', 'rating', 'title', 'review_text',
+                  'created_at', 'updated_at')
+BOOK_COLUMNS = ('id', 'title', 'original_title', 'authors', 'genres', 'isbn', 'language', 'publisher',
+                'publication_year', 'description', 'rating_count', 'rating_sum', 'is_active', 'created_at')
+MIMETYPES = {'csv': 'text/csv', 'jsonl': 'application/x-ndjson'}
+FORMULA_PREFIXES = ('=', '+', '-', '@')
+# Ключ сторінки журналу в адмінці (keyset_paginate)
+LOG_ORDER = [(Log.created_at, True), (Log.id, True)]
+
+
+def _parse_date(value):
+    try:
+        return datetime.strptime(value, '%Y-%m-%d')
+    except (TypeError, ValueError):
+        return None
+
+
+def apply_log_filters(query, action=None, user_id=None, date_from=None, date_to=None):
+    """Filter a Log query or select by action, user and date range ('YYYY-MM-DD', inclusive).
+
+    Malformed dates are ignored.
+    """
+    if action:
+        query = query.filter(Log.action == action)
+    if user_id:
+        query = query.filter(Log.user_id == user_id)
+    date_from = _parse_date(date_from)
+    if date_from:
+        query = query.filter(Log.created_at >= date_from)
+    date_to = _parse_date(date_to)
+    if date_to:
+        query = query.filter(Log.created_at < date_to + timedelta(days=1))
+    return query
+
+
+# --- джерела рядків ---
+
+def _stream(connection, statement, batch_size):
+    """Partitions of rows read through a server-side cursor."""
+    result = connection.execution_options(stream_results=True, yield_per=batch_size).execute(statement)
+    return result.mappings().partitions()
+
+
+def _log_rows(engine, batch_size, filters):
+    statement = apply_log_filters(select(*(Log.__table__.c[name] for name in LOG_COLUMNS)), **filters)
+    with engine.connect() as connection:
+        for rows in _stream(connection, statement.order_by(Log.id), batch_size):
+            yield rows
+
+
+def _review_rows(engine, batch_size, filters):
+    statement = select(Review.id, Review.book_id, Book.title.label('book_title'), Review.user_id,
+                       User.username, Review.rating, Review.title, Review.review_text,
+                       Review.created_at, Review.updated_at)\
+        .join(Book, Book.id == Review.book_id).join(User, User.id == Review.user_id)\
+        .order_by(Review.id)
+    with engine.connect() as connection:
+        for rows in _stream(connection, statement, batch_size):
+            yield rows
+
+
+def _book_rows(engine, batch_size, filters):
+    statement = select(*(Book.__table__.c[name] for name in BOOK_COLUMNS if name not in ('authors', 'genres')))\
+        .order_by(Book.id)
+    # Курсор без буфера займає з'єднання: авторів і жанри пакета читаємо через друге
+    with engine.connect() as connection, engine.connect() as lookups:
+        for rows in _stream(connection, statement, batch_size):
+            book_ids = [row['id'] for row in rows]
+            authors = defaultdict(list)
+            for book_id, *name in lookups.execute(
+                    select(BookAuthor.book_id, Author.first_name, Author.middle_name, Author.last_name)
+                    .join(Author, Author.id == BookAuthor.author_id)
+                    .where(BookAuthor.book_id.in_(book_ids))
+                    .order_by(BookAuthor.book_id, BookAuthor.order_index, BookAuthor.id)):
+                authors[book_id].append(' '.join(part for part in name if part))
+            genres = defaultdict(list)
+            for book_id, name in lookups.execute(
+                    select(BookGenre.book_id, Genre.name).join(Genre, Genre.id == BookGenre.genre_id)
+                    .where(BookGenre.book_id.in_(book_ids)).order_by(BookGenre.book_id, Genre.name)):
+                genres[book_id].append(name)
+            yield [dict(row, authors=authors[row['id']], genres=genres[row['id']]) for row in rows]
+
+
+_SOURCES = {
+    'logs': (LOG_COLUMNS, _log_rows),
+    'reviews': (REVIEW_COLUMNS, _review_rows),
+    'books': (BOOK_COLUMNS, _book_rows),
+}
+
+
+# --- кодування ---
+
+def _value(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    return value
+
+
+def _csv_value(value):
+    if isinstance(value, list):
+        value = '; '.join(value)
+    value = _value(value)
+    if value is None:
+        return ''
+    # Комірка з = + - @ на початку в табличному редакторі стає формулою
+    if isinstance(value, str) and value.startswith(FORMULA_PREFIXES):
+        return "'" + value
+    return value
+
+
+def _encode(batches, columns, file_format):
+    """Yield UTF-8 chunks of about EXPORT_CHUNK bytes."""
+    buffer = io.StringIO()
+    if file_format == 'csv':
+        writer = csv.writer(buffer)
+        writer.writerow(columns)
+        for rows in batches:
+            for row in rows:
+                writer.writerow([_csv_value(row[name]) for name in columns])
+                if buffer.tell() >= EXPORT_CHUNK:
+                    yield buffer.getvalue().encode('utf-8')
+                    buffer.seek(0)
+                    buffer.truncate()
+    else:
+        for rows in batches:
+            for row in rows:
+                buffer.write(json.dumps({name: _value(row[name]) for name in columns}, ensure_ascii=False))
+                buffer.write('\n')
+                if buffer.tell() >= EXPORT_CHUNK:
+                    yield buffer.getvalue().encode('utf-8')
+                    buffer.seek(0)
+                    buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue().encode('utf-8')
+
+
+def _gzip(chunks):
+    # wbits=31: формат gzip (заголовок і контрольна сума), а не «сирий» zlib
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def export_filename(dataset, file_format, compress=False):
+    name = f'{dataset}-{datetime.utcnow():%Y%m%d-%H%M%S}.{file_format}'
+    return f'{name}.gz' if compress else name
+
+
+def export_chunks(dataset, file_format='csv', compress=False, batch_size=BATCH_SIZE, **filters):
+    """Generator of the export's bytes; the database is read while it is consumed.
+
+    `filters` (action, user_id, date_from, date_to) apply to the log only.
+    """
+    if dataset not in _SOURCES:
+        raise ValueError(f'Unknown export dataset: {dataset}')
+    if file_format not in FORMATS:
+        raise ValueError(f'Unknown export format: {file_format}')
+    columns, source = _SOURCES[dataset]
+    # Рушій беремо одразу: генератор може виконуватися поза контекстом застосунку
+    chunks = _encode(source(db.engine, batch_size, filters), columns, file_format)
+    return _gzip(chunks) if compress else chunks
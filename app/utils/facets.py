@@ -0,0 +1,216 @@
+"""Bitmap index for the catalog facets: genres, language, publication year, file format.
+
+Every facet value owns a bitset (a Python int) in which bit N is set when the
+active book with id N has that value. Filters are combined with `&`/`|` over
+whole bitsets and counts are `int.bit_count()`, so a full facet panel costs a
+few hundred big-int operations instead of a grouped SQL query per facet.
+"""
+from collections import defaultdict
+from app import db
+from app.models import Book, BookGenre, File
+from app.utils.indexing import RefreshingIndex
+
+
+def _decade(year):
+    return year // 10 * 10
+
+
+def _or_all(bitsets):
+    result = 0
+    for bits in bitsets:
+        result |= bits
+    return result
+
+
+class _BitmapBuilder:
+    """Collects bits in bytearrays; setting a bit on a big int would copy it every time."""
+
+    def __init__(self, size):
+        self.size = size
+        self.maps = defaultdict(lambda: bytearray(self.size))
+
+    def add(self, key, book_id):
+        self.maps[key][book_id >> 3] |= 1 << (book_id & 7)
+
+    def build(self):
+        return {key: int.from_bytes(buf, 'little') for key, buf in self.maps.items()}
+
+
+class _FacetData:
+    """One generation of bitsets; mutated only under FacetIndex._lock."""
+
+    def __init__(self):
+        self.active = 0
+        # Назва фасету -> {значення -> бітсет}
+        self.facets = {'genre': {}, 'language': {}, 'year': {}, 'decade': {}, 'format': {}}
+        # book_id -> {фасет: значення}, щоб зняти старі біти при оновленні книги
+        self.book_values = {}
+
+    def remove(self, book_id):
+        values = self.book_values.pop(book_id, None)
+        if values is None:
+            return
+        mask = ~(1 << book_id)
+        self.active &= mask
+        for facet, facet_values in values.items():
+            bitsets = self.facets[facet]
+            for value in facet_values:
+                bits = bitsets.get(value, 0) & mask
+                if bits:
+                    bitsets[value] = bits
+                else:
+                    bitsets.pop(value, None)
+
+    def add(self, book_id, values):
+        self.remove(book_id)
+        bit = 1 << book_id
+        self.active |= bit
+        for facet, facet_values in values.items():
+            bitsets = self.facets[facet]
+            for value in facet_values:
+                bitsets[value] = bitsets.get(value, 0) | bit
+        self.book_values[book_id] = values
+
+
+class FacetResult:
+    """Matching books and per-option counts for the current selection."""
+
+    def __init__(self, total, counts):
+        self.total = total
+        self.counts = counts
+
+
+class FacetIndex(RefreshingIndex):
+    """Catalog facet bitsets shared by all requests of one worker process.
+
+    Kept up to date by the book and file routes and rebuilt in the background
+    after SEARCH_INDEX_MAX_AGE seconds, like the search index.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self._data = None
+
+    # --- побудова та оновлення ---
+
+    def _load(self, book_ids=None):
+        """Yield (book_id, {facet: values}) for active books, three queries in total."""
+        books_query = db.session.query(Book.id, Book.language, Book.publication_year)\
+            .filter(Book.is_active == True)
+        genres_query = db.session.query(BookGenre.book_id, BookGenre.genre_id)
+        formats_query = db.session.query(File.book_id, File.format)\
+            .filter(File.is_active == True).distinct()
+        if book_ids is not None:
+            books_query = books_query.filter(Book.id.in_(book_ids))
+            genres_query = genres_query.filter(BookGenre.book_id.in_(book_ids))
+            formats_query = formats_query.filter(File.book_id.in_(book_ids))
+
+        genres = defaultdict(list)
+        for book_id, genre_id in genres_query:
+            genres[book_id].append(genre_id)
+        formats = defaultdict(list)
+        for book_id, file_format in formats_query:
+            formats[book_id].append(file_format.lower())
+
+        for book_id, language, year in books_query:
+            yield book_id, {
+                'genre': genres.get(book_id, []),
+                'language': [language] if language else [],
+                'year': [year] if year else [],
+                'decade': [_decade(year)] if year else [],
+                'format': formats.get(book_id, []),
+            }
+
+    def _build(self):
+        rows = list(self._load())
+        size = max((book_id for book_id, _ in rows), default=0) // 8 + 1
+        data = _FacetData()
+        builders = {facet: _BitmapBuilder(size) for facet in data.facets}
+        active = bytearray(size)
+        for book_id, values in rows:
+            active[book_id >> 3] |= 1 << (book_id & 7)
+            for facet, facet_values in values.items():
+                for value in facet_values:
+                    builders[facet].add(value, book_id)
+            data.book_values[book_id] = values
+
+        data.active = int.from_bytes(active, 'little')
+        for facet, builder in builders.items():
+            data.facets[facet] = builder.build()
+        return data
+
+    def _swap(self, data):
+        self._data = data
+
+    def update_books(self, book_ids):
+        """Refresh the bits of books whose genres, language, year or files changed."""
+        if self._data is None or not book_ids:
+            return
+        book_ids = set(book_ids)
+        rows = list(self._load(book_ids))
+        with self._lock:
+            for book_id, values in rows:
+                self._data.add(book_id, values)
+            for book_id in book_ids - {book_id for book_id, _ in rows}:
+                self._data.remove(book_id)
+
+    def update_book(self, book_id):
+        self.update_books([book_id])
+
+    # --- вибірка ---
+
+    def select(self, genres=(), genre_mode='or', languages=(), year_from=None, year_to=None, formats=()):
+        """Apply a facet selection and count the books behind every option.
+
+        Options of a facet are counted against the other facets' filters only,
+        so choosing one language still shows how many books the others have.
+        In 'and' mode genres narrow each other and are counted against the
+        full selection instead.
+        """
+        self.ensure_fresh()
+        with self._lock:
+            data = self._data
+            facets = data.facets
+            everything = data.active
+
+            masks = {}
+            if genres:
+                genre_bits = [facets['genre'].get(genre_id, 0) for genre_id in genres]
+                if genre_mode == 'and':
+                    mask = everything
+                    for bits in genre_bits:
+                        mask &= bits
+                else:
+                    mask = _or_all(genre_bits)
+                masks['genre'] = mask
+            if languages:
+                masks['language'] = _or_all(facets['language'].get(code, 0) for code in languages)
+            if year_from is not None or year_to is not None:
+                low = year_from if year_from is not None else float('-inf')
+                high = year_to if year_to is not None else float('inf')
+                masks['year'] = _or_all(bits for year, bits in facets['year'].items() if low <= year <= high)
+            if formats:
+                masks['format'] = _or_all(facets['format'].get(fmt, 0) for fmt in formats)
+
+            def without(facet):
+                result = everything
+                for name, mask in masks.items():
+                    if name != facet:
+                        result &= mask
+                return result
+
+            selected = without(None)
+            genre_base = selected if genre_mode == 'and' else without('genre')
+            counts = {
+                'genre': {value: (genre_base & bits).bit_count() for value, bits in facets['genre'].items()},
+                'language': {value: (without('language') & bits).bit_count()
+                             for value, bits in facets['language'].items()},
+                'decade': {value: (without('year') & bits).bit_count()
+                           for value, bits in facets['decade'].items()},
+                'format': {value: (without('format') & bits).bit_count()
+                           for value, bits in facets['format'].items()},
+            }
+        return FacetResult(selected.bit_count(), counts)
+
+
+facet_index = FacetIndex()
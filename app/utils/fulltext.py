@@ -0,0 +1,784 @@
+"""Full-text index of the contents of uploaded EPUB and FB2 files.
+
+Readers search by a quotation: `content_index.search('садок вишневий')`
+returns the books whose text contains the phrase, with the chapters it
+occurs in. Terms are normalized and stemmed like the book search
+(app/utils/text.py), so word forms match.
+
+Text is streamed out of the files in bounded memory: the XHTML documents
+of the EPUB spine are read from the zip in chunks, an FB2 file is parsed
+incrementally and every paragraph is discarded once read. A chapter is a
+spine document of an EPUB or a top-level <section> of an FB2 body; notes
+bodies are skipped.
+
+The index lives on disk in FULLTEXT_INDEX_DIR (default instance/fulltext)
+and is shared by all worker processes:
+
+- segment files are immutable and memory-mapped at query time, so the
+  operating system keeps one copy of the pages for every process;
+- manifest.json lists the live segments, the files in each of them and
+  the files deleted since; it is changed under a file lock and replaced
+  atomically, and readers reopen it when its mtime changes.
+
+`books.upload_files` schedules a segment for the new files in the process
+pool (app/utils/workers.py) and `books.delete_file` marks the file as
+deleted. Once there are more than FULLTEXT_MERGE_SEGMENTS segments they
+are merged into one in the background, dropping deleted files. `flask
+fulltext build` rebuilds the whole index.
+
+Segment layout (integers little-endian):
+
+    header    magic, document and term counts, section offsets
+    docs      zlib-compressed JSON: [[file_id, book_id, [[start, title], ...]], ...]
+    terms     sorted UTF-8 terms, concatenated
+    table     per term: end of the term in `terms`, offset and length of
+              its postings, number of documents
+    postings  per document: varint document delta, number of positions,
+              varint position deltas
+"""
+import bisect
+import codecs
+import heapq
+import json
+import mmap
+import os
+import posixpath
+import re
+import shutil
+import struct
+import tempfile
+import threading
+import uuid
+import zipfile
+import zlib
+import xml.etree.ElementTree as ET
+from collections import Counter, defaultdict, namedtuple
+from concurrent.futures import as_completed
+from contextlib import contextmanager
+from functools import partial
+from html.parser import HTMLParser
+from itertools import groupby
+from operator import itemgetter
+from urllib.parse import unquote
+from flask import current_app
+from app import db
+from app.models import File
+from app.utils.metadata import epub_rootfile
+from app.utils.storage import static_path
+from app.utils.text import tokenize
+from app.utils.workers import ProcessPool, process_executor
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - Windows
+    fcntl = None
+    import msvcrt
+
+MAGIC = b'BKFTS\x00\x01\x00'
+_HEADER = struct.Struct('<8sIIQQQQ')
+_ENTRY = struct.Struct('<IQII')
+MANIFEST = 'manifest.json'
+CHUNK_SIZE = 256 * 1024
+MAX_TITLE_LENGTH = 200
+
+_XHTML_TYPES = {'application/xhtml+xml', 'text/html'}
+_SKIP_TAGS = {'head', 'script', 'style'}
+_BLOCK_TAGS = {'p', 'div', 'br', 'li', 'tr', 'td', 'th', 'blockquote', 'section', 'article',
+               'h1', 'h2', 'h3', 'h4', 'h5', 'h6', 'pre', 'hr', 'dt', 'dd'}
+_HEADINGS = {'h1', 'h2', 'h3'}
+_FB2_BLOCKS = {'p', 'v', 'subtitle', 'text-author', 'td', 'th'}
+# Незавершене слово в кінці фрагмента (апостроф — частина українського слова)
+_WORD_TAIL = re.compile(r"[\w'’ʼ‘`´]*\Z")
+
+ContentHit = namedtuple('ContentHit', 'file_id chapter title count')
+
+
+def _local(tag):
+    return tag.rsplit('}', 1)[-1] if isinstance(tag, str) else ''
+
+
+# --- витягування тексту ---
+
+class _XHTMLText(HTMLParser):
+    """Text of an XHTML document in reading order; the first heading is kept as the title."""
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.parts = []
+        self.heading = None
+        self._heading_parts = None
+        self._skip = 0
+
+    def handle_starttag(self, tag, attrs):
+        if tag in _SKIP_TAGS:
+            self._skip += 1
+        elif tag in _BLOCK_TAGS:
+            self.parts.append('\n')
+        if tag in _HEADINGS and self.heading is None and self._heading_parts is None:
+            self._heading_parts = []
+
+    def handle_endtag(self, tag):
+        if tag in _SKIP_TAGS:
+            self._skip = max(0, self._skip - 1)
+        elif tag in _BLOCK_TAGS:
+            self.parts.append('\n')
+        if tag in _HEADINGS and self._heading_parts is not None:
+            self.heading = ' '.join(''.join(self._heading_parts).split()) or None
+            self._heading_parts = None
+
+    def handle_data(self, data):
+        if self._skip:
+            return
+        self.parts.append(data)
+        if self._heading_parts is not None:
+            self._heading_parts.append(data)
+
+
+def _spine(archive):
+    """Names of the XHTML documents of an EPUB in reading order."""
+    rootfile = epub_rootfile(archive)
+    if not rootfile:
+        return []
+    items = {}
+    order = []
+    with archive.open(rootfile) as f:
+        for _, element in ET.iterparse(f):
+            tag = _local(element.tag)
+            if tag == 'item' and element.get('media-type') in _XHTML_TYPES:
+                items[element.get('id')] = element.get('href', '')
+            elif tag == 'itemref':
+                order.append(element.get('idref'))
+    base = posixpath.dirname(rootfile)
+    return [posixpath.normpath(posixpath.join(base, unquote(items[idref])))
+            for idref in order if idref in items]
+
+
+def _epub_events(path):
+    with zipfile.ZipFile(path) as archive:
+        for name in _spine(archive):
+            try:
+                info = archive.getinfo(name)
+            except KeyError:
+                continue
+            yield 'chapter', None
+            parser = _XHTMLText()
+            decoder = codecs.getincrementaldecoder('utf-8')('replace')
+            title_sent = False
+            with archive.open(info) as f:
+                for chunk in iter(lambda: f.read(CHUNK_SIZE), b''):
+                    parser.feed(decoder.decode(chunk))
+                    if parser.parts:
+                        yield 'text', ''.join(parser.parts)
+                        parser.parts.clear()
+                    if parser.heading and not title_sent:
+                        yield 'title', parser.heading
+                        title_sent = True
+            parser.feed(decoder.decode(b'', final=True))
+            parser.close()
+            if parser.parts:
+                yield 'text', ''.join(parser.parts)
+            if parser.heading and not title_sent:
+                yield 'title', parser.heading
+
+
+def _fb2_events(path):
+    stack = []
+    root = None
+    in_body = False
+    title_parts = None
+    with open(path, 'rb') as f:
+        for event, element in ET.iterparse(f, events=('start', 'end')):
+            tag = _local(element.tag)
+            if event == 'start':
+                if root is None:
+                    root = element
+                stack.append(tag)
+                if tag == 'body' and len(stack) == 2:
+                    # Тіла з атрибутом name — примітки та коментарі
+                    in_body = element.get('name') is None
+                    if in_body:
+                        yield 'chapter', None
+                elif in_body and tag == 'section' and len(stack) == 3:
+                    yield 'chapter', None
+                elif in_body and tag == 'title' and len(stack) == 4 and stack[2] == 'section':
+                    title_parts = []
+                continue
+
+            stack.pop()
+            if in_body and tag in _FB2_BLOCKS:
+                text = ''.join(element.itertext())
+                yield 'text', text + '\n'
+                if title_parts is not None:
+                    title_parts.append(text)
+                element.clear()
+            elif tag == 'title' and title_parts is not None:
+                title = ' '.join(' '.join(title_parts).split())
+                if title:
+                    yield 'title', title
+                title_parts = None
+            elif tag == 'section':
+                element.clear()
+            elif tag == 'body':
+                in_body = False
+            # Прочитані елементи (зокрема великі <binary>) звільняємо одразу
+            if len(stack) == 1:
+                root.clear()
+
+
+_EXTRACTORS = {'epub': _epub_events, 'fb2': _fb2_events}
+
+
+def _index_document(path, file_format):
+    """Positions of every term of a book file and its chapters [[first position, title], ...]."""
+    positions = defaultdict(list)
+    chapters = []
+    position = 0
+    tail = ''
+
+    def add(text):
+        nonlocal position
+        for term in tokenize(text):
+            positions[term].append(position)
+            position += 1
+
+    for kind, value in _EXTRACTORS[file_format](path):
+        if kind == 'text':
+            text = tail + value
+            cut = _WORD_TAIL.search(text).start()
+            add(text[:cut])
+            tail = text[cut:]
+        elif kind == 'chapter':
+            add(tail)
+            tail = ''
+            # Розділ без тексту (обкладинка, зміст) не зберігаємо
+            if chapters and chapters[-1][0] == position:
+                chapters[-1] = [position, None]
+            else:
+                chapters.append([position, None])
+        elif kind == 'title' and chapters and chapters[-1][1] is None:
+            chapters[-1][1] = value[:MAX_TITLE_LENGTH]
+    add(tail)
+    if chapters and chapters[-1][0] == position:
+        chapters.pop()
+    return positions, chapters
+
+
+# --- формат сегмента ---
+
+def _varint(value, out):
+    while value >= 0x80:
+        out.append(value & 0x7F | 0x80)
+        value >>= 7
+    out.append(value)
+
+
+def _encode_doc(out, doc_delta, positions):
+    _varint(doc_delta, out)
+    _varint(len(positions), out)
+    last = 0
+    for position in positions:
+        _varint(position - last, out)
+        last = position
+
+
+def _varints(data):
+    value = shift = 0
+    for byte in data:
+        value |= (byte & 0x7F) << shift
+        if byte & 0x80:
+            shift += 7
+        else:
+            yield value
+            value = shift = 0
+
+
+def _decode(data):
+    """Yield (document, positions) from encoded postings."""
+    numbers = _varints(data)
+    doc = 0
+    for delta in numbers:
+        doc += delta
+        position = 0
+        positions = []
+        for _ in range(next(numbers)):
+            position += next(numbers)
+            positions.append(position)
+        yield doc, positions
+
+
+def _write_segment(path, docs, terms):
+    """Write a segment file; `terms` yields (term, document count, postings) in sorted order."""
+    term_bytes = bytearray()
+    table = bytearray()
+    offset = 0
+    # Списки входжень пишуться одразу на диск: у пам'яті лише словник термінів
+    with tempfile.TemporaryFile(dir=os.path.dirname(path)) as postings:
+        for term, doc_count, data in terms:
+            term_bytes += term.encode('utf-8')
+            table += _ENTRY.pack(len(term_bytes), offset, len(data), doc_count)
+            postings.write(data)
+            offset += len(data)
+        docs_blob = zlib.compress(json.dumps(docs, ensure_ascii=False, separators=(',', ':')).encode('utf-8'))
+        docs_offset = _HEADER.size
+        terms_offset = docs_offset + len(docs_blob)
+        table_offset = terms_offset + len(term_bytes)
+        postings_offset = table_offset + len(table)
+        with open(path, 'wb') as out:
+            out.write(_HEADER.pack(MAGIC, len(docs), len(table) // _ENTRY.size,
+                                   docs_offset, terms_offset, table_offset, postings_offset))
+            out.write(docs_blob)
+            out.write(term_bytes)
+            out.write(table)
+            postings.seek(0)
+            shutil.copyfileobj(postings, out)
+
+
+class Segment:
+    """Read-only view of a memory-mapped segment file."""
+
+    def __init__(self, path):
+        with open(path, 'rb') as f:
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        (magic, doc_count, self.term_count, docs_offset, self._terms,
+         self._table, self._postings) = _HEADER.unpack_from(self._map, 0)
+        if magic != MAGIC:
+            self._map.close()
+            raise ValueError(f'Not a full-text segment: {path}')
+        self.docs = json.loads(zlib.decompress(self._map[docs_offset:self._terms]))
+
+    def close(self):
+        self._map.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def _entry(self, index):
+        end, offset, length, doc_count = _ENTRY.unpack_from(self._map, self._table + index * _ENTRY.size)
+        start = _ENTRY.unpack_from(self._map, self._table + (index - 1) * _ENTRY.size)[0] if index else 0
+        return start, end, offset, length, doc_count
+
+    def _term(self, index):
+        start, end, *_ = self._entry(index)
+        return self._map[self._terms + start:self._terms + end]
+
+    def lookup(self, term):
+        """Postings of `term` (bytes), or None; binary search in the mapped table."""
+        key = term.encode('utf-8')
+        low, high = 0, self.term_count
+        while low < high:
+            middle = (low + high) // 2
+            if self._term(middle) < key:
+                low = middle + 1
+            else:
+                high = middle
+        if low == self.term_count or self._term(low) != key:
+            return None
+        _, _, offset, length, _ = self._entry(low)
+        start = self._postings + offset
+        return self._map[start:start + length]
+
+    def terms(self):
+        """Yield (term, document count, postings) in sorted order."""
+        for index in range(self.term_count):
+            start, end, offset, length, doc_count = self._entry(index)
+            term = self._map[self._terms + start:self._terms + end].decode('utf-8')
+            position = self._postings + offset
+            yield term, doc_count, self._map[position:position + length]
+
+    def phrase(self, terms):
+        """Yield (document, start positions) where `terms` occur one after another."""
+        postings = {}
+        for term in set(terms):
+            data = self.lookup(term)
+            if data is None:
+                return
+            postings[term] = data
+        # Спершу найрідкісніший термін: решту декодуємо лише для спільних документів
+        decoded = {}
+        candidates = None
+        for term in sorted(postings, key=lambda t: len(postings[t])):
+            decoded[term] = {doc: positions for doc, positions in _decode(postings[term])
+                             if candidates is None or doc in candidates}
+            candidates = set(decoded[term])
+            if not candidates:
+                return
+        for doc in sorted(candidates):
+            starts = set(decoded[terms[0]][doc])
+            for offset, term in enumerate(terms[1:], 1):
+                starts &= {position - offset for position in decoded[term][doc]}
+                if not starts:
+                    break
+            if starts:
+                yield doc, sorted(starts)
+
+
+def _new_segment_path(index_dir):
+    return os.path.join(index_dir, f'.new-{uuid.uuid4().hex}.seg')
+
+
+def build_segment(index_dir, files):
+    """Index book files into a new segment; runs in a worker process.
+
+    `files` are (file_id, book_id, absolute path, format). Returns (segment
+    name or None, indexed file ids, [(file_id, error), ...]).
+    """
+    docs = []
+    postings = defaultdict(bytearray)
+    last_doc = {}
+    doc_counts = Counter()
+    errors = []
+    for file_id, book_id, path, file_format in files:
+        try:
+            positions, chapters = _index_document(path, file_format)
+        except Exception as exc:
+            errors.append((file_id, f'{type(exc).__name__}: {exc}'))
+            continue
+        doc = len(docs)
+        docs.append([file_id, book_id, chapters])
+        for term, term_positions in positions.items():
+            _encode_doc(postings[term], doc - last_doc.get(term, 0), term_positions)
+            last_doc[term] = doc
+            doc_counts[term] += 1
+    if not docs:
+        return None, [], errors
+
+    os.makedirs(index_dir, exist_ok=True)
+    path = _new_segment_path(index_dir)
+    _write_segment(path, docs, ((term, doc_counts[term], bytes(postings[term])) for term in sorted(postings)))
+    return os.path.basename(path), [doc[0] for doc in docs], errors
+
+
+def merge_segments(index_dir, entries):
+    """Merge segments into a new one without their deleted files; runs in a worker process.
+
+    `entries` are manifest entries ({'name', 'deleted', ...}). Terms are
+    merged in sorted order, so only one term's postings are held in
+    memory. Returns (segment name, file ids).
+    """
+    segments = [Segment(os.path.join(index_dir, entry['name'])) for entry in entries]
+    try:
+        docs = []
+        remap = []
+        for segment, entry in zip(segments, entries):
+            deleted = set(entry['deleted'])
+            mapping = {}
+            for old, doc in enumerate(segment.docs):
+                if doc[0] not in deleted:
+                    mapping[old] = len(docs)
+                    docs.append(doc)
+            remap.append(mapping)
+
+        def tagged(index, segment):
+            for term, _, data in segment.terms():
+                yield term, index, data
+
+        def merged_terms():
+            streams = [tagged(index, segment) for index, segment in enumerate(segments)]
+            for term, group in groupby(heapq.merge(*streams, key=itemgetter(0, 1)), key=itemgetter(0)):
+                out = bytearray()
+                last = doc_count = 0
+                for _, index, data in group:
+                    mapping = remap[index]
+                    for doc, positions in _decode(data):
+                        new = mapping.get(doc)
+                        if new is not None:
+                            _encode_doc(out, new - last, positions)
+                            last = new
+                            doc_count += 1
+                if doc_count:
+                    yield term, doc_count, bytes(out)
+
+        path = _new_segment_path(index_dir)
+        _write_segment(path, docs, merged_terms())
+    finally:
+        for segment in segments:
+            segment.close()
+    return os.path.basename(path), [doc[0] for doc in docs]
+
+
+# --- маніфест ---
+
+def _remove(path):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+    except OSError:
+        # Windows не дає видалити файл, відображений у пам'ять іншим процесом
+        pass
+
+
+@contextmanager
+def _locked(index_dir):
+    """Exclusive lock on the index directory, shared with the other processes."""
+    os.makedirs(index_dir, exist_ok=True)
+    with open(os.path.join(index_dir, '.lock'), 'a+b') as f:
+        if fcntl is not None:
+            fcntl.flock(f, fcntl.LOCK_EX)
+        else:
+            f.seek(0)
+            msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(f, fcntl.LOCK_UN)
+            else:
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+def _read_manifest(index_dir):
+    try:
+        with open(os.path.join(index_dir, MANIFEST), encoding='utf-8') as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {'next_seq': 1, 'segments': []}
+
+
+def _write_manifest(index_dir, manifest):
+    path = os.path.join(index_dir, MANIFEST)
+    temp = f'{path}.{os.getpid()}.tmp'
+    with open(temp, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, separators=(',', ':'))
+    os.replace(temp, path)
+
+
+def _supersede(segments):
+    """A file indexed in several segments stays live only in the newest one."""
+    owner = {}
+    for entry in sorted(segments, key=itemgetter('seq')):
+        deleted = set(entry['deleted'])
+        for file_id in entry['files']:
+            if file_id in deleted:
+                continue
+            if file_id in owner:
+                owner[file_id]['deleted'].append(file_id)
+            owner[file_id] = entry
+
+
+def _install(index_dir, name, files, replaced=None, older_than=None):
+    """Add the new segment `name` to the manifest; returns False if it was discarded.
+
+    A merge passes `replaced`, {segment name: its deleted file ids when the
+    merge started}: the new segment takes their place and the files deleted
+    from them since then stay deleted (the earlier deletions, superseded
+    copies included, were already left out by the merge); it is discarded
+    if another process has already replaced them. A rebuild
+    replaces every segment with a sequence number below `older_than`.
+    Files that are no longer in the database are marked deleted right away
+    (they may have been deleted while the segment was being built).
+    """
+    removed = []
+    with _locked(index_dir):
+        manifest = _read_manifest(index_dir)
+        by_name = {entry['name']: entry for entry in manifest['segments']}
+        if replaced is not None and not all(old in by_name for old in replaced):
+            _remove(os.path.join(index_dir, name))
+            return False
+        if older_than is not None:
+            replaced = [entry['name'] for entry in manifest['segments'] if entry['seq'] < older_than]
+        replaced = replaced or []
+
+        deleted = set()
+        if older_than is None:
+            for old in replaced:
+                deleted.update(set(by_name[old]['deleted']) - set(replaced[old]))
+        live = set()
+        for start in range(0, len(files), 1000):
+            batch = files[start:start + 1000]
+            live.update(file_id for (file_id,) in db.session.query(File.id)
+                        .filter(File.id.in_(batch), File.is_active == True))
+        db.session.commit()
+        deleted = (deleted & set(files)) | (set(files) - live)
+
+        if replaced and older_than is None:
+            seq = max(by_name[old]['seq'] for old in replaced)
+        else:
+            seq = manifest['next_seq']
+            manifest['next_seq'] += 1
+        final = f'seg-{seq:08d}-{uuid.uuid4().hex[:8]}.seg'
+        os.replace(os.path.join(index_dir, name), os.path.join(index_dir, final))
+
+        segments = [entry for entry in manifest['segments'] if entry['name'] not in replaced]
+        segments.append({'name': final, 'seq': seq, 'files': sorted(files), 'deleted': sorted(deleted)})
+        segments.sort(key=itemgetter('seq'))
+        _supersede(segments)
+        for entry in segments:
+            entry['deleted'] = sorted(set(entry['deleted']))
+        manifest['segments'] = segments
+        _write_manifest(index_dir, manifest)
+        removed = [os.path.join(index_dir, old) for old in replaced]
+    for path in removed:
+        _remove(path)
+    return True
+
+
+def index_dir():
+    """Directory of the full-text index."""
+    return current_app.config['FULLTEXT_INDEX_DIR'] or os.path.join(current_app.instance_path, 'fulltext')
+
+
+class ContentIndex:
+    """Searches the on-disk index and keeps it current from the upload/delete routes."""
+
+    def __init__(self):
+        self.pool = ProcessPool('FULLTEXT_WORKERS')
+        self._lock = threading.Lock()
+        self._source = None
+        self._segments = []
+        self._open = {}
+        self._merging = False
+
+    @staticmethod
+    def enabled():
+        return current_app.config['FULLTEXT_INDEX']
+
+    # --- оновлення ---
+
+    def schedule(self, files):
+        """Index newly committed File rows in the background; returns the future or None."""
+        jobs = [(file.id, file.book_id, static_path(file.file_path), file.format)
+                for file in files if file.format in _EXTRACTORS]
+        if not jobs or not self.enabled():
+            return None
+        directory = index_dir()
+        return self.pool.submit(build_segment, directory, jobs, done=partial(self._built, directory))
+
+    def _built(self, directory, result):
+        name, files, errors = result
+        for file_id, error in errors:
+            current_app.logger.warning('Full-text indexing of file %s failed: %s', file_id, error)
+        if name is not None:
+            _install(directory, name, files)
+        self._merge_if_needed(directory)
+
+    def _merge_if_needed(self, directory):
+        entries = _read_manifest(directory)['segments']
+        if self._merging or len(entries) <= current_app.config['FULLTEXT_MERGE_SEGMENTS']:
+            return
+        self._merging = True
+        replaced = {entry['name']: list(entry['deleted']) for entry in entries}
+        try:
+            future = self.pool.submit(merge_segments, directory, entries,
+                                      done=partial(self._merged, directory, replaced))
+        except Exception:
+            self._merging = False
+            raise
+        # Виконується після _merged, а також коли злиття впало і _merged не викликано
+        future.add_done_callback(self._merge_finished)
+
+    def _merge_finished(self, future):
+        self._merging = False
+
+    def _merged(self, directory, replaced, result):
+        name, files = result
+        _install(directory, name, files, replaced=replaced)
+
+    def remove(self, file_ids):
+        """Mark files as deleted; their segments are cleaned up by the next merge."""
+        file_ids = set(file_ids)
+        directory = index_dir()
+        if not os.path.exists(os.path.join(directory, MANIFEST)):
+            return
+        with _locked(directory):
+            manifest = _read_manifest(directory)
+            changed = False
+            for entry in manifest['segments']:
+                hit = file_ids.intersection(entry['files']).difference(entry['deleted'])
+                if hit:
+                    entry['deleted'] = sorted(set(entry['deleted']) | hit)
+                    changed = True
+            if changed:
+                _write_manifest(directory, manifest)
+
+    # --- пошук ---
+
+    def _snapshot(self):
+        """[(deleted file ids, Segment)] of the current manifest; reopened when it changes."""
+        directory = index_dir()
+        path = os.path.join(directory, MANIFEST)
+        try:
+            stat = os.stat(path)
+            source = (path, stat.st_mtime_ns, stat.st_size)
+        except FileNotFoundError:
+            source = None
+        if source != self._source:
+            with self._lock:
+                if source != self._source:
+                    segments = []
+                    opened = {}
+                    for entry in (_read_manifest(directory)['segments'] if source else []):
+                        segment = self._open.get(entry['name'])
+                        if segment is None:
+                            try:
+                                segment = Segment(os.path.join(directory, entry['name']))
+                            except FileNotFoundError:
+                                # Сегмент щойно злито в інший: новий маніфест уже записано
+                                source = None
+                                continue
+                        opened[entry['name']] = segment
+                        segments.append((frozenset(entry['deleted']), segment))
+                    # Старі сегменти не закриваємо: ними ще можуть користуватися інші потоки
+                    self._open, self._segments, self._source = opened, segments, source
+        return self._segments
+
+    def search(self, query):
+        """Books containing the phrase `query`: [(book_id, [ContentHit, ...])], most hits first."""
+        terms = tokenize(query)
+        if not terms:
+            return []
+        results = defaultdict(list)
+        for deleted, segment in self._snapshot():
+            for doc, starts in segment.phrase(terms):
+                file_id, book_id, chapters = segment.docs[doc]
+                if file_id in deleted:
+                    continue
+                chapter_starts = [start for start, _ in chapters]
+                counts = Counter(max(0, bisect.bisect_right(chapter_starts, position) - 1)
+                                 for position in starts)
+                for chapter, count in sorted(counts.items()):
+                    title = chapters[chapter][1] if chapters else None
+                    results[book_id].append(ContentHit(file_id, chapter + 1, title, count))
+        return sorted(results.items(), key=lambda item: (-sum(hit.count for hit in item[1]), item[0]))
+
+
+def rebuild(workers=None, batch_size=50, echo=None):
+    """Index every active EPUB/FB2 file from scratch in parallel; returns (indexed, failed).
+
+    Segments added by uploads while the rebuild runs are kept.
+    """
+    directory = index_dir()
+    with _locked(directory):
+        started = _read_manifest(directory)['next_seq']
+    rows = db.session.query(File.id, File.book_id, File.file_path, File.format)\
+        .filter(File.is_active == True, File.format.in_(list(_EXTRACTORS)))\
+        .order_by(File.id).all()
+    db.session.commit()
+    jobs = [(file_id, book_id, static_path(path), file_format) for file_id, book_id, path, file_format in rows]
+
+    built = []
+    indexed = failed = 0
+    with process_executor(workers or os.cpu_count()) as pool:
+        futures = [pool.submit(build_segment, directory, jobs[start:start + batch_size])
+                   for start in range(0, len(jobs), batch_size)]
+        for future in as_completed(futures):
+            name, files, errors = future.result()
+            indexed += len(files)
+            failed += len(errors)
+            if echo:
+                for file_id, error in errors:
+                    echo(f'Файл {file_id}: {error}')
+            if name is not None:
+                built.append({'name': name, 'deleted': []})
+        name, files = pool.submit(merge_segments, directory, built).result()
+    for entry in built:
+        _remove(os.path.join(directory, entry['name']))
+    _install(directory, name, files, older_than=started)
+    return indexed, failed
+
+
+content_index = ContentIndex()
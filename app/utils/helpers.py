@@ -1,4 +1,8 @@
 """Helper functions for the application."""
+import hashlib
+from sqlalchemy import insert
+from sqlalchemy.dialects.mysql import insert as mysql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
 
 def allowed_file(filename, allowed_extensions):
     """Check if file extension is allowed."""
@@ -15,3 +19,72 @@ def format_file_size(size_bytes):
         return f"{size_bytes / (1024 * 1024):.1f} MB"
     else:
         return f"{size_bytes / (1024 * 1024 * 1024):.1f} GB"
+
+def file_checksum(path, chunk_size=1024 * 1024):
+    """SHA-256 of a file as a hex string, read in chunks."""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def normalize_isbn(value):
+    """Return the ISBN-13 form of an ISBN-10/13 string, or None if it is not one."""
+    if not value:
+        return None
+    isbn = ''.join(ch for ch in value.upper() if ch.isdigit() or ch == 'X')
+    if len(isbn) == 10 and isbn[:9].isdigit():
+        # ISBN-10 -> ISBN-13: префікс 978 і нова контрольна цифра
+        core = '978' + isbn[:9]
+    elif len(isbn) == 13 and isbn.isdigit():
+        return isbn
+    else:
+        return None
+    total = sum(int(d) * (1 if i % 2 == 0 else 3) for i, d in enumerate(core))
+    return core + str((10 - total % 10) % 10)
+
+def execute_upsert(connection, table, values, key, updates):
+    """INSERT `values` into `table`, or apply `updates` if the `key` row exists.
+
+    `key` is the primary key column name (or a list of names). Uses the
+    native upsert of MySQL and SQLite; other databases fall back to UPDATE
+    followed by INSERT when nothing was updated.
+    """
+    keys = [key] if isinstance(key, str) else list(key)
+    dialect = connection.dialect.name
+    if dialect == 'mysql':
+        connection.execute(mysql_insert(table).values(**values).on_duplicate_key_update(**updates))
+    elif dialect == 'sqlite':
+        connection.execute(sqlite_insert(table).values(**values)
+                           .on_conflict_do_update(index_elements=keys, set_=updates))
+    else:
+        condition = [table.c[name] == values[name] for name in keys]
+        result = connection.execute(table.update().where(*condition).values(**updates))
+        if result.rowcount == 0:
+            connection.execute(insert(table).values(**values))
+
+def execute_upsert_add(connection, table, rows, key, column, chunk_size=500):
+    """Insert `rows`, adding `column` to the existing value on key conflicts.
+
+    One statement executed with executemany on MySQL and SQLite (compiled
+    once; PyMySQL folds it into multi-row INSERTs), one upsert per row
+    elsewhere.
+    """
+    keys = [key] if isinstance(key, str) else list(key)
+    dialect = connection.dialect.name
+    if dialect == 'mysql':
+        stmt = mysql_insert(table)
+        stmt = stmt.on_duplicate_key_update({column: table.c[column] + stmt.inserted[column]})
+    elif dialect == 'sqlite':
+        stmt = sqlite_insert(table)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=keys, set_={column: table.c[column] + stmt.excluded[column]})
+    else:
+        stmt = None
+    for start in range(0, len(rows), chunk_size):
+        chunk = rows[start:start + chunk_size]
+        if stmt is not None:
+            connection.execute(stmt, chunk)
+        else:
+            for row in chunk:
+                execute_upsert(connection, table, row, keys, {column: table.c[column] + row[column]})
@@ -0,0 +1,194 @@
+"""Cached identity of the logged-in user for Flask-Login.
+
+Instead of loading the User row on every authenticated request, the user
+loader returns a `CurrentUser` built from a per-process snapshot (id,
+username, role, is_active, version) kept for USER_CACHE_TTL seconds. The
+full ORM User is loaded only when a view or template touches anything else
+(email, favorites, set_password, ...) or assigns to an attribute, once per
+request.
+
+Every ORM flush that changes a User row bumps `users.version`; after the
+commit the process drops its snapshot and refuses older versions from
+loads that raced with the change. Other worker processes pick the change
+up when their snapshot expires, so USER_CACHE_TTL bounds how long a
+deactivated user or a changed role stays visible there. Deactivated users
+are logged out: the loader returns None for them.
+"""
+import threading
+import time
+from collections import namedtuple
+from flask import current_app
+from sqlalchemy import event, inspect, select
+from sqlalchemy.orm import Session
+from app import db, login_manager
+from app.models import User
+
+UserSnapshot = namedtuple('UserSnapshot', 'id username role active version')
+
+# Зміни цих стовпців не потребують скидання знімка (вхід оновлює лише час)
+_IGNORED_COLUMNS = {'last_login_at', 'version'}
+
+
+class CurrentUser:
+    """Stands in for User as `current_user`; built per request from a snapshot."""
+    is_authenticated = True
+    is_anonymous = False
+
+    def __init__(self, snapshot):
+        object.__setattr__(self, '_snapshot', snapshot)
+        object.__setattr__(self, '_user', None)
+
+    @property
+    def id(self):
+        return self._snapshot.id
+
+    @property
+    def username(self):
+        return self._snapshot.username
+
+    @property
+    def role(self):
+        return self._snapshot.role
+
+    @property
+    def is_active(self):
+        return self._snapshot.active
+
+    @property
+    def version(self):
+        return self._snapshot.version
+
+    def get_id(self):
+        return str(self._snapshot.id)
+
+    def is_admin(self):
+        return self._snapshot.role == 'admin'
+
+    @property
+    def user(self):
+        """The full ORM User, loaded on first use in the request."""
+        if self._user is None:
+            object.__setattr__(self, '_user', db.session.get(User, self._snapshot.id))
+        return self._user
+
+    def __getattr__(self, name):
+        return getattr(self.user, name)
+
+    def __setattr__(self, name, value):
+        # Зміни йдуть в ORM-об'єкт; flush скине знімок
+        setattr(self.user, name, value)
+
+    def __eq__(self, other):
+        if isinstance(other, (CurrentUser, User)):
+            return self.id == other.id
+        return NotImplemented
+
+    def __hash__(self):
+        return hash(self._snapshot.id)
+
+    def __repr__(self):
+        return f'<CurrentUser {self.username}>'
+
+
+def _changed(user):
+    state = inspect(user)
+    return any(attr.history.has_changes() for attr in state.attrs
+               if attr.key in User.__table__.c and attr.key not in _IGNORED_COLUMNS)
+
+
+def _before_flush(session, flush_context, instances):
+    # user_id -> нова версія (None для видалених), скидається після commit
+    changed = session.info.setdefault('identity_changed', {})
+    for obj in session.dirty:
+        if isinstance(obj, User) and _changed(obj):
+            obj.version = (obj.version or 0) + 1
+            changed[obj.id] = obj.version
+    for obj in session.deleted:
+        if isinstance(obj, User):
+            changed[obj.id] = None
+
+
+def _after_commit(session):
+    changed = session.info.pop('identity_changed', None)
+    if changed:
+        user_identities.invalidate(changed)
+
+
+def _after_rollback(session):
+    session.info.pop('identity_changed', None)
+
+
+class IdentityCache:
+    """Per-process TTL cache of user snapshots."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        # user_id -> (знімок, момент закінчення)
+        self._entries = {}
+        # user_id -> найменша версія, яку ще можна кешувати
+        self._min_versions = {}
+
+    def init_app(self, app):
+        login_manager.user_loader(self.load)
+        if not event.contains(Session, 'before_flush', _before_flush):
+            event.listen(Session, 'before_flush', _before_flush)
+            event.listen(Session, 'after_commit', _after_commit)
+            event.listen(Session, 'after_rollback', _after_rollback)
+
+    def snapshot(self, user_id):
+        """The cached snapshot of `user_id`, loaded with one narrow query when missing or expired."""
+        entry = self._entries.get(user_id)
+        if entry is not None and entry[1] > time.monotonic():
+            return entry[0]
+
+        row = db.session.execute(
+            select(User.id, User.username, User.role, User.is_active, User.version).where(User.id == user_id)
+        ).first()
+        if row is None:
+            self._entries.pop(user_id, None)
+            return None
+        snapshot = UserSnapshot(row.id, row.username, row.role, bool(row.is_active), row.version)
+        self._put(snapshot)
+        return snapshot
+
+    def _put(self, snapshot):
+        ttl = current_app.config['USER_CACHE_TTL']
+        if ttl <= 0:
+            return
+        with self._lock:
+            # Знімок, прочитаний до зміни, що вже скинула кеш, не кешуємо
+            if snapshot.version < self._min_versions.get(snapshot.id, 0):
+                return
+            current = self._entries.get(snapshot.id)
+            if current is not None and current[0].version > snapshot.version:
+                return
+            self._entries[snapshot.id] = (snapshot, time.monotonic() + ttl)
+
+    def invalidate(self, versions):
+        """Drop the snapshots of changed users ({user_id: new version or None if deleted})."""
+        with self._lock:
+            for user_id, version in versions.items():
+                self._entries.pop(user_id, None)
+                if version is None:
+                    self._min_versions.pop(user_id, None)
+                else:
+                    self._min_versions[user_id] = version
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._min_versions.clear()
+
+    def load(self, user_id):
+        """Flask-Login user loader: a CurrentUser, or None for unknown or deactivated users."""
+        try:
+            user_id = int(user_id)
+        except (TypeError, ValueError):
+            return None
+        snapshot = self.snapshot(user_id)
+        if snapshot is None or not snapshot.active:
+            return None
+        return CurrentUser(snapshot)
+
+
+user_identities = IdentityCache()
@@ -0,0 +1,426 @@
+"""Bulk import of a book catalog from CSV, JSON Lines or ONIX.
+
+`flask catalog import books.csv --files-dir ./export` reads the source as
+a stream, one record at a time, and writes books in batches:
+
+- authors and genres are resolved through name -> id maps loaded once;
+  missing ones are created with the batch;
+- books are deduplicated by normalized ISBN, against the database and
+  within the source (books without an ISBN are always added);
+- authors, genres, books, their link rows and files are inserted with
+  Core insert() executemany and ids assigned up front (as seed_data.py
+  does), one transaction per batch; run imports while nobody else is
+  adding books or authors;
+- covers and ebook files named in the records are read from `files_dir`
+  and stored in the blob storage (app/utils/storage.py) by a thread pool
+  before the batch is written.
+
+After every batch the number of records read is saved in a checkpoint
+file; an interrupted import started again continues from there. If it
+stopped between storing the files and writing the batch, `flask storage
+recount` drops the extra blob references.
+
+Record fields (CSV columns, JSON keys): title, original_title, authors
+and genres (lists, or strings separated by ';'), isbn, language,
+publisher, publication_year, description, cover and files (paths
+relative to `files_dir`; files separated by ';'). ONIX 3.0 and 2.1 with
+reference tag names are read from <Product> records; short tags are not
+supported.
+"""
+import csv
+import json
+import os
+import time
+import xml.etree.ElementTree as ET
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from flask import current_app
+from sqlalchemy import func, insert, select
+from app import db
+from app.forms import LANGUAGE_CHOICES
+from app.models import Author, Book, BookAuthor, BookGenre, File, Genre
+from app.utils.helpers import normalize_isbn
+from app.utils.metadata import language_code, split_name
+from app.utils.storage import extension_of, store
+
+FORMATS = ('csv', 'jsonl', 'onix')
+_LANGUAGE_CODES = {code for code, _ in LANGUAGE_CHOICES}
+_ISBN_TYPES = {'15', '03', '02'}  # ONIX ProductIDType: ISBN-13, GTIN-13, ISBN-10
+
+ImportResult = namedtuple('ImportResult', 'read imported duplicates invalid authors genres files missing seconds')
+
+
+# --- джерела ---
+
+def _local(tag):
+    return tag.rsplit('}', 1)[-1] if isinstance(tag, str) else ''
+
+
+def _read_csv(path):
+    with open(path, encoding='utf-8-sig', newline='') as f:
+        yield from csv.DictReader(f)
+
+
+def _read_jsonl(path):
+    with open(path, encoding='utf-8') as f:
+        for number, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            try:
+                yield json.loads(line)
+            except ValueError as exc:
+                yield ValueError(f'рядок {number}: {exc}')
+
+
+def _text(element):
+    return ' '.join(''.join(element.itertext()).split()) if element is not None else ''
+
+
+def _child(element, name):
+    return next((child for child in element if _local(child.tag) == name), None)
+
+
+def _descendants(element, name):
+    return [child for child in element.iter() if _local(child.tag) == name]
+
+
+def _onix_name(contributor):
+    for tag in ('PersonName', 'CorporateName'):
+        name = _text(_child(contributor, tag))
+        if name:
+            return name
+    inverted = _text(_child(contributor, 'PersonNameInverted'))
+    if inverted:
+        return inverted
+    return ' '.join(part for part in (_text(_child(contributor, 'NamesBeforeKey')),
+                                      _text(_child(contributor, 'KeyNames'))) if part)
+
+
+def _onix_product(product):
+    """Record of one ONIX <Product> (3.0 or 2.1 reference tags)."""
+    record = {'authors': [], 'genres': []}
+    for identifier in _descendants(product, 'ProductIdentifier'):
+        if _text(_child(identifier, 'ProductIDType')) in _ISBN_TYPES and not record.get('isbn'):
+            record['isbn'] = _text(_child(identifier, 'IDValue'))
+    # 3.0: TitleDetail/TitleElement, 2.1: Title; тип 01 — назва, 03 — назва мовою оригіналу
+    for title in _descendants(product, 'TitleDetail') + _descendants(product, 'Title'):
+        text = _text(next(iter(_descendants(title, 'TitleText')), None))
+        if not text:
+            text = ' '.join(part for part in (_text(next(iter(_descendants(title, 'TitlePrefix')), None)),
+                                              _text(next(iter(_descendants(title, 'TitleWithoutPrefix')), None)))
+                            if part)
+        field = {'01': 'title', '03': 'original_title'}.get(_text(_child(title, 'TitleType')))
+        if text and field and not record.get(field):
+            record[field] = text
+    for contributor in _descendants(product, 'Contributor'):
+        roles = [_text(role) for role in _descendants(contributor, 'ContributorRole')]
+        name = _onix_name(contributor)
+        if name and any(role.startswith('A01') for role in roles):
+            record['authors'].append(name)
+    for language in _descendants(product, 'Language'):
+        if _text(_child(language, 'LanguageRole')) in ('01', '') and not record.get('language'):
+            record['language'] = _text(_child(language, 'LanguageCode'))
+    for subject in _descendants(product, 'Subject'):
+        heading = _text(_child(subject, 'SubjectHeadingText'))
+        if heading:
+            record['genres'].append(heading)
+    publisher = next(iter(_descendants(product, 'PublisherName')), None)
+    record['publisher'] = _text(publisher) or None
+    dates = [_text(_child(date, 'Date')) for date in _descendants(product, 'PublishingDate')]
+    dates += [_text(date) for date in _descendants(product, 'PublicationDate')]
+    record['publication_year'] = next((date[:4] for date in dates if date[:4].isdigit()), None)
+    # 3.0: TextContent (TextType 03 — опис), 2.1: OtherText (TextTypeCode 01)
+    for content in _descendants(product, 'TextContent') + _descendants(product, 'OtherText'):
+        kind = _text(_child(content, 'TextType')) or _text(_child(content, 'TextTypeCode'))
+        if kind in ('01', '02', '03') and not record.get('description'):
+            record['description'] = _text(_child(content, 'Text'))
+    for resource in _descendants(product, 'SupportingResource'):
+        link = _text(next(iter(_descendants(resource, 'ResourceLink')), None))
+        if _text(_child(resource, 'ResourceContentType')) == '01' and link and '://' not in link:
+            record['cover'] = link
+    return record
+
+
+def _read_onix(path):
+    root = None
+    with open(path, 'rb') as f:
+        for event, element in ET.iterparse(f, events=('start', 'end')):
+            if event == 'start':
+                if root is None:
+                    root = element
+                continue
+            if _local(element.tag) == 'Product':
+                yield _onix_product(element)
+                # Прочитаний запис більше не потрібен
+                element.clear()
+                root.clear()
+
+
+_READERS = {'csv': _read_csv, 'jsonl': _read_jsonl, 'onix': _read_onix}
+
+
+def detect_format(path):
+    """Source format from the file extension, or None."""
+    extension = extension_of(path)
+    return {'csv': 'csv', 'jsonl': 'jsonl', 'ndjson': 'jsonl', 'xml': 'onix', 'onix': 'onix'}.get(extension)
+
+
+# --- нормалізація запису ---
+
+def _clean(value, length=None):
+    value = ' '.join(str(value).split()) if value is not None else ''
+    return (value[:length] if length else value) or None
+
+
+def _list(value):
+    if not value:
+        return []
+    if isinstance(value, str):
+        value = value.split(';')
+    return [item for item in (_clean(item) for item in value) if item]
+
+
+def _author_key(fields):
+    return tuple((fields[name] or '').casefold() for name in ('first_name', 'middle_name', 'last_name'))
+
+
+def normalize_record(raw):
+    """Validated book fields of a source record; raises ValueError."""
+    if isinstance(raw, Exception):
+        raise raw
+    title = _clean(raw.get('title'), 255)
+    if not title:
+        raise ValueError('немає назви')
+    year = _clean(raw.get('publication_year'))
+    try:
+        year = int(year) if year else None
+    except ValueError:
+        raise ValueError(f'некоректний рік: {year}')
+    language = language_code(_clean(raw.get('language')))
+    authors = []
+    for name in _list(raw.get('authors')):
+        fields = split_name(name)
+        if fields['last_name']:
+            authors.append({key: value[:100] if value else value for key, value in fields.items()})
+    return {
+        'title': title,
+        'original_title': _clean(raw.get('original_title'), 255),
+        'description': _clean(raw.get('description')),
+        'isbn': normalize_isbn(_clean(raw.get('isbn'))),
+        'language': language if language in _LANGUAGE_CODES else None,
+        'publisher': _clean(raw.get('publisher'), 200),
+        'publication_year': year,
+        'authors': authors,
+        'genres': [name[:100] for name in _list(raw.get('genres'))],
+        'cover': _clean(raw.get('cover')),
+        'files': _list(raw.get('files')),
+    }
+
+
+# --- контрольна точка ---
+
+def _read_checkpoint(path, source):
+    try:
+        with open(path, encoding='utf-8') as f:
+            checkpoint = json.load(f)
+    except FileNotFoundError:
+        return None
+    return checkpoint if checkpoint.get('source') == os.path.abspath(source) else None
+
+
+def _write_checkpoint(path, checkpoint):
+    temp = f'{path}.tmp'
+    with open(temp, 'w', encoding='utf-8') as f:
+        json.dump(checkpoint, f)
+    os.replace(temp, path)
+
+
+# --- імпорт ---
+
+class _Importer:
+    def __init__(self, files_dir, workers, echo):
+        self.files_dir = files_dir
+        self.workers = workers
+        self.echo = echo
+        self.app = current_app._get_current_object()
+        self.allowed = current_app.config['ALLOWED_EXTENSIONS']
+        self.counts = dict.fromkeys(('imported', 'duplicates', 'invalid', 'authors', 'genres', 'files', 'missing'), 0)
+
+        # Словники назва -> id, завантажені один раз
+        self.authors = {_author_key({'first_name': first, 'middle_name': middle, 'last_name': last}): author_id
+                        for author_id, first, middle, last in db.session.query(
+                            Author.id, Author.first_name, Author.middle_name, Author.last_name)}
+        self.genres = {name.casefold(): genre_id for genre_id, name in db.session.query(Genre.id, Genre.name)}
+        self.isbns = {normalize_isbn(isbn) for (isbn,) in db.session.query(Book.isbn).filter(Book.isbn.isnot(None))}
+        self.isbns.discard(None)
+        db.session.commit()
+        self.batch = []
+
+    def add(self, record):
+        if record['isbn']:
+            if record['isbn'] in self.isbns:
+                self.counts['duplicates'] += 1
+                return
+            self.isbns.add(record['isbn'])
+        self.batch.append(record)
+
+    def _path(self, relative):
+        if not relative or not self.files_dir:
+            return None
+        path = os.path.normpath(os.path.join(self.files_dir, relative))
+        if not os.path.isfile(path):
+            self.counts['missing'] += 1
+            if self.echo:
+                self.echo(f'Файл не знайдено: {relative}')
+            return None
+        return path
+
+    def _store(self, path):
+        # Кожен потік пулу працює у власному контексті застосунку (і власній сесії)
+        with self.app.app_context():
+            try:
+                with open(path, 'rb') as f:
+                    stored = store(f, extension_of(path))
+                db.session.commit()
+                return stored
+            finally:
+                db.session.remove()
+
+    def _attach(self, pool):
+        """Store the covers and files of the batch; returns {(record index, key): StoredBlob}."""
+        jobs = {}
+        for index, record in enumerate(self.batch):
+            path = self._path(record['cover'])
+            if path:
+                jobs[(index, 'cover')] = path
+            for number, relative in enumerate(record['files']):
+                if extension_of(relative) not in self.allowed:
+                    self.counts['missing'] += 1
+                    if self.echo:
+                        self.echo(f'Формат не підтримується: {relative}')
+                    continue
+                path = self._path(relative)
+                if path:
+                    jobs[(index, number)] = path
+        futures = {key: pool.submit(self._store, path) for key, path in jobs.items()}
+        return {key: future.result() for key, future in futures.items()}
+
+    @staticmethod
+    def _next_id(connection, model):
+        return (connection.execute(select(func.max(model.id))).scalar() or 0) + 1
+
+    def flush(self, pool):
+        if not self.batch:
+            return
+        stored = self._attach(pool)
+        with db.engine.begin() as connection:
+            new_authors = []
+            new_genres = []
+            author_id = self._next_id(connection, Author)
+            genre_id = self._next_id(connection, Genre)
+            for record in self.batch:
+                for fields in record['authors']:
+                    key = _author_key(fields)
+                    if key not in self.authors:
+                        self.authors[key] = author_id
+                        new_authors.append(dict(fields, id=author_id))
+                        author_id += 1
+                for name in record['genres']:
+                    if name.casefold() not in self.genres:
+                        self.genres[name.casefold()] = genre_id
+                        new_genres.append({'id': genre_id, 'name': name})
+                        genre_id += 1
+
+            books = []
+            book_authors = []
+            book_genres = []
+            files = []
+            book_id = self._next_id(connection, Book)
+            for index, record in enumerate(self.batch):
+                cover = stored.get((index, 'cover'))
+                books.append({
+                    'id': book_id,
+                    'title': record['title'],
+                    'original_title': record['original_title'],
+                    'description': record['description'],
+                    'isbn': record['isbn'],
+                    'language': record['language'],
+                    'publisher': record['publisher'],
+                    'publication_year': record['publication_year'],
+                    'cover_image_path': cover.path if cover else None,
+                    'is_active': True,
+                })
+                authors = list(dict.fromkeys(self.authors[_author_key(fields)] for fields in record['authors']))
+                book_authors.extend({'book_id': book_id, 'author_id': author, 'order_index': order}
+                                    for order, author in enumerate(authors))
+                book_genres.extend({'book_id': book_id, 'genre_id': genre}
+                                   for genre in dict.fromkeys(self.genres[name.casefold()] for name in record['genres']))
+                for number, relative in enumerate(record['files']):
+                    blob = stored.get((index, number))
+                    if blob:
+                        files.append({'book_id': book_id, 'file_path': blob.path, 'format': extension_of(relative),
+                                      'file_size': blob.size, 'checksum': blob.sha256, 'is_active': True})
+                book_id += 1
+
+            # Батьківські таблиці першими, щоб зовнішні ключі розв'язувалися
+            for model, rows in ((Author, new_authors), (Genre, new_genres), (Book, books),
+                                (BookAuthor, book_authors), (BookGenre, book_genres), (File, files)):
+                if rows:
+                    connection.execute(insert(model), rows)
+
+        self.counts['imported'] += len(books)
+        self.counts['authors'] += len(new_authors)
+        self.counts['genres'] += len(new_genres)
+        self.counts['files'] += len(files)
+        self.batch = []
+
+
+def import_catalog(source, file_format=None, batch_size=1000, files_dir=None, workers=4,
+                   checkpoint=None, restart=False, echo=None):
+    """Import books from `source`; returns an ImportResult.
+
+    Progress is saved to the `checkpoint` file (default `<source>.checkpoint`)
+    after every batch and the file is removed when the import finishes.
+    """
+    file_format = file_format or detect_format(source)
+    if file_format not in FORMATS:
+        raise ValueError(f'Unknown catalog format: {source}')
+    checkpoint = checkpoint or f'{source}.checkpoint'
+    state = None if restart else _read_checkpoint(checkpoint, source)
+    skip = state['position'] if state else 0
+
+    importer = _Importer(files_dir, workers, echo)
+    if state:
+        for key in importer.counts:
+            importer.counts[key] = state['counts'].get(key, 0)
+        if echo:
+            echo(f'Продовження з запису {skip}')
+
+    started = time.monotonic()
+    position = skip
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        def save():
+            importer.flush(pool)
+            _write_checkpoint(checkpoint, {'source': os.path.abspath(source), 'format': file_format,
+                                           'position': position, 'counts': importer.counts})
+            if echo:
+                elapsed = max(time.monotonic() - started, 1e-6)
+                echo(f'Записів: {position} ({(position - skip) / elapsed:,.0f} рядків/с)')
+
+        for number, raw in enumerate(_READERS[file_format](source)):
+            if number < skip:
+                continue
+            position = number + 1
+            try:
+                importer.add(normalize_record(raw))
+            except ValueError as exc:
+                importer.counts['invalid'] += 1
+                if echo:
+                    echo(f'Запис {position}: {exc}')
+            if len(importer.batch) >= batch_size:
+                save()
+        save()
+
+    if os.path.exists(checkpoint):
+        os.remove(checkpoint)
+    return ImportResult(read=position - skip, seconds=time.monotonic() - started, **importer.counts)
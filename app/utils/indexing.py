@@ -0,0 +1,67 @@
+"""Base class for per-process in-memory indexes built from the database."""
+import threading
+import time
+from flask import current_app
+
+
+class RefreshingIndex:
+    """In-memory structure that each worker process builds from the database.
+
+    Subclasses implement `_build()` returning the new data and `_swap(data)`
+    installing it. Routes keep the index current with incremental updates.
+    A full rebuild runs in the background once the data is older than the
+    config value named by `max_age_setting`, which picks up writes made by
+    other workers.
+    """
+    max_age_setting = 'SEARCH_INDEX_MAX_AGE'
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._built_at = None
+        self._rebuilding = False
+
+    @property
+    def is_built(self):
+        return self._built_at is not None
+
+    def _build(self):
+        raise NotImplementedError
+
+    def _swap(self, data):
+        raise NotImplementedError
+
+    def rebuild(self):
+        data = self._build()
+        with self._lock:
+            self._swap(data)
+            self._built_at = time.monotonic()
+        return data
+
+    def _rebuild_in_background(self, app):
+        try:
+            with app.app_context():
+                self.rebuild()
+        except Exception:
+            app.logger.exception('%s rebuild failed', type(self).__name__)
+        finally:
+            self._rebuilding = False
+
+    def start_background_rebuild(self):
+        if self._rebuilding:
+            return
+        self._rebuilding = True
+        threading.Thread(target=self._rebuild_in_background,
+                         args=(current_app._get_current_object(),), daemon=True).start()
+
+    def ensure_fresh(self, block=True):
+        """Build on first use (or skip if `block` is False and a build is running)."""
+        if not self.is_built:
+            if self._rebuilding and not block:
+                return
+            with self._lock:
+                if not self.is_built:
+                    self.rebuild()
+            return
+        max_age = current_app.config[self.max_age_setting]
+        if max_age and time.monotonic() - self._built_at > max_age:
+            self.start_background_rebuild()
@@ -0,0 +1,118 @@
+"""Long-running maintenance jobs with progress stored in the database.
+
+A job is a function accepting a `progress` callable. `run_job` runs it
+in the calling thread (CLI), `start_job` in a background thread of the
+current process (admin pages). Either way the `maintenance_jobs` row
+records its status and progress, so any worker can display it, and at
+most one run of a job is active at a time. A running job that has not
+reported progress for JOB_STALE_AFTER seconds counts as dead (its
+process was killed) and may be started again.
+"""
+import threading
+from datetime import datetime, timedelta
+from flask import current_app
+from sqlalchemy import or_, update
+from app import db
+from app.models import MaintenanceJob
+from app.utils.helpers import execute_upsert
+
+JOB_STALE_AFTER = 600
+
+
+class JobAlreadyRunning(RuntimeError):
+    """Another run of the job is in progress."""
+
+
+class JobProgress:
+    """Callable passed to a job: progress(processed, total=None, message=None).
+
+    Each call is written in its own short transaction, independent of the
+    job's own session. `echo` additionally receives the formatted line.
+    """
+
+    def __init__(self, name, echo=None):
+        self.name = name
+        self.echo = echo
+
+    def _save(self, **values):
+        values['updated_at'] = datetime.utcnow()
+        with db.engine.begin() as connection:
+            connection.execute(update(MaintenanceJob)
+                               .where(MaintenanceJob.name == self.name).values(**values))
+
+    def __call__(self, processed, total=None, message=None):
+        values = {'processed': processed}
+        if total is not None:
+            values['total'] = total
+        if message is not None:
+            values['message'] = message[:255]
+        self._save(**values)
+        if self.echo is not None:
+            line = f'{processed}/{total}' if total else str(processed)
+            self.echo(f'{line} {message}' if message else line)
+
+    def finish(self, status, message=None):
+        values = {'status': status, 'finished_at': datetime.utcnow()}
+        if message is not None:
+            values['message'] = message[:255]
+        self._save(**values)
+
+
+def claim_job(name):
+    """Mark the job as running; False if a live run already holds it."""
+    now = datetime.utcnow()
+    table = MaintenanceJob.__table__
+    with db.engine.begin() as connection:
+        execute_upsert(connection, table, {'name': name, 'status': 'idle', 'processed': 0},
+                       'name', {'name': table.c.name})
+        claimed = connection.execute(
+            update(MaintenanceJob)
+            .where(MaintenanceJob.name == name,
+                   or_(MaintenanceJob.status != 'running',
+                       MaintenanceJob.updated_at < now - timedelta(seconds=JOB_STALE_AFTER)))
+            .values(status='running', processed=0, total=None, message=None,
+                    started_at=now, updated_at=now, finished_at=None)
+        ).rowcount
+    return bool(claimed)
+
+
+def _run_claimed(name, target, echo, kwargs):
+    progress = JobProgress(name, echo)
+    try:
+        result = target(progress=progress, **kwargs)
+    except Exception as exc:
+        db.session.rollback()
+        progress.finish('failed', f'{type(exc).__name__}: {exc}')
+        raise
+    progress.finish('done')
+    return result
+
+
+def run_job(name, target, echo=None, **kwargs):
+    """Run `target(progress=..., **kwargs)` in this thread and return its result."""
+    if not claim_job(name):
+        raise JobAlreadyRunning(name)
+    return _run_claimed(name, target, echo, kwargs)
+
+
+def _run_in_background(app, name, target, kwargs):
+    with app.app_context():
+        try:
+            _run_claimed(name, target, None, kwargs)
+        except Exception:
+            app.logger.exception('Maintenance job %s failed', name)
+
+
+def start_job(name, target, **kwargs):
+    """Start `target` in a background thread; False if the job is already running."""
+    if not claim_job(name):
+        return False
+    threading.Thread(target=_run_in_background,
+                     args=(current_app._get_current_object(), name, target, kwargs),
+                     name=f'job-{name}', daemon=True).start()
+    return True
+
+
+def job_status(name):
+    """The MaintenanceJob row of `name`, or None if it never ran."""
+    return db.session.get(MaintenanceJob, name)
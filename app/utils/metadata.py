@@ -0,0 +1,488 @@
+"""Metadata extraction from uploaded ebook files (EPUB, FB2, PDF).
+
+After `books.upload_files` commits, every new file is parsed in a worker
+process (app/utils/workers.py) and the result is kept in `file_metadata`
+as a suggestion: title, authors, language, ISBN, publisher, year and the
+embedded cover, which goes to the blob storage. The edit form of the book
+lists the suggestions and `apply_suggestion()` copies one into the book
+in a single click.
+
+The parsers never read a whole file into memory:
+
+- EPUB: only META-INF/container.xml, the OPF package document (parsed
+  incrementally) and the cover image are read from the zip;
+- FB2: the XML is parsed incrementally and elements are discarded once
+  read; parsing stops after <description> unless the cover, stored as a
+  <binary> near the end, is still needed;
+- PDF: the Info dictionary is located through the trailer at the end of
+  the file and the cross-reference table, or by a chunked scan for the
+  object. An Info dictionary inside a compressed object stream is not
+  supported, and a PDF has no cover to extract.
+"""
+import base64
+import io
+import os
+import posixpath
+import re
+import zipfile
+import xml.etree.ElementTree as ET
+from datetime import datetime
+from functools import partial
+from urllib.parse import unquote
+from flask import current_app
+from app import db
+from app.forms import LANGUAGE_CHOICES
+from app.models import Author, Book, BookAuthor, File, FileMetadata
+from app.utils.helpers import normalize_isbn
+from app.utils.storage import release, retain, static_path, store
+from app.utils.workers import ProcessPool, process_executor
+
+# Обкладинки, більші за це, не зберігаються
+MAX_COVER_SIZE = 10 * 1024 * 1024
+CHUNK_SIZE = 1024 * 1024
+PDF_TAIL = 64 * 1024
+
+_IMAGE_TYPES = {'image/jpeg': 'jpg', 'image/jpg': 'jpg', 'image/png': 'png',
+                'image/gif': 'gif', 'image/webp': 'webp'}
+# ISO 639-2 -> коди форми книги
+_LANGUAGES = {'ukr': 'uk', 'eng': 'en', 'rus': 'ru', 'deu': 'de', 'ger': 'de', 'fra': 'fr', 'fre': 'fr'}
+_YEAR = re.compile(r'\b(1[5-9]\d\d|20\d\d)\b')
+
+
+def _local(tag):
+    """Tag or attribute name without its namespace."""
+    return tag.rsplit('}', 1)[-1] if isinstance(tag, str) else ''
+
+
+def _attr(element, name):
+    for key, value in element.attrib.items():
+        if _local(key) == name:
+            return value
+    return None
+
+
+def _text(element):
+    return ' '.join((element.text or '').split()) or None
+
+
+def split_name(name):
+    """'Шевченко, Тарас' or 'Тарас Григорович Шевченко' -> author fields."""
+    name = ' '.join(name.split())
+    if ',' in name:
+        last, first = (part.strip() for part in name.split(',', 1))
+        return {'first_name': first, 'middle_name': None, 'last_name': last}
+    parts = name.split(' ')
+    if len(parts) == 1:
+        return {'first_name': '', 'middle_name': None, 'last_name': parts[0]}
+    return {'first_name': parts[0], 'middle_name': ' '.join(parts[1:-1]) or None, 'last_name': parts[-1]}
+
+
+def _split_authors(value):
+    """Author list from a free-form string ('A; B', 'A & B', 'A, B' where both have spaces)."""
+    parts = [part.strip() for part in re.split(r'[;&]', value) if part.strip()]
+    if len(parts) == 1 and ',' in value:
+        pieces = [piece.strip() for piece in value.split(',') if piece.strip()]
+        # "Прізвище, Ім'я" - одна особа; "Ім'я Прізвище, Ім'я Прізвище" - кілька
+        if len(pieces) > 1 and all(' ' in piece for piece in pieces):
+            parts = pieces
+    return [split_name(part) for part in parts]
+
+
+def language_code(value):
+    """Two-letter code of a language tag ('uk-UA', 'ukr' -> 'uk')."""
+    if not value:
+        return None
+    code = re.split(r'[-_]', value.strip().lower())[0]
+    return _LANGUAGES.get(code, code)[:10]
+
+
+def _year(value):
+    match = _YEAR.search(value or '')
+    return int(match.group(1)) if match else None
+
+
+def _isbn(value):
+    if not value:
+        return None
+    value = re.sub(r'^(urn:)?isbn:?', '', value.strip(), flags=re.IGNORECASE)
+    return normalize_isbn(value)
+
+
+# --- EPUB ---
+
+def epub_rootfile(archive):
+    """Name of the OPF package document inside an open EPUB zip, or None."""
+    with archive.open('META-INF/container.xml') as f:
+        return next((_attr(el, 'full-path') for _, el in ET.iterparse(f)
+                     if _local(el.tag) == 'rootfile'), None)
+
+
+def _epub(path):
+    result = {'authors': []}
+    with zipfile.ZipFile(path) as archive:
+        rootfile = epub_rootfile(archive)
+        if not rootfile:
+            return result
+
+        cover_id = None
+        items = {}
+        with archive.open(rootfile) as f:
+            for event, element in ET.iterparse(f, events=('start', 'end')):
+                tag = _local(element.tag)
+                if event == 'start':
+                    # Після маніфесту метаданих уже не буде
+                    if tag == 'spine':
+                        break
+                    continue
+                if tag == 'title' and 'title' not in result:
+                    result['title'] = _text(element)
+                elif tag == 'creator':
+                    role = _attr(element, 'role')
+                    name = _attr(element, 'file-as') if ',' in (_attr(element, 'file-as') or '') else _text(element)
+                    if name and role in (None, 'aut'):
+                        result['authors'].append(split_name(name))
+                elif tag == 'language' and 'language' not in result:
+                    result['language'] = language_code(_text(element))
+                elif tag == 'identifier' and not result.get('isbn'):
+                    scheme = (_attr(element, 'scheme') or '').lower()
+                    text = _text(element) or ''
+                    if scheme == 'isbn' or 'isbn' in text.lower() or normalize_isbn(text):
+                        result['isbn'] = _isbn(text)
+                elif tag == 'publisher' and 'publisher' not in result:
+                    result['publisher'] = _text(element)
+                elif tag == 'date' and 'year' not in result:
+                    result['year'] = _year(_text(element))
+                elif tag == 'meta' and _attr(element, 'name') == 'cover':
+                    cover_id = _attr(element, 'content')
+                elif tag == 'item':
+                    items[element.get('id')] = element.attrib.copy()
+                    if 'cover-image' in (element.get('properties') or '').split():
+                        cover_id = cover_id or element.get('id')
+
+        item = items.get(cover_id)
+        if item is not None:
+            name = posixpath.normpath(posixpath.join(posixpath.dirname(rootfile), unquote(item.get('href', ''))))
+            extension = _IMAGE_TYPES.get(item.get('media-type'))
+            try:
+                info = archive.getinfo(name)
+            except KeyError:
+                info = None
+            if extension and info is not None and info.file_size <= MAX_COVER_SIZE:
+                result['cover'] = archive.read(info)
+                result['cover_extension'] = extension
+    return result
+
+
+# --- FB2 ---
+
+def _fb2(path):
+    result = {'authors': []}
+    stack = []
+    root = None
+    author = None
+    cover_id = None
+    done_description = False
+    with open(path, 'rb') as f:
+        for event, element in ET.iterparse(f, events=('start', 'end')):
+            tag = _local(element.tag)
+            if event == 'start':
+                if root is None:
+                    root = element
+                stack.append(tag)
+                if tag == 'author' and stack[-2:-1] == ['title-info']:
+                    author = {'first_name': '', 'middle_name': None, 'last_name': ''}
+                continue
+            stack.pop()
+            parent = stack[-1] if stack else None
+
+            if not done_description:
+                if parent == 'title-info':
+                    if tag == 'book-title':
+                        result['title'] = _text(element)
+                    elif tag == 'lang':
+                        result['language'] = language_code(_text(element))
+                    elif tag == 'author' and author is not None:
+                        if author['last_name'] or author['first_name']:
+                            result['authors'].append(author)
+                        author = None
+                    elif tag == 'date' and 'year' not in result:
+                        result['year'] = _year(_attr(element, 'value') or _text(element))
+                elif parent == 'author' and author is not None and tag in ('first-name', 'middle-name', 'last-name'):
+                    author[tag.replace('-', '_')] = _text(element) or ('' if tag != 'middle-name' else None)
+                elif parent == 'coverpage' and tag == 'image' and stack[-2:-1] == ['title-info']:
+                    cover_id = (_attr(element, 'href') or '').lstrip('#') or None
+                elif parent == 'publish-info':
+                    if tag == 'publisher':
+                        result['publisher'] = _text(element)
+                    elif tag == 'year':
+                        result['year'] = _year(_text(element)) or result.get('year')
+                    elif tag == 'isbn':
+                        result['isbn'] = _isbn(_text(element))
+                if tag == 'description':
+                    done_description = True
+                    if cover_id is None:
+                        break
+            elif tag == 'binary' and element.get('id') == cover_id:
+                data = base64.b64decode(element.text or '', validate=False)
+                extension = _IMAGE_TYPES.get(element.get('content-type'))
+                if extension and len(data) <= MAX_COVER_SIZE:
+                    result['cover'] = data
+                    result['cover_extension'] = extension
+                break
+            # Текст книги не потрібен: звільняємо пам'ять одразу після кожного елемента
+            if done_description:
+                element.clear()
+                if len(stack) == 1:
+                    root.clear()
+    return result
+
+
+# --- PDF ---
+
+def _pdf_string(data, start):
+    """Decode the PDF string (literal or hex) beginning at data[start]."""
+    if data[start:start + 1] == b'<':
+        end = data.index(b'>', start)
+        digits = re.sub(rb'\s', b'', data[start + 1:end]).decode('ascii')
+        raw = bytes.fromhex(digits + '0' * (len(digits) % 2))
+    else:
+        out = bytearray()
+        depth, i = 0, start
+        escapes = {ord('n'): b'\n', ord('r'): b'\r', ord('t'): b'\t', ord('b'): b'\b', ord('f'): b'\f'}
+        while i < len(data):
+            ch = data[i]
+            if ch == 0x5c:  # \
+                i += 1
+                nxt = data[i]
+                if nxt in escapes:
+                    out += escapes[nxt]
+                elif 0x30 <= nxt <= 0x37:
+                    digits = re.match(rb'[0-7]{1,3}', data[i:i + 3]).group()
+                    out.append(int(digits, 8) & 0xFF)
+                    i += len(digits) - 1
+                elif nxt not in (0x0a, 0x0d):
+                    out.append(nxt)
+            elif ch == 0x28:  # (
+                if depth:
+                    out.append(ch)
+                depth += 1
+            elif ch == 0x29:  # )
+                depth -= 1
+                if not depth:
+                    break
+                out.append(ch)
+            else:
+                out.append(ch)
+            i += 1
+        raw = bytes(out)
+    if raw.startswith(b'\xfe\xff'):
+        return raw[2:].decode('utf-16-be', 'replace')
+    return raw.decode('latin-1')
+
+
+def _pdf_object_offset(f, tail, number):
+    """Offset of object `number` from the last classic xref table, or None."""
+    match = list(re.finditer(rb'startxref\s+(\d+)', tail))
+    if not match:
+        return None
+    f.seek(int(match[-1].group(1)))
+    if f.readline().strip() != b'xref':
+        return None
+    while True:
+        header = f.readline().split()
+        if len(header) != 2:
+            return None
+        first, count = int(header[0]), int(header[1])
+        if first <= number < first + count:
+            f.seek((number - first) * 20, os.SEEK_CUR)
+            entry = f.read(20).split()
+            return int(entry[0]) if len(entry) >= 3 and entry[2] == b'n' else None
+        f.seek(count * 20, os.SEEK_CUR)
+
+
+def _pdf_scan(f, number, generation):
+    """Offset of the last definition of the object, found by reading the file in chunks."""
+    pattern = re.compile(rb'(?<![0-9])%d\s+%d\s+obj\b' % (number, generation))
+    found, position, carry = None, 0, b''
+    f.seek(0)
+    while True:
+        chunk = f.read(CHUNK_SIZE)
+        if not chunk:
+            return found
+        data = carry + chunk
+        for match in pattern.finditer(data):
+            found = position - len(carry) + match.start()
+        carry = data[-64:]
+        position += len(chunk)
+
+
+def _pdf(path):
+    size = os.path.getsize(path)
+    with open(path, 'rb') as f:
+        f.seek(max(0, size - PDF_TAIL))
+        tail = f.read()
+        refs = list(re.finditer(rb'/Info\s+(\d+)\s+(\d+)\s+R', tail))
+        if not refs:
+            return {}
+        number, generation = int(refs[-1].group(1)), int(refs[-1].group(2))
+        offset = _pdf_object_offset(f, tail, number)
+        f.seek(offset or 0)
+        if offset is None or not re.match(rb'\s*%d\s+%d\s+obj' % (number, generation), f.read(32)):
+            offset = _pdf_scan(f, number, generation)
+        if offset is None:
+            return {}
+        f.seek(offset)
+        data = f.read(PDF_TAIL)
+
+    start = data.find(b'<<')
+    end = data.find(b'endobj', start)
+    data = data[start:end if end != -1 else None]
+    info = {}
+    for match in re.finditer(rb'/(Title|Author)\s*([(<])', data):
+        info.setdefault(match.group(1).decode(), _pdf_string(data, match.start(2)).strip())
+    result = {'authors': _split_authors(info['Author']) if info.get('Author') else []}
+    if info.get('Title'):
+        result['title'] = ' '.join(info['Title'].split())
+    return result
+
+
+_PARSERS = {'epub': _epub, 'fb2': _fb2, 'pdf': _pdf}
+
+
+def extract_metadata(path, file_format):
+    """Parse the ebook at `path`; runs in a worker process.
+
+    Returns a dict with any of title, authors, language, isbn, publisher,
+    year, cover (bytes) and cover_extension, or {'error': ...}.
+    """
+    parser = _PARSERS.get(file_format)
+    if parser is None:
+        return {'error': f'Формат {file_format} не підтримується'}
+    try:
+        return parser(path)
+    except Exception as exc:
+        return {'error': f'{type(exc).__name__}: {exc}'[:255]}
+
+
+def save_metadata(file_id, result):
+    """Store the extraction result for the file as its suggestion."""
+    if db.session.get(File, file_id) is None:
+        return
+    metadata = db.session.get(FileMetadata, file_id) or FileMetadata(file_id=file_id)
+    old_cover = metadata.cover_path
+    metadata.cover_path = None
+    if result.get('cover'):
+        metadata.cover_path = store(io.BytesIO(result['cover']), result.get('cover_extension')).path
+    metadata.status = 'failed' if result.get('error') else 'done'
+    metadata.error = result.get('error')
+    metadata.title = (result.get('title') or '')[:255] or None
+    metadata.authors = [{key: value[:100] if value else value for key, value in author.items()}
+                        for author in result.get('authors') or []]
+    metadata.language = result.get('language')
+    metadata.isbn = result.get('isbn')
+    metadata.publisher = (result.get('publisher') or '')[:200] or None
+    metadata.publication_year = result.get('year')
+    metadata.extracted_at = datetime.utcnow()
+    db.session.add(metadata)
+    release(old_cover)
+    db.session.commit()
+
+
+def _find_or_create_author(fields):
+    """(author, created) for the extracted name; authors are matched by first and last name."""
+    author = Author.query.filter_by(last_name=fields['last_name'], first_name=fields['first_name']).first()
+    if author is not None:
+        return author, False
+    author = Author(first_name=fields['first_name'], last_name=fields['last_name'],
+                    middle_name=fields.get('middle_name'))
+    db.session.add(author)
+    db.session.flush()
+    return author, True
+
+
+def apply_suggestion(book, metadata):
+    """Copy the extracted values into the book; returns (applied field names, created authors).
+
+    Empty values are skipped, and so are a language the form does not
+    offer and an ISBN that another book already has. The caller commits.
+    """
+    applied = []
+    if metadata.title:
+        book.title = metadata.title
+        applied.append('title')
+    if metadata.language in dict(LANGUAGE_CHOICES):
+        book.language = metadata.language
+        applied.append('language')
+    if metadata.isbn and metadata.isbn != book.isbn:
+        taken = Book.query.filter(Book.isbn == metadata.isbn, Book.id != book.id).first()
+        if taken is None:
+            book.isbn = metadata.isbn
+            applied.append('isbn')
+    if metadata.publisher:
+        book.publisher = metadata.publisher
+        applied.append('publisher')
+    if metadata.publication_year:
+        book.publication_year = metadata.publication_year
+        applied.append('publication_year')
+
+    created = []
+    if metadata.authors:
+        BookAuthor.query.filter_by(book_id=book.id).delete()
+        for order, fields in enumerate(metadata.authors):
+            author, is_new = _find_or_create_author(fields)
+            if is_new:
+                created.append(author)
+            db.session.add(BookAuthor(book_id=book.id, author_id=author.id, order_index=order))
+        applied.append('authors')
+
+    if metadata.cover_path and metadata.cover_path != book.cover_image_path and retain(metadata.cover_path):
+        old_cover = book.cover_image_path
+        book.cover_image_path = metadata.cover_path
+        book.cover_variants = None
+        release(old_cover)
+        applied.append('cover')
+
+    metadata.status = 'applied'
+    return applied, created
+
+
+class MetadataExtractor:
+    """Schedules extraction jobs on the process pool of the web process."""
+
+    def __init__(self):
+        self.pool = ProcessPool('METADATA_WORKERS')
+
+    def schedule(self, file):
+        """Extract the metadata of a committed File in the background; returns the future or None."""
+        if not current_app.config['METADATA_EXTRACTION'] or file.format not in _PARSERS:
+            return None
+        return self.pool.submit(extract_metadata, static_path(file.file_path), file.format,
+                                done=partial(save_metadata, file.id))
+
+
+def backfill(workers=None, force=False, echo=None):
+    """Extract the metadata of every active file without it in parallel; returns (done, failed)."""
+    query = db.session.query(File.id, File.file_path, File.format)\
+        .filter(File.is_active == True, File.format.in_(list(_PARSERS)))
+    if not force:
+        query = query.filter(~File.extracted_metadata.has())
+    files = query.order_by(File.id).all()
+    db.session.commit()
+
+    done = failed = 0
+    with process_executor(workers or os.cpu_count()) as pool:
+        futures = [(file_id, pool.submit(extract_metadata, static_path(path), file_format))
+                   for file_id, path, file_format in files]
+        for file_id, future in futures:
+            result = future.result()
+            save_metadata(file_id, result)
+            if result.get('error'):
+                failed += 1
+                if echo:
+                    echo(f"Файл {file_id}: {result['error']}")
+            else:
+                done += 1
+    return done, failed
+
+
+metadata_extractor = MetadataExtractor()
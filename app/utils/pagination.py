@@ -0,0 +1,175 @@
+"""Pagination helpers: keyset (cursor) and in-memory list pagination."""
+import math
+from datetime import datetime
+from flask import current_app, request
+from itsdangerous import BadSignature, URLSafeSerializer
+from sqlalchemy import DateTime, and_, or_
+
+CURSOR_ARGS = ('after', 'before', 'page')
+
+
+class KeysetPagination:
+    """One page of a keyset-paginated query.
+
+    Unlike Flask-SQLAlchemy's Pagination it knows nothing about the total
+    number of rows: it only tells whether there is a next/previous page and
+    carries opaque cursors to reach them.
+    """
+    is_keyset = True
+
+    def __init__(self, items, per_page, next_cursor=None, prev_cursor=None):
+        self.items = items
+        self.per_page = per_page
+        self.next_cursor = next_cursor
+        self.prev_cursor = prev_cursor
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+    @property
+    def has_prev(self):
+        return self.prev_cursor is not None
+
+
+def _serializer():
+    return URLSafeSerializer(current_app.config['SECRET_KEY'], salt='keyset-cursor')
+
+
+def encode_cursor(item, order_by):
+    values = []
+    for column, _ in order_by:
+        value = getattr(item, column.key)
+        if isinstance(value, datetime):
+            value = value.isoformat()
+        values.append(value)
+    return _serializer().dumps(values)
+
+
+def decode_cursor(token, order_by):
+    """Return the key values stored in a cursor, or None if it is invalid."""
+    try:
+        values = _serializer().loads(token)
+    except BadSignature:
+        return None
+    if not isinstance(values, list) or len(values) != len(order_by):
+        return None
+    decoded = []
+    for (column, _), value in zip(order_by, values):
+        if value is not None and isinstance(column.type, DateTime):
+            try:
+                value = datetime.fromisoformat(value)
+            except (TypeError, ValueError):
+                return None
+        decoded.append(value)
+    return decoded
+
+
+def _seek_condition(order_by, values, forward):
+    """Build `(a, b) > (x, y)` in the expanded form that MySQL can use with an index."""
+    clauses = []
+    for i, (column, descending) in enumerate(order_by):
+        # Рух вперед по спадному ключу означає "менше за курсор"
+        if descending == forward:
+            step = column < values[i]
+        else:
+            step = column > values[i]
+        equal = [order_by[j][0] == values[j] for j in range(i)]
+        clauses.append(and_(*equal, step))
+    return or_(*clauses)
+
+
+def keyset_query(query, order_by, per_page, values=None, forward=True):
+    """The page query of `keyset_paginate`: seek past the key `values`, order, fetch one extra row.
+
+    Works on a Query as well as on a select (`flask indexes check` explains it).
+    """
+    if values is not None:
+        query = query.filter(_seek_condition(order_by, values, forward))
+
+    ordering = []
+    for column, descending in order_by:
+        ordering.append(column.desc() if descending == forward else column.asc())
+    return query.order_by(*ordering).limit(per_page + 1)
+
+
+def keyset_paginate(query, order_by, per_page, after=None, before=None):
+    """Paginate `query` by the unique key `order_by`.
+
+    `order_by` is a list of (column, descending) pairs, the last of which
+    must be unique (normally the primary key). Every page costs one
+    index range scan of `per_page + 1` rows regardless of its depth.
+    """
+    forward = before is None
+    token = after if forward else before
+    values = decode_cursor(token, order_by) if token else None
+
+    rows = keyset_query(query, order_by, per_page, values, forward).all()
+
+    has_more = len(rows) > per_page
+    rows = rows[:per_page]
+    if not forward:
+        rows.reverse()
+
+    if forward:
+        has_next, has_prev = has_more, values is not None
+    else:
+        has_next, has_prev = True, has_more
+
+    next_cursor = prev_cursor = None
+    if rows and has_next:
+        next_cursor = encode_cursor(rows[-1], order_by)
+    if rows and has_prev:
+        prev_cursor = encode_cursor(rows[0], order_by)
+
+    return KeysetPagination(rows, per_page, next_cursor, prev_cursor)
+
+
+def cursor_url_args():
+    """URL arguments of the current page without pagination ones, for building page links."""
+    args = dict(request.view_args or {})
+    args.update((key, values) for key, values in request.args.to_dict(flat=False).items()
+                if key not in CURSOR_ARGS)
+    return args
+
+
+class ListPagination:
+    """Page-number pagination over an in-memory list (e.g. ranked search hits).
+
+    Mirrors the attributes of Flask-SQLAlchemy's Pagination used by templates.
+    """
+
+    def __init__(self, items, page, per_page):
+        self.total = len(items)
+        self.per_page = per_page
+        self.pages = max(1, math.ceil(self.total / per_page))
+        self.page = min(max(page, 1), self.pages)
+        start = (self.page - 1) * per_page
+        self.items = items[start:start + per_page]
+
+    @property
+    def has_prev(self):
+        return self.page > 1
+
+    @property
+    def has_next(self):
+        return self.page < self.pages
+
+    @property
+    def prev_num(self):
+        return self.page - 1 if self.has_prev else None
+
+    @property
+    def next_num(self):
+        return self.page + 1 if self.has_next else None
+
+    def iter_pages(self, left_edge=2, left_current=2, right_current=4, right_edge=2):
+        last = 0
+        for num in range(1, self.pages + 1):
+            if (num <= left_edge
+                    or self.page - left_current <= num <= self.page + right_current
+                    or num > self.pages - right_edge):
+                if last + 1 != num:
+                    yield None
+                yield num
+                last = num
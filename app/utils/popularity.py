@@ -0,0 +1,84 @@
+"""Precomputed book popularity (reviews and downloads) for the homepage."""
+from collections import Counter
+from datetime import datetime
+from flask import current_app
+from sqlalchemy import delete, func, insert
+from app import db
+from app.models import Book, BookPopularity, Log, LogRollupBook, Review
+from app.utils.helpers import execute_upsert
+
+
+def _weights():
+    return (current_app.config['POPULARITY_REVIEW_WEIGHT'],
+            current_app.config['POPULARITY_DOWNLOAD_WEIGHT'])
+
+
+def record_popularity(book_id, reviews=0, downloads=0, connection=None):
+    """Add review/download deltas to a book's popularity row (created if missing).
+
+    Runs as one upsert inside the current transaction (of the session, or of
+    `connection` if given), so it commits together with the review or the
+    download log rows that caused it.
+    """
+    review_weight, download_weight = _weights()
+    delta_score = reviews * review_weight + downloads * download_weight
+    now = datetime.utcnow()
+    table = BookPopularity.__table__
+    increments = {
+        'review_count': table.c.review_count + reviews,
+        'download_count': table.c.download_count + downloads,
+        'score': table.c.score + delta_score,
+        'updated_at': now,
+    }
+    values = {'book_id': book_id, 'review_count': reviews, 'download_count': downloads,
+              'score': delta_score, 'updated_at': now}
+    execute_upsert(connection or db.session.connection(), table, values, 'book_id', increments)
+
+
+def rebuild_popularity(batch_size=1000):
+    """Recount popularity of every book from the reviews, rollups and logs tables.
+
+    Downloads come from the all-time rollups plus log rows newer than the
+    rollup watermark, so rows removed by log retention still count. Also
+    picks up changed weights. Returns the number of books with a row.
+    """
+    from app.utils.rollups import watermark_id
+
+    review_weight, download_weight = _weights()
+    reviews = dict(db.session.query(Review.book_id, func.count(Review.id)).group_by(Review.book_id))
+    downloads = Counter(dict(db.session.query(LogRollupBook.book_id, LogRollupBook.count)
+                             .filter(LogRollupBook.granularity == 'total',
+                                     LogRollupBook.action == 'download')))
+    downloads.update(dict(db.session.query(Log.book_id, func.count(Log.id))
+                          .filter(Log.action == 'download', Log.book_id.isnot(None),
+                                  Log.id > watermark_id())
+                          .group_by(Log.book_id)))
+    existing = {book_id for (book_id,) in db.session.query(Book.id)}
+
+    now = datetime.utcnow()
+    rows = []
+    for book_id in sorted((reviews.keys() | downloads.keys()) & existing):
+        review_count = reviews.get(book_id, 0)
+        download_count = downloads.get(book_id, 0)
+        rows.append({
+            'book_id': book_id,
+            'review_count': review_count,
+            'download_count': download_count,
+            'score': review_count * review_weight + download_count * download_weight,
+            'updated_at': now,
+        })
+
+    # Заміна вмісту в одній транзакції: читачі бачать старий рейтинг до commit
+    db.session.execute(delete(BookPopularity))
+    for start in range(0, len(rows), batch_size):
+        db.session.execute(insert(BookPopularity), rows[start:start + batch_size])
+    db.session.commit()
+    return len(rows)
+
+
+def popular_books(limit):
+    """Top active books by popularity, read through ix_book_popularity_score."""
+    return Book.query.join(BookPopularity, BookPopularity.book_id == Book.id)\
+        .filter(Book.is_active == True)\
+        .order_by(BookPopularity.score.desc(), BookPopularity.book_id.desc())\
+        .limit(limit).all()
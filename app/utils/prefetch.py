@@ -0,0 +1,65 @@
+"""Batch loading of related data for book listings."""
+from app import db
+from app.models import Author, Book, BookAuthor, BookGenre, File, Genre
+
+
+def books_by_ids(book_ids):
+    """Load active books by id in one query, keeping the order of `book_ids`."""
+    if not book_ids:
+        return []
+    books = {book.id: book for book in Book.query.filter(
+        Book.id.in_(book_ids), Book.is_active == True)}
+    return [books[book_id] for book_id in book_ids if book_id in books]
+
+
+def authors_by_book(books):
+    """Map book id -> ordered list of authors, loaded in a single query.
+
+    Rating data needs no extra query: it is stored on the book row itself
+    (see app/utils/ratings.py).
+    """
+    book_ids = {book.id for book in books}
+    result = {book_id: [] for book_id in book_ids}
+    if not book_ids:
+        return result
+
+    rows = db.session.query(BookAuthor.book_id, Author)\
+        .join(Author, Author.id == BookAuthor.author_id)\
+        .filter(BookAuthor.book_id.in_(book_ids))\
+        .order_by(BookAuthor.book_id, BookAuthor.order_index, BookAuthor.id)
+
+    for book_id, author in rows:
+        result[book_id].append(author)
+    return result
+
+
+def genres_by_book(books):
+    """Map book id -> list of genres ordered by name, loaded in a single query."""
+    book_ids = {book.id for book in books}
+    result = {book_id: [] for book_id in book_ids}
+    if not book_ids:
+        return result
+
+    rows = db.session.query(BookGenre.book_id, Genre)\
+        .join(Genre, Genre.id == BookGenre.genre_id)\
+        .filter(BookGenre.book_id.in_(book_ids))\
+        .order_by(BookGenre.book_id, Genre.name)
+
+    for book_id, genre in rows:
+        result[book_id].append(genre)
+    return result
+
+
+def files_by_book(books):
+    """Map book id -> list of active files, loaded in a single query."""
+    book_ids = {book.id for book in books}
+    result = {book_id: [] for book_id in book_ids}
+    if not book_ids:
+        return result
+
+    rows = File.query.filter(File.book_id.in_(book_ids), File.is_active == True)\
+        .order_by(File.book_id, File.id)
+
+    for file in rows:
+        result[file.book_id].append(file)
+    return result
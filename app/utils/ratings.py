@@ -0,0 +1,65 @@
+"""Denormalized book rating aggregates."""
+from flask import current_app
+from sqlalchemy import func, update
+from app import db
+from app.models import Book, Review
+
+
+def _prior():
+    """Return (mean, weight) of the Bayesian prior from config."""
+    return (current_app.config['RATING_PRIOR_MEAN'],
+            current_app.config['RATING_PRIOR_WEIGHT'])
+
+
+def bayesian_score(rating_sum, rating_count):
+    """Weighted rating that pulls books with few reviews to the prior mean."""
+    mean, weight = _prior()
+    return (weight * mean + rating_sum) / (weight + rating_count)
+
+
+def apply_rating_change(book_id, delta_sum, delta_count=0):
+    """Shift the stored aggregates of a book by the given deltas.
+
+    The update is a single atomic statement inside the current transaction,
+    so it commits together with the review change that caused it.
+    """
+    mean, weight = _prior()
+    # rating_score стоїть першим: MySQL обчислює SET зліва направо,
+    # тому вираз має бачити ще старі значення rating_sum/rating_count
+    stmt = update(Book).where(Book.id == book_id).ordered_values(
+        (Book.rating_score,
+         (weight * mean + Book.rating_sum + delta_sum)
+         / (weight + Book.rating_count + delta_count)),
+        (Book.rating_sum, Book.rating_sum + delta_sum),
+        (Book.rating_count, Book.rating_count + delta_count),
+    )
+    db.session.execute(stmt)
+
+
+def recompute_ratings(batch_size=1000):
+    """Rebuild aggregates of every book from the reviews table.
+
+    Returns the number of books that have at least one review.
+    """
+    totals = dict(
+        (book_id, (rating_sum, rating_count))
+        for book_id, rating_sum, rating_count in db.session.query(
+            Review.book_id, func.sum(Review.rating), func.count(Review.id)
+        ).group_by(Review.book_id)
+    )
+
+    book_ids = [book_id for (book_id,) in db.session.query(Book.id).order_by(Book.id)]
+    for start in range(0, len(book_ids), batch_size):
+        rows = []
+        for book_id in book_ids[start:start + batch_size]:
+            rating_sum, rating_count = totals.get(book_id, (0, 0))
+            rows.append({
+                'id': book_id,
+                'rating_sum': int(rating_sum),
+                'rating_count': rating_count,
+                'rating_score': bayesian_score(int(rating_sum), rating_count),
+            })
+        db.session.execute(update(Book), rows)
+        db.session.commit()
+
+    return len(totals)
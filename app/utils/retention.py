@@ -0,0 +1,145 @@
+"""Retention of the activity log: archive expired rows, then delete them in batches.
+
+Rows older than their action's retention window (LOG_RETENTION_ACTIONS,
+otherwise LOG_RETENTION_DAYS; 0 keeps them forever) are read in primary
+key order, LOG_RETENTION_BATCH_SIZE at a time. Each batch is appended to
+gzip JSONL files partitioned by day (LOG_ARCHIVE_DIR/YYYY/MM/logs-YYYY-MM-DD.jsonl.gz)
+and then deleted by id in its own short transaction, together with the
+matching counter updates. Batches are separated by LOG_RETENTION_PAUSE
+seconds so that replication and other writers keep up.
+
+Only rows already folded into the rollups are deleted, so the dashboard
+statistics keep the full history. If a run dies between archiving and
+deleting a batch, the next run archives those rows again; archive readers
+should deduplicate by id.
+"""
+import gzip
+import json
+import os
+import time
+from collections import Counter, defaultdict, namedtuple
+from datetime import datetime, timedelta
+from flask import current_app
+from sqlalchemy import delete, func
+from app import db
+from app.models import Log
+from app.utils.counters import LOG_ACTION_PREFIX, apply_deltas
+from app.utils.rollups import run_rollups, watermark_id
+
+PurgeResult = namedtuple('PurgeResult', 'scanned expired deleted files')
+
+_ARCHIVE_COLUMNS = ('id', 'created_at', 'action', 'user_id', 'book_id', 'file_id',
+                    'ip_address', 'user_agent')
+
+
+def archive_dir():
+    return current_app.config['LOG_ARCHIVE_DIR'] or os.path.join(current_app.instance_path, 'log_archive')
+
+
+def _cutoffs(now):
+    """(default cutoff, {action: cutoff}); None means the rows are kept forever."""
+    def cutoff(days):
+        return now - timedelta(days=days) if days else None
+
+    default = cutoff(current_app.config['LOG_RETENTION_DAYS'])
+    by_action = {action: cutoff(days)
+                 for action, days in current_app.config['LOG_RETENTION_ACTIONS'].items()}
+    return default, by_action
+
+
+def _archive(rows):
+    """Append rows to per-day gzip JSONL files; returns the paths written."""
+    by_day = defaultdict(list)
+    for row in rows:
+        by_day[row.created_at.date()].append(row)
+
+    root = archive_dir()
+    paths = []
+    for day, day_rows in sorted(by_day.items()):
+        folder = os.path.join(root, f'{day:%Y}', f'{day:%m}')
+        os.makedirs(folder, exist_ok=True)
+        path = os.path.join(folder, f'logs-{day:%Y-%m-%d}.jsonl.gz')
+        # Кожен дозапис - окремий gzip-член; gzip.open читає файл цілком
+        with open(path, 'ab') as raw:
+            with gzip.GzipFile(fileobj=raw, mode='ab') as f:
+                for row in day_rows:
+                    record = {name: getattr(row, name) for name in _ARCHIVE_COLUMNS}
+                    record['created_at'] = row.created_at.isoformat()
+                    f.write((json.dumps(record, ensure_ascii=False) + '\n').encode('utf-8'))
+            raw.flush()
+            os.fsync(raw.fileno())
+        paths.append(path)
+    return paths
+
+
+def purge_logs(batch_size=None, pause=None, dry_run=False, progress=None):
+    """Archive and delete expired log rows; returns a PurgeResult.
+
+    `progress(processed, total, message)` is called after every batch with
+    the number of scanned ids. With `dry_run` nothing is archived or deleted.
+    """
+    config = current_app.config
+    batch_size = batch_size or config['LOG_RETENTION_BATCH_SIZE']
+    pause = config['LOG_RETENTION_PAUSE'] if pause is None else pause
+
+    now = datetime.utcnow()
+    default_cutoff, action_cutoffs = _cutoffs(now)
+    cutoffs = [c for c in [default_cutoff, *action_cutoffs.values()] if c is not None]
+    if not cutoffs:
+        return PurgeResult(0, 0, 0, 0)
+
+    # Спершу враховуємо нові записи у зведених таблицях: видаляти можна лише їх
+    if not dry_run:
+        run_rollups()
+    upper = db.session.query(func.max(Log.id)).filter(Log.created_at < max(cutoffs)).scalar()
+    lower = db.session.query(func.min(Log.id)).scalar()
+    if not dry_run:
+        upper = min(upper or 0, watermark_id())
+    db.session.commit()
+    if not upper or lower is None or upper < lower:
+        return PurgeResult(0, 0, 0, 0)
+
+    total = upper - lower + 1
+    scanned = expired_total = deleted_total = 0
+    files = set()
+    last_id = lower - 1
+    while last_id < upper:
+        rows = db.session.query(*[getattr(Log, name) for name in _ARCHIVE_COLUMNS])\
+            .filter(Log.id > last_id, Log.id <= upper)\
+            .order_by(Log.id)\
+            .limit(batch_size).all()
+        if not rows:
+            break
+        last_id = rows[-1].id
+        scanned += len(rows)
+
+        expired = []
+        for row in rows:
+            cutoff = action_cutoffs.get(row.action, default_cutoff)
+            if cutoff is not None and row.created_at is not None and row.created_at < cutoff:
+                expired.append(row)
+        expired_total += len(expired)
+
+        if expired and not dry_run:
+            files.update(_archive(expired))
+            deleted = db.session.execute(
+                delete(Log).where(Log.id.in_([row.id for row in expired]))
+            ).rowcount
+            # Масове видалення оминає облік лічильників у сесії
+            deltas = Counter()
+            for row in expired:
+                deltas['logs'] -= 1
+                deltas[LOG_ACTION_PREFIX + row.action] -= 1
+            apply_deltas(db.session.connection(), deltas)
+            db.session.commit()
+            deleted_total += deleted
+        else:
+            db.session.commit()
+
+        if progress is not None:
+            progress(min(last_id - lower + 1, total), total,
+                     f'видалено {deleted_total}' if not dry_run else f'до видалення {expired_total}')
+        if pause and expired and not dry_run:
+            time.sleep(pause)
+
+    return PurgeResult(scanned, expired_total, deleted_total, len(files))
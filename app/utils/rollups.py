@@ -0,0 +1,155 @@
+"""Hourly, daily and all-time rollups of the activity log.
+
+A rollup run reads log rows with ids above the stored watermark in id
+order, adds their counts to the rollup tables and moves the watermark
+forward in the same transaction. Raw logs can therefore be purged later
+without losing dashboard history.
+"""
+from collections import Counter
+from datetime import datetime, timedelta
+from flask import current_app
+from sqlalchemy import delete, func, update
+from app import db
+from app.models import (Book, Log, LogRollupAction, LogRollupBook, LogRollupUser,
+                        RollupWatermark, User)
+from app.utils.helpers import execute_upsert_add
+
+WATERMARK = 'logs'
+GRANULARITIES = ('hour', 'day', 'total')
+# Кошик для granularity='total'
+TOTAL_BUCKET = datetime(1970, 1, 1)
+
+
+def _bucket(created_at, granularity):
+    if granularity == 'hour':
+        return created_at.replace(minute=0, second=0, microsecond=0)
+    if granularity == 'day':
+        return created_at.replace(hour=0, minute=0, second=0, microsecond=0)
+    return TOTAL_BUCKET
+
+
+def _watermark():
+    row = db.session.get(RollupWatermark, WATERMARK)
+    if row is None:
+        row = RollupWatermark(name=WATERMARK, last_log_id=0)
+        db.session.add(row)
+        db.session.flush()
+    return row.last_log_id
+
+
+def watermark_id():
+    """Id of the last log row already counted in the rollups (0 if none)."""
+    row = db.session.get(RollupWatermark, WATERMARK)
+    return row.last_log_id if row is not None else 0
+
+
+def _fold(rows):
+    """Add counts of the given log rows to the rollup tables."""
+    actions, books, users = Counter(), Counter(), Counter()
+    for _, created_at, action, book_id, user_id in rows:
+        for granularity in GRANULARITIES:
+            bucket = _bucket(created_at, granularity)
+            actions[(granularity, bucket, action)] += 1
+            if book_id is not None:
+                books[(granularity, bucket, book_id, action)] += 1
+            if user_id is not None:
+                users[(granularity, bucket, user_id)] += 1
+
+    connection = db.session.connection()
+    execute_upsert_add(connection, LogRollupAction.__table__, [
+        {'granularity': g, 'bucket': b, 'action': a, 'count': n}
+        for (g, b, a), n in sorted(actions.items())
+    ], ['granularity', 'bucket', 'action'], 'count')
+    execute_upsert_add(connection, LogRollupBook.__table__, [
+        {'granularity': g, 'bucket': b, 'book_id': book_id, 'action': a, 'count': n}
+        for (g, b, book_id, a), n in sorted(books.items())
+    ], ['granularity', 'bucket', 'book_id', 'action'], 'count')
+    execute_upsert_add(connection, LogRollupUser.__table__, [
+        {'granularity': g, 'bucket': b, 'user_id': user_id, 'count': n}
+        for (g, b, user_id), n in sorted(users.items())
+    ], ['granularity', 'bucket', 'user_id'], 'count')
+
+
+def run_rollups(batch_size=5000, max_rows=None):
+    """Fold log rows newer than the watermark into the rollups.
+
+    Each batch commits together with its watermark. Rows younger than
+    ROLLUP_SAFETY_LAG are left for the next run, so that a row committed
+    late with a smaller id is not skipped. Returns the number of rows folded.
+    """
+    cutoff = datetime.utcnow() - timedelta(seconds=current_app.config['ROLLUP_SAFETY_LAG'])
+    processed = 0
+    while max_rows is None or processed < max_rows:
+        last_id = _watermark()
+        limit = batch_size if max_rows is None else min(batch_size, max_rows - processed)
+        rows = db.session.query(Log.id, Log.created_at, Log.action, Log.book_id, Log.user_id)\
+            .filter(Log.id > last_id)\
+            .order_by(Log.id)\
+            .limit(limit).all()
+        ready = []
+        for row in rows:
+            if row.created_at is None or row.created_at > cutoff:
+                break
+            ready.append(row)
+        if not ready:
+            break
+
+        _fold(ready)
+        # Умовне оновлення: якщо інший процес уже просунув позначку, партію відкидаємо
+        moved = db.session.execute(
+            update(RollupWatermark)
+            .where(RollupWatermark.name == WATERMARK, RollupWatermark.last_log_id == last_id)
+            .values(last_log_id=ready[-1].id, updated_at=datetime.utcnow())
+        ).rowcount
+        if not moved:
+            db.session.rollback()
+            break
+        db.session.commit()
+        processed += len(ready)
+        if len(ready) < len(rows):
+            break
+    db.session.commit()
+    return processed
+
+
+def reset_rollups():
+    """Drop all rollup rows and the watermark (before a backfill)."""
+    for model in (LogRollupAction, LogRollupBook, LogRollupUser, RollupWatermark):
+        db.session.execute(delete(model))
+    db.session.commit()
+
+
+# --- читання для панелі адміністратора ---
+
+def action_totals():
+    """[(action, count)] over all time."""
+    return db.session.query(LogRollupAction.action, LogRollupAction.count)\
+        .filter(LogRollupAction.granularity == 'total')\
+        .order_by(LogRollupAction.action).all()
+
+
+def top_books(action='download', limit=5):
+    """[(Book, count)] with the most `action` records over all time."""
+    return db.session.query(Book, LogRollupBook.count)\
+        .join(LogRollupBook, LogRollupBook.book_id == Book.id)\
+        .filter(LogRollupBook.granularity == 'total', LogRollupBook.action == action)\
+        .order_by(LogRollupBook.count.desc())\
+        .limit(limit).all()
+
+
+def top_users(limit=5):
+    """[(User, count)] with the most log records over all time."""
+    return db.session.query(User, LogRollupUser.count)\
+        .join(LogRollupUser, LogRollupUser.user_id == User.id)\
+        .filter(LogRollupUser.granularity == 'total')\
+        .order_by(LogRollupUser.count.desc())\
+        .limit(limit).all()
+
+
+def daily_activity(days=7):
+    """[(day, count)] of all actions for the last `days` days."""
+    since = _bucket(datetime.utcnow() - timedelta(days=days), 'day')
+    return db.session.query(LogRollupAction.bucket, func.sum(LogRollupAction.count))\
+        .filter(LogRollupAction.granularity == 'day', LogRollupAction.bucket >= since)\
+        .group_by(LogRollupAction.bucket)\
+        .order_by(LogRollupAction.bucket).all()
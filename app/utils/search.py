@@ -0,0 +1,179 @@
+"""In-process inverted index with BM25 ranking for the book search."""
+import math
+from collections import Counter, defaultdict
+from app import db
+from app.models import Author, Book, BookAuthor
+from app.utils.helpers import normalize_isbn
+from app.utils.indexing import RefreshingIndex
+from app.utils.text import tokenize
+
+# Поле -> вага; для кожного search_type — поля, у яких шукаємо
+FIELD_WEIGHTS = {'title': 3.0, 'original_title': 2.0, 'authors': 2.0, 'description': 1.0}
+SEARCH_FIELDS = {
+    'all': ('title', 'original_title', 'authors', 'description'),
+    'title': ('title', 'original_title'),
+    'author': ('authors',),
+}
+K1 = 1.2
+B = 0.75
+
+
+class _IndexData:
+    """Postings of one index generation; mutated only under SearchIndex._lock."""
+
+    def __init__(self):
+        self.postings = {field: defaultdict(dict) for field in FIELD_WEIGHTS}
+        self.doc_len = {field: {} for field in FIELD_WEIGHTS}
+        self.total_len = dict.fromkeys(FIELD_WEIGHTS, 0)
+        self.doc_terms = {}
+        self.isbn = {}
+
+    def add(self, doc_id, fields, isbn):
+        self.remove(doc_id)
+        terms = {}
+        for field, text in fields.items():
+            tokens = tokenize(text)
+            for term, tf in Counter(tokens).items():
+                self.postings[field][term][doc_id] = tf
+            self.doc_len[field][doc_id] = len(tokens)
+            self.total_len[field] += len(tokens)
+            terms[field] = set(tokens)
+        self.doc_terms[doc_id] = (terms, isbn)
+        if isbn:
+            self.isbn[isbn] = doc_id
+
+    def remove(self, doc_id):
+        entry = self.doc_terms.pop(doc_id, None)
+        if entry is None:
+            return
+        terms, isbn = entry
+        for field, field_terms in terms.items():
+            postings = self.postings[field]
+            for term in field_terms:
+                docs = postings.get(term)
+                if docs is not None:
+                    docs.pop(doc_id, None)
+                    if not docs:
+                        del postings[term]
+            self.total_len[field] -= self.doc_len[field].pop(doc_id, 0)
+        if isbn and self.isbn.get(isbn) == doc_id:
+            del self.isbn[isbn]
+
+
+class SearchIndex(RefreshingIndex):
+    """Book search index shared by all requests of one worker process.
+
+    The index is built lazily from the database, kept up to date by the
+    book/author routes and fully rebuilt in the background once it is older
+    than SEARCH_INDEX_MAX_AGE seconds (to pick up writes made by other workers).
+    """
+
+    def __init__(self):
+        super().__init__()
+        self._data = None
+
+    # --- побудова та оновлення ---
+
+    def _load(self, book_ids=None):
+        """Yield (id, fields, isbn, is_active) for books, two queries in total."""
+        books_query = db.session.query(
+            Book.id, Book.title, Book.original_title, Book.description, Book.isbn, Book.is_active)
+        authors_query = db.session.query(
+            BookAuthor.book_id, Author.first_name, Author.middle_name, Author.last_name
+        ).join(Author, Author.id == BookAuthor.author_id)
+        if book_ids is not None:
+            books_query = books_query.filter(Book.id.in_(book_ids))
+            authors_query = authors_query.filter(BookAuthor.book_id.in_(book_ids))
+
+        authors = defaultdict(list)
+        for book_id, *name in authors_query:
+            authors[book_id].append(' '.join(part for part in name if part))
+
+        for book_id, title, original_title, description, isbn, is_active in books_query:
+            fields = {
+                'title': title,
+                'original_title': original_title or '',
+                'authors': ' '.join(authors.get(book_id, ())),
+                'description': description or '',
+            }
+            yield book_id, fields, normalize_isbn(isbn), is_active
+
+    def _build(self):
+        """Build a new index generation from the database."""
+        data = _IndexData()
+        for book_id, fields, isbn, is_active in self._load():
+            if is_active:
+                data.add(book_id, fields, isbn)
+        return data
+
+    def _swap(self, data):
+        self._data = data
+
+    def update_books(self, book_ids):
+        """Re-index the given books after they were created, edited or deleted."""
+        if self._data is None or not book_ids:
+            return
+        book_ids = set(book_ids)
+        rows = list(self._load(book_ids))
+        with self._lock:
+            found = set()
+            for book_id, fields, isbn, is_active in rows:
+                found.add(book_id)
+                if is_active:
+                    self._data.add(book_id, fields, isbn)
+                else:
+                    self._data.remove(book_id)
+            for book_id in book_ids - found:
+                self._data.remove(book_id)
+
+    def update_book(self, book_id):
+        self.update_books([book_id])
+
+    def update_author(self, author_id):
+        """Re-index all books of an author whose name has changed."""
+        book_ids = [book_id for (book_id,) in db.session.query(BookAuthor.book_id)
+                    .filter(BookAuthor.author_id == author_id)]
+        self.update_books(book_ids)
+
+    # --- пошук ---
+
+    def search(self, query, search_type='all'):
+        """Return ids of matching active books, best match first."""
+        self.ensure_fresh()
+        data = self._data
+
+        # Швидкий шлях: точний збіг нормалізованого ISBN
+        isbn = normalize_isbn(query)
+        if isbn and search_type in ('all', 'isbn'):
+            book_id = data.isbn.get(isbn)
+            if book_id is not None:
+                return [book_id]
+        if search_type == 'isbn':
+            return []
+
+        fields = SEARCH_FIELDS.get(search_type, SEARCH_FIELDS['all'])
+        terms = set(tokenize(query))
+        if not terms:
+            return []
+
+        scores = defaultdict(float)
+        with self._lock:
+            n_docs = len(data.doc_terms) or 1
+            for field in fields:
+                postings = data.postings[field]
+                doc_len = data.doc_len[field]
+                avg_len = (data.total_len[field] / n_docs) or 1
+                weight = FIELD_WEIGHTS[field]
+                for term in terms:
+                    docs = postings.get(term)
+                    if not docs:
+                        continue
+                    idf = math.log(1 + (n_docs - len(docs) + 0.5) / (len(docs) + 0.5))
+                    for doc_id, tf in docs.items():
+                        norm = K1 * (1 - B + B * doc_len[doc_id] / avg_len)
+                        scores[doc_id] += weight * idf * tf * (K1 + 1) / (tf + norm)
+
+        return sorted(scores, key=lambda doc_id: (-scores[doc_id], doc_id))
+
+
+search_index = SearchIndex()
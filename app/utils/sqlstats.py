@@ -0,0 +1,175 @@
+"""Per-request SQL statistics: query count, database time and N+1 suspects.
+
+With SQL_INSTRUMENTATION on, every request collects the statements it
+executes through SQLAlchemy engine events. The response gets a
+`Server-Timing` header (visible in the browser dev tools) and the
+application log a JSON line with the slowest statements. Statements of
+the same shape executed SQL_N_PLUS_ONE_THRESHOLD times or more are
+reported as N+1 suspects (typically a relationship or `.count()` called
+per row in a template).
+
+`query_budget(n)` uses the same hooks in tests, whether or not the
+instrumentation is on:
+
+    with query_budget(5):
+        client.get('/books/')
+"""
+import heapq
+import json
+import re
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from flask import current_app, g, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+# Розкриті списки IN (?, ?, ?) різної довжини мають однакову форму
+_IN_LIST = re.compile(r'\((?:\s*(?:\?|%s|%\(\w+\)s|:\w+)\s*,)*\s*(?:\?|%s|%\(\w+\)s|:\w+)\s*\)')
+_SPACES = re.compile(r'\s+')
+
+_local = threading.local()
+
+
+def statement_shape(statement):
+    """Statement text with IN lists collapsed and whitespace normalized."""
+    return _SPACES.sub(' ', _IN_LIST.sub('(...)', statement)).strip()
+
+
+class QueryStats:
+    """Statements executed while this collector was active."""
+
+    def __init__(self, keep_slowest=3):
+        self.count = 0
+        self.duration = 0.0
+        self.shapes = Counter()
+        self._keep = keep_slowest
+        self._slowest = []
+
+    def record(self, statement, duration):
+        self.count += 1
+        self.duration += duration
+        self.shapes[statement_shape(statement)] += 1
+        entry = (duration, self.count, statement)
+        if len(self._slowest) < self._keep:
+            heapq.heappush(self._slowest, entry)
+        elif entry > self._slowest[0]:
+            heapq.heapreplace(self._slowest, entry)
+
+    def slowest(self):
+        """[(seconds, statement)] starting from the slowest."""
+        return [(duration, statement) for duration, _, statement in sorted(self._slowest, reverse=True)]
+
+    def repeated(self, threshold):
+        """[(count, shape)] of statement shapes executed at least `threshold` times."""
+        return [(count, shape) for shape, count in self.shapes.most_common() if count >= threshold]
+
+    def summary(self, threshold=2):
+        lines = [f'{self.count} queries, {self.duration * 1000:.1f} ms']
+        lines += [f'  {count}x {shape}' for count, shape in self.repeated(threshold)]
+        return '\n'.join(lines)
+
+
+def _collectors():
+    collectors = getattr(_local, 'collectors', None)
+    if collectors is None:
+        collectors = _local.collectors = []
+    return collectors
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if _collectors():
+        conn.info.setdefault('sqlstats_start', []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    collectors = _collectors()
+    starts = conn.info.get('sqlstats_start')
+    if not collectors or not starts:
+        return
+    duration = time.perf_counter() - starts.pop()
+    for stats in collectors:
+        stats.record(statement, duration)
+
+
+def install_hooks():
+    """Listen to all engines (idempotent); costs nothing without active collectors."""
+    if not event.contains(Engine, 'before_cursor_execute', _before_cursor_execute):
+        event.listen(Engine, 'before_cursor_execute', _before_cursor_execute)
+        event.listen(Engine, 'after_cursor_execute', _after_cursor_execute)
+
+
+@contextmanager
+def collect_queries():
+    """Collect statements executed by this thread inside the block."""
+    install_hooks()
+    stats = QueryStats()
+    _collectors().append(stats)
+    try:
+        yield stats
+    finally:
+        _collectors().remove(stats)
+
+
+@contextmanager
+def query_budget(limit, threshold=2):
+    """Raise AssertionError if the block executes more than `limit` statements."""
+    with collect_queries() as stats:
+        yield stats
+    if stats.count > limit:
+        raise AssertionError(f'Query budget {limit} exceeded: {stats.summary(threshold)}')
+
+
+class SQLInstrumentation:
+    """Flask integration: a collector per request, reported on the response."""
+
+    def init_app(self, app):
+        if not app.config['SQL_INSTRUMENTATION']:
+            return
+        install_hooks()
+        app.before_request(self._start)
+        app.after_request(self._report)
+        app.teardown_request(self._stop)
+
+    @staticmethod
+    def _start():
+        g.sql_stats = QueryStats()
+        _collectors().append(g.sql_stats)
+
+    @staticmethod
+    def _stop(exc=None):
+        stats = g.pop('sql_stats', None)
+        if stats is not None and stats in _collectors():
+            _collectors().remove(stats)
+
+    @staticmethod
+    def _report(response):
+        stats = g.get('sql_stats')
+        if stats is None:
+            return response
+        threshold = current_app.config['SQL_N_PLUS_ONE_THRESHOLD']
+        repeated = stats.repeated(threshold)
+
+        timing = [f'db;dur={stats.duration * 1000:.1f};desc="{stats.count} queries"']
+        if repeated:
+            timing.append(f'n-plus-one;desc="{len(repeated)} repeated statements"')
+        response.headers.add('Server-Timing', ', '.join(timing))
+
+        record = {
+            'method': request.method,
+            'path': request.full_path.rstrip('?'),
+            'endpoint': request.endpoint,
+            'status': response.status_code,
+            'queries': stats.count,
+            'db_ms': round(stats.duration * 1000, 1),
+            'slowest': [{'ms': round(duration * 1000, 1), 'sql': statement[:500]}
+                        for duration, statement in stats.slowest()],
+            'n_plus_one': [{'count': count, 'sql': shape[:500]} for count, shape in repeated],
+        }
+        log = current_app.logger.warning if repeated else current_app.logger.info
+        log('sql %s', json.dumps(record, ensure_ascii=False))
+        return response
+
+
+sql_instrumentation = SQLInstrumentation()
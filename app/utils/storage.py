@@ -0,0 +1,291 @@
+"""Content-addressed storage of uploaded files (book files and covers).
+
+An upload is streamed in chunks to a temporary file while its SHA-256 is
+computed, so the content is read only once, and then kept under a path
+derived from the hash:
+
+    static/uploads/blobs/ab/cd/abcdef….pdf
+
+Identical content uploaded for another book, or again as a cover, reuses
+the existing blob. The `blobs` table counts the File/Book rows that point
+to each blob; `release()` drops a reference when a file or cover is
+replaced or deleted and removes the blob once nothing refers to it. Both
+change the row inside the caller's transaction. The file system follows
+the outcome of that transaction: `store()` puts the file in place before
+the commit and it is removed again if the transaction rolls back, while
+`release()` removes files only after the commit. Either removal runs in a
+short transaction of its own that locks the blob row and leaves the file
+alone if a concurrent upload of the same content references it again.
+`retain()` adds a reference when a row starts using an already stored blob.
+
+Files derived from a blob (cover thumbnails) live under
+static/uploads/derived/ab/cd/<sha256>-<suffix> and are deleted with it.
+
+`relink_existing()` (flask storage migrate) moves uploads saved before
+this storage existed into it; `recount_references()` fixes the counters.
+"""
+import glob
+import hashlib
+import os
+import tempfile
+from collections import Counter, namedtuple
+from flask import current_app
+from sqlalchemy import delete, event, func, select, update
+from sqlalchemy.orm import Session
+from app import db
+from app.models import Blob, Book, File, FileMetadata
+from app.utils.helpers import execute_upsert, file_checksum
+
+BLOB_PREFIX = 'uploads/blobs'
+DERIVED_PREFIX = 'uploads/derived'
+CHUNK_SIZE = 1024 * 1024
+
+# (первинний ключ, стовпець шляху) записів, що посилаються на завантажені файли
+REFERENCES = ((File.id, File.file_path), (Book.id, Book.cover_image_path),
+              (FileMetadata.file_id, FileMetadata.cover_path))
+
+StoredBlob = namedtuple('StoredBlob', 'path sha256 size')
+RelinkResult = namedtuple('RelinkResult', 'relinked missing blobs removed')
+
+
+def static_path(relative):
+    """Absolute path of a path stored relative to the static folder."""
+    return os.path.join(current_app.static_folder, relative.replace('/', os.sep))
+
+
+def blob_path(sha256, extension=None):
+    name = f'{sha256}.{extension}' if extension else sha256
+    return f'{BLOB_PREFIX}/{sha256[:2]}/{sha256[2:4]}/{name}'
+
+
+def derived_path(sha256, suffix):
+    """Path (relative to static/) of a file derived from the blob `sha256`."""
+    return f'{DERIVED_PREFIX}/{sha256[:2]}/{sha256[2:4]}/{sha256}-{suffix}'
+
+
+def content_key(path):
+    """SHA-256 of the upload at `path`: taken from a blob path, computed for older uploads."""
+    if path.startswith(BLOB_PREFIX + '/'):
+        return os.path.basename(path).split('.', 1)[0]
+    return file_checksum(static_path(path))
+
+
+def extension_of(filename):
+    """Lower-case extension of an uploaded file name, or None."""
+    extension = os.path.splitext(filename or '')[1][1:].lower()
+    return extension if extension.isalnum() else None
+
+
+def _remove(path):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+def _remove_blob(sha256, path):
+    _remove(static_path(path))
+    for derived in glob.glob(static_path(derived_path(sha256, '*'))):
+        _remove(derived)
+
+
+def _collect(candidates):
+    """Delete the files of blobs [(sha256, path)] that no row refers to any more.
+
+    Every blob row is locked while its file is checked, so an upload of the
+    same content waits and then stores the file again. Legacy uploads
+    (sha256 None) are deleted directly.
+    """
+    with db.engine.begin() as connection:
+        for sha256, path in candidates:
+            if sha256 is None:
+                _remove(static_path(path))
+                continue
+            row = connection.execute(
+                select(Blob.path).where(Blob.sha256 == sha256).with_for_update()).first()
+            if row is None:
+                _remove_blob(sha256, path)
+            elif row.path != path:
+                # Той самий вміст збережено знову під іншим розширенням
+                _remove(static_path(path))
+
+
+def _defer(key, sha256, path):
+    db.session.info.setdefault(key, []).append((sha256, path))
+
+
+def _cleanup(candidates):
+    try:
+        _collect(candidates)
+    except Exception:
+        current_app.logger.exception('Removing unused uploads failed')
+
+
+@event.listens_for(Session, 'after_commit')
+def _after_commit(session):
+    session.info.pop('storage_created', None)
+    released = session.info.pop('storage_released', None)
+    if released:
+        _cleanup(released)
+
+
+@event.listens_for(Session, 'after_rollback')
+def _after_rollback(session):
+    session.info.pop('storage_released', None)
+    created = session.info.pop('storage_created', None)
+    if created:
+        _cleanup(created)
+
+
+def _spool(stream):
+    """Copy `stream` to a temporary file; returns (temporary path, sha256, size)."""
+    # Тимчасовий файл у тій самій файловій системі, щоб os.replace був атомарним
+    root = static_path(BLOB_PREFIX)
+    os.makedirs(root, exist_ok=True)
+    fd, temp = tempfile.mkstemp(dir=root, prefix='.upload-')
+    digest = hashlib.sha256()
+    size = 0
+    try:
+        with os.fdopen(fd, 'wb') as out:
+            for chunk in iter(lambda: stream.read(CHUNK_SIZE), b''):
+                digest.update(chunk)
+                size += len(chunk)
+                out.write(chunk)
+    except BaseException:
+        _remove(temp)
+        raise
+    return temp, digest.hexdigest(), size
+
+
+def store(stream, extension=None):
+    """Store the content of a binary stream (e.g. `FileStorage.stream`); returns a StoredBlob.
+
+    The reference is counted in the current transaction: the caller saves
+    `path` in its row and commits. A file put in place here is removed
+    again if that transaction rolls back.
+    """
+    temp, sha256, size = _spool(stream)
+    try:
+        connection = db.session.connection()
+        # INSERT ... ON DUPLICATE KEY UPDATE блокує рядок до кінця транзакції
+        execute_upsert(connection, Blob.__table__,
+                       {'sha256': sha256, 'path': blob_path(sha256, extension), 'size': size, 'ref_count': 1},
+                       'sha256', {'ref_count': Blob.__table__.c.ref_count + 1})
+        path = connection.execute(select(Blob.path).where(Blob.sha256 == sha256)).scalar_one()
+        target = static_path(path)
+        if os.path.exists(target):
+            _remove(temp)
+        else:
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            os.replace(temp, target)
+            _defer('storage_created', sha256, path)
+    except BaseException:
+        _remove(temp)
+        raise
+    return StoredBlob(path, sha256, size)
+
+
+def retain(path):
+    """Add a reference to the blob at `path` (another row starts using it); False if it is gone."""
+    result = db.session.connection().execute(
+        update(Blob).where(Blob.path == path).values(ref_count=Blob.ref_count + 1))
+    return result.rowcount > 0
+
+
+def release(path):
+    """Drop one reference to the upload at `path`; delete the blob when it is unused.
+
+    The row changes in the current transaction; the file is deleted after
+    the commit. Paths outside the blob storage (uploads saved before it)
+    are deleted after the commit too.
+    """
+    if not path:
+        return
+    connection = db.session.connection()
+    blob = connection.execute(
+        select(Blob.sha256, Blob.ref_count).where(Blob.path == path).with_for_update()
+    ).first()
+    if blob is None:
+        if not path.startswith(BLOB_PREFIX + '/'):
+            _defer('storage_released', None, path)
+        return
+    if blob.ref_count > 1:
+        connection.execute(update(Blob).where(Blob.sha256 == blob.sha256)
+                           .values(ref_count=Blob.ref_count - 1))
+    else:
+        connection.execute(delete(Blob).where(Blob.sha256 == blob.sha256))
+        _defer('storage_released', blob.sha256, path)
+
+
+def recount_references():
+    """Set every blob's ref_count from the rows that use it; delete unused blobs.
+
+    Returns the number of blobs removed.
+    """
+    counts = Counter()
+    for _, column in REFERENCES:
+        rows = db.session.query(column, func.count()).filter(column.startswith(BLOB_PREFIX + '/'))\
+            .group_by(column).all()
+        for path, references in rows:
+            counts[path] += references
+
+    removed = 0
+    for blob in Blob.query.all():
+        references = counts.get(blob.path, 0)
+        if not references:
+            db.session.delete(blob)
+            _defer('storage_released', blob.sha256, blob.path)
+            removed += 1
+        elif blob.ref_count != references:
+            blob.ref_count = references
+    db.session.commit()
+    return removed
+
+
+def relink_existing(batch_size=100, dry_run=False, echo=None):
+    """Move uploads stored outside the blob storage into it; returns a RelinkResult.
+
+    Every row is rehashed and pointed at its blob in its batch's
+    transaction; the old files are deleted only after all rows are
+    relinked (several rows may share one). Rows whose file is missing are
+    left as they are. Finishes with recount_references().
+    """
+    relinked = missing = 0
+    legacy = set()
+    for key, column in REFERENCES:
+        model = key.class_
+        last_id = 0
+        while True:
+            rows = db.session.query(key, column)\
+                .filter(key > last_id, column.isnot(None), column != '',
+                        ~column.startswith(BLOB_PREFIX + '/'))\
+                .order_by(key).limit(batch_size).all()
+            if not rows:
+                break
+            last_id = rows[-1][0]
+            for row_id, path in rows:
+                source = static_path(path)
+                if not os.path.exists(source):
+                    missing += 1
+                    if echo:
+                        echo(f'Файл не знайдено: {path}')
+                    continue
+                relinked += 1
+                if dry_run:
+                    continue
+                with open(source, 'rb') as f:
+                    stored = store(f, extension_of(path))
+                values = {column.key: stored.path}
+                if model is File:
+                    values.update(checksum=stored.sha256, file_size=stored.size)
+                db.session.execute(update(model).where(key == row_id).values(**values))
+                legacy.add(source)
+            db.session.commit()
+
+    if dry_run:
+        db.session.rollback()
+        return RelinkResult(relinked, missing, Blob.query.count(), 0)
+    for source in legacy:
+        _remove(source)
+    removed = recount_references()
+    return RelinkResult(relinked, missing, Blob.query.count(), removed)
@@ -0,0 +1,130 @@
+"""Typeahead suggestions over book titles, author names and genres."""
+from bisect import bisect_left, insort
+from app import db
+from app.models import Author, Book, Genre
+from app.utils.indexing import RefreshingIndex
+from app.utils.text import normalize, transliterate
+
+KIND_ORDER = {'book': 0, 'author': 1, 'genre': 2}
+MAX_KEY_LENGTH = 64
+# Скільки кандидатів переглядаємо для одного запиту (обмежує час відповіді)
+MAX_CANDIDATES = 64
+
+
+def _keys(label):
+    """Lookup keys of a label as (key, is_tail) pairs.
+
+    A key starts at every word of the label and exists in Cyrillic and in
+    both Latin spellings; `is_tail` is 1 for keys that start mid-label.
+    """
+    words = normalize(label).split()
+    keys = set()
+    for i in range(len(words)):
+        tail = ' '.join(words[i:])[:MAX_KEY_LENGTH]
+        is_tail = int(i > 0)
+        keys.add((tail, is_tail))
+        if not tail.isascii():
+            keys.add((transliterate(tail), is_tail))
+            keys.add((transliterate(tail, initial_forms_everywhere=True), is_tail))
+    return keys
+
+
+class SuggestIndex(RefreshingIndex):
+    """Sorted array of (key, kind, id, is_tail) searched by prefix with bisect.
+
+    Each worker process keeps its own copy. Routes update it incrementally
+    on writes, and it is rebuilt in the background after SEARCH_INDEX_MAX_AGE
+    seconds to pick up writes made by other workers.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self._entries = None
+        self._labels = {}
+
+    def init_app(self, app):
+        """Build the index in the background as soon as the app serves requests."""
+        started = []
+
+        @app.before_request
+        def _warm_up_suggest_index():
+            if not started:
+                started.append(True)
+                self.start_background_rebuild()
+
+    # --- побудова та оновлення ---
+
+    def _build(self):
+        labels = {}
+        for book_id, title in db.session.query(Book.id, Book.title).filter(Book.is_active == True):
+            labels[('book', book_id)] = title
+        for author in db.session.query(Author.id, Author.first_name, Author.middle_name, Author.last_name):
+            labels[('author', author.id)] = ' '.join(
+                part for part in (author.first_name, author.middle_name, author.last_name) if part)
+        for genre_id, name in db.session.query(Genre.id, Genre.name):
+            labels[('genre', genre_id)] = name
+
+        entries = sorted((key, kind, item_id, is_tail)
+                         for (kind, item_id), label in labels.items()
+                         for key, is_tail in _keys(label))
+        return entries, labels
+
+    def _swap(self, data):
+        self._entries, self._labels = data
+
+    def put(self, kind, item_id, label):
+        """Add or rename an item (called by routes after a successful commit)."""
+        with self._lock:
+            if self._entries is None:
+                return
+            self._discard_locked(kind, item_id)
+            self._labels[(kind, item_id)] = label
+            for key, is_tail in _keys(label):
+                insort(self._entries, (key, kind, item_id, is_tail))
+
+    def discard(self, kind, item_id):
+        with self._lock:
+            if self._entries is not None:
+                self._discard_locked(kind, item_id)
+
+    def _discard_locked(self, kind, item_id):
+        label = self._labels.pop((kind, item_id), None)
+        if label is None:
+            return
+        for key, is_tail in _keys(label):
+            entry = (key, kind, item_id, is_tail)
+            pos = bisect_left(self._entries, entry)
+            if pos < len(self._entries) and self._entries[pos] == entry:
+                del self._entries[pos]
+
+    # --- пошук ---
+
+    def suggest(self, query, limit=8):
+        """Return up to `limit` (kind, id, label) tuples whose words start with `query`."""
+        prefix = ' '.join(normalize(query).split())
+        if not prefix:
+            return []
+        # Поки індекс будується у фоні, не блокуємо запит
+        self.ensure_fresh(block=False)
+
+        with self._lock:
+            entries = self._entries or []
+            found = {}
+            pos = bisect_left(entries, (prefix,))
+            while pos < len(entries) and len(found) < MAX_CANDIDATES:
+                key, kind, item_id, is_tail = entries[pos]
+                if not key.startswith(prefix):
+                    break
+                ref = (kind, item_id)
+                label = self._labels[ref]
+                # Збіг з початку назви важливіший за збіг з середини
+                rank = (is_tail, KIND_ORDER[kind], len(label), label)
+                if ref not in found or rank < found[ref]:
+                    found[ref] = rank
+                pos += 1
+
+        ranked = sorted(found.items(), key=lambda item: item[1])[:limit]
+        return [(kind, item_id, rank[3]) for (kind, item_id), rank in ranked]
+
+
+suggest_index = SuggestIndex()
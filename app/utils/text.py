@@ -0,0 +1,75 @@
+"""Text normalization and tokenization for Ukrainian/English search."""
+import re
+import unicodedata
+
+# Різні варіанти апострофа в українських словах (п'ять, п’ять, пʼять)
+_APOSTROPHES = dict.fromkeys(map(ord, "'’ʼ‘`´"), None)
+_LETTER_MAP = str.maketrans({'ё': 'е', 'ґ': 'г', 'ъ': ''})
+_TOKEN_RE = re.compile(r'\w+')
+
+# Найуживаніші флексії, від довших до коротших
+_UK_SUFFIXES = sorted([
+    'ами', 'ями', 'ові', 'еві', 'ого', 'ому', 'ими', 'іми', 'ий', 'ій', 'ої', 'ою',
+    'ею', 'єю', 'ах', 'ях', 'ів', 'їв', 'ам', 'ям', 'ом', 'ем', 'а', 'я',
+    'у', 'ю', 'і', 'и', 'е', 'о', 'ь', 'й', 'ї', 'є',
+], key=len, reverse=True)
+_MIN_STEM = 3
+
+
+def normalize(text):
+    """Casefold, unify apostrophes and letter variants."""
+    if not text:
+        return ''
+    text = unicodedata.normalize('NFKC', text).casefold()
+    return text.translate(_APOSTROPHES).translate(_LETTER_MAP)
+
+
+def stem(token):
+    """Strip a common inflectional ending so that word forms share one term."""
+    if token.isdigit():
+        return token
+    if token.isascii():
+        if len(token) > 4 and token.endswith('s') and not token.endswith('ss'):
+            return token[:-1]
+        return token
+    for suffix in _UK_SUFFIXES:
+        if token.endswith(suffix) and len(token) - len(suffix) >= _MIN_STEM:
+            return token[:-len(suffix)]
+    return token
+
+
+def tokenize(text, stemmed=True):
+    """Split text into normalized (and optionally stemmed) terms."""
+    tokens = _TOKEN_RE.findall(normalize(text))
+    if stemmed:
+        return [stem(t) for t in tokens]
+    return tokens
+
+
+# Транслітерація за офіційною системою (постанова КМУ №55 від 2010 р.)
+_TRANSLIT = {
+    'а': 'a', 'б': 'b', 'в': 'v', 'г': 'h', 'ґ': 'g', 'д': 'd', 'е': 'e', 'є': 'ie',
+    'ж': 'zh', 'з': 'z', 'и': 'y', 'і': 'i', 'ї': 'i', 'й': 'i', 'к': 'k', 'л': 'l',
+    'м': 'm', 'н': 'n', 'о': 'o', 'п': 'p', 'р': 'r', 'с': 's', 'т': 't', 'у': 'u',
+    'ф': 'f', 'х': 'kh', 'ц': 'ts', 'ч': 'ch', 'ш': 'sh', 'щ': 'shch', 'ь': '', 'ю': 'iu',
+    'я': 'ia', 'ы': 'y', 'э': 'e',
+}
+# На початку слова (і в "народному" написанні — завжди) йотовані пишуться через y
+_TRANSLIT_INITIAL = {'є': 'ye', 'ї': 'yi', 'й': 'y', 'ю': 'yu', 'я': 'ya'}
+
+
+def transliterate(text, initial_forms_everywhere=False):
+    """Transliterate normalized Ukrainian text into Latin letters.
+
+    With `initial_forms_everywhere` the y-forms (ya, yu, ye...) are used in
+    every position, which matches the way people usually type names.
+    """
+    result = []
+    at_word_start = True
+    for ch in text:
+        if (at_word_start or initial_forms_everywhere) and ch in _TRANSLIT_INITIAL:
+            result.append(_TRANSLIT_INITIAL[ch])
+        else:
+            result.append(_TRANSLIT.get(ch, ch))
+        at_word_start = not ch.isalnum()
+    return ''.join(result)
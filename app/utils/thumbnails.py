@@ -0,0 +1,147 @@
+"""Cover thumbnails: resized WebP/JPEG copies of the cover for `srcset`.
+
+After a cover upload is committed the view calls
+`cover_thumbnails.schedule(book)`. The copies are rendered in a pool of
+worker processes (app/utils/workers.py) and written next to the blobs as
+static/uploads/derived/ab/cd/<sha256>-<width>.<format>, so books sharing a
+cover share its thumbnails too. When a job finishes, Book.cover_variants
+is set (unless the book got another cover in the meantime) and the
+book's cached pages are invalidated. Until then, and without Pillow,
+which is optional, the templates show the original upload.
+"""
+import os
+from concurrent.futures import as_completed
+from functools import partial
+from flask import current_app
+from sqlalchemy import update
+from app import db
+from app.models import Book
+from app.utils.cache import response_cache
+from app.utils.storage import content_key, derived_path, static_path
+from app.utils.workers import ProcessPool, process_executor
+
+try:
+    import PIL  # noqa: F401
+except ImportError:  # pragma: no cover - необов'язкова залежність
+    PIL = None
+
+_SAVE_OPTIONS = {
+    'webp': {'format': 'WEBP', 'method': 4},
+    'jpeg': {'format': 'JPEG', 'optimize': True, 'progressive': True},
+}
+
+
+def render_variants(source, static_folder, key, widths, formats, quality):
+    """Write resized copies of the image `source`; runs in a worker process.
+
+    Returns the value for Book.cover_variants. Images are never enlarged:
+    widths not smaller than the original are replaced by the original
+    width. Copies that already exist (a shared cover) are not rendered again.
+    """
+    from PIL import Image, ImageOps
+
+    with Image.open(source) as original:
+        image = ImageOps.exif_transpose(original)
+        image.load()
+    widths = sorted({width for width in widths if width < image.width}) or [image.width]
+
+    variants = {fmt: [] for fmt in formats}
+    for width in widths:
+        resized = None
+        for fmt in formats:
+            path = derived_path(key, f'{width}.{fmt}')
+            target = os.path.join(static_folder, path.replace('/', os.sep))
+            if not os.path.exists(target):
+                if resized is None:
+                    height = max(1, round(image.height * width / image.width))
+                    resized = image.resize((width, height), Image.LANCZOS)
+                out = resized
+                if fmt == 'jpeg' and out.mode != 'RGB':
+                    # JPEG не має прозорості: накладаємо на білий фон
+                    background = Image.new('RGB', out.size, 'white')
+                    rgba = out.convert('RGBA')
+                    background.paste(rgba, mask=rgba.getchannel('A'))
+                    out = background
+                elif fmt == 'webp' and out.mode not in ('RGB', 'RGBA'):
+                    out = out.convert('RGBA' if 'A' in out.getbands() or 'transparency' in out.info else 'RGB')
+                os.makedirs(os.path.dirname(target), exist_ok=True)
+                temp = f'{target}.{os.getpid()}.tmp'
+                out.save(temp, quality=quality, **_SAVE_OPTIONS[fmt])
+                os.replace(temp, target)
+            variants[fmt].append([width, path])
+    return [{'format': fmt, 'images': variants[fmt]} for fmt in formats]
+
+
+def save_variants(book_id, cover_path, variants):
+    """Record the variants if the book still has the cover they were made from."""
+    result = db.session.execute(
+        update(Book).where(Book.id == book_id, Book.cover_image_path == cover_path)
+        .values(cover_variants=variants)
+        .execution_options(synchronize_session=False)
+    )
+    db.session.commit()
+    if result.rowcount:
+        response_cache.invalidate('books', f'book:{book_id}')
+    return bool(result.rowcount)
+
+
+def _job(cover_path):
+    """Arguments of render_variants() for the cover at `cover_path`."""
+    config = current_app.config
+    return (static_path(cover_path), current_app.static_folder, content_key(cover_path),
+            config['COVER_THUMBNAIL_WIDTHS'], config['COVER_THUMBNAIL_FORMATS'],
+            config['COVER_THUMBNAIL_QUALITY'])
+
+
+class CoverThumbnails:
+    """Schedules thumbnail jobs on the process pool of the web process."""
+
+    def __init__(self):
+        self.pool = ProcessPool('COVER_THUMBNAIL_WORKERS')
+
+    @staticmethod
+    def enabled():
+        return PIL is not None and current_app.config['COVER_THUMBNAILS']
+
+    def schedule(self, book):
+        """Render the variants of the book's cover in the background; returns the future or None."""
+        if not book.cover_image_path or not self.enabled():
+            return None
+        return self.pool.submit(render_variants, *_job(book.cover_image_path),
+                                done=partial(save_variants, book.id, book.cover_image_path))
+
+
+def backfill(workers=None, force=False, echo=None):
+    """Render the variants of every cover without them in parallel; returns (done, failed)."""
+    if PIL is None:
+        raise RuntimeError('Pillow is required for cover thumbnails')
+    query = db.session.query(Book.id, Book.cover_image_path)\
+        .filter(Book.cover_image_path.isnot(None), Book.cover_image_path != '')
+    if not force:
+        query = query.filter(Book.cover_variants.is_(None))
+    books = query.order_by(Book.id).all()
+    db.session.commit()
+
+    done = failed = 0
+    with process_executor(workers or os.cpu_count()) as pool:
+        futures = {}
+        for book_id, cover_path in books:
+            if not os.path.exists(static_path(cover_path)):
+                failed += 1
+                if echo:
+                    echo(f'Файл не знайдено: {cover_path}')
+                continue
+            futures[pool.submit(render_variants, *_job(cover_path))] = (book_id, cover_path)
+        for future in as_completed(futures):
+            book_id, cover_path = futures[future]
+            try:
+                save_variants(book_id, cover_path, future.result())
+                done += 1
+            except Exception as exc:
+                failed += 1
+                if echo:
+                    echo(f'Книга {book_id}: {exc}')
+    return done, failed
+
+
+cover_thumbnails = CoverThumbnails()
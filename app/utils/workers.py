@@ -0,0 +1,62 @@
+"""Process pools for CPU-bound background jobs of the web process.
+
+Cover thumbnails and ebook metadata extraction run in worker processes:
+they are CPU-bound and would hold the GIL of the web worker. The pool is
+created on first use with the 'spawn' start method (workers inherit no
+threads or database connections of the web process) and again after a
+fork, e.g. in gunicorn workers. `submit(fn, *args, done=callback)` calls
+`callback(result)` inside an application context of the submitting app
+once the job finishes; failures are logged.
+"""
+import atexit
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+from flask import current_app
+from app import db
+
+
+def process_executor(workers):
+    """A ProcessPoolExecutor whose workers start from a clean interpreter."""
+    return ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn'))
+
+
+def _finish(app, done, future):
+    # Виконується в службовому потоці пулу
+    if future.cancelled():
+        return
+    with app.app_context():
+        try:
+            done(future.result())
+        except Exception:
+            app.logger.exception('Background job %r failed', done)
+        finally:
+            db.session.remove()
+
+
+class ProcessPool:
+    """Lazily created process pool; the size comes from the `workers_setting` config key."""
+
+    def __init__(self, workers_setting):
+        self.workers_setting = workers_setting
+        self._lock = threading.Lock()
+        self._pool = None
+        self._pid = None
+
+    def _get(self):
+        with self._lock:
+            # Після fork (gunicorn) пул батьківського процесу непридатний
+            if self._pool is None or self._pid != os.getpid():
+                self._pool = process_executor(current_app.config[self.workers_setting])
+                self._pid = os.getpid()
+                atexit.register(self._pool.shutdown, wait=False, cancel_futures=True)
+            return self._pool
+
+    def submit(self, fn, *args, done=None):
+        """Run `fn(*args)` in a worker process; returns the future."""
+        future = self._get().submit(fn, *args)
+        if done is not None:
+            future.add_done_callback(partial(_finish, current_app._get_current_object(), done))
+        return future
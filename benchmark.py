@@ -0,0 +1,263 @@
+"""Вимірювання продуктивності маршрутів.
+
+Проходить усі GET-маршрути blueprint'ів (параметри на кшталт <book_id>
+підставляються з бази) через тестовий клієнт Flask або через запущений
+HTTP-сервер (--url) і для кожного маршруту рахує латентність p50/p95/p99,
+пропускну здатність і кількість SQL-запитів на запит. Результати
+зберігаються в JSON разом з комітом, тож прогони різних комітів можна
+порівняти (--compare).
+
+    python seed_data.py --preset medium
+    python benchmark.py --requests 200 --login admin:admin123
+    python benchmark.py --compare benchmarks/old.json benchmarks/new.json
+"""
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+import urllib.error
+import urllib.request
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from sqlalchemy import func
+from app import create_app, db
+from app.config import Config
+from app.models import Author, Book, File, Genre, Review, User
+
+# Маршрути, що змінюють стан сесії або не є сторінками
+SKIP_ENDPOINTS = {'auth.logout', 'static'}
+
+
+def percentile(values, pct):
+    """Nearest-rank percentile of a sorted list."""
+    if not values:
+        return None
+    rank = max(1, -(-len(values) * pct // 100))
+    return values[int(rank) - 1]
+
+
+def sample_arguments():
+    """Values for URL parameters, taken from the database."""
+    def first(model, *criteria):
+        return db.session.query(func.min(model.id)).filter(*criteria).scalar()
+
+    book_id = first(Book, Book.is_active == True)
+    file = File.query.filter_by(is_active=True).order_by(File.id).first()
+    return {
+        'book_id': file.book_id if file else book_id,
+        'author_id': first(Author),
+        'genre_id': first(Genre),
+        'file_id': file.id if file else None,
+        'review_id': first(Review),
+        'user_id': first(User),
+    }
+
+
+def discover_routes(app, only=None):
+    """[(endpoint, url)] for every GET route whose parameters can be filled."""
+    arguments = sample_arguments()
+    routes = []
+    with app.test_request_context():
+        from flask import url_for
+
+        for rule in sorted(app.url_map.iter_rules(), key=lambda r: r.endpoint):
+            if rule.endpoint in SKIP_ENDPOINTS or 'GET' not in rule.methods:
+                continue
+            if only and not any(part in rule.endpoint for part in only):
+                continue
+            values = {name: arguments.get(name) for name in rule.arguments}
+            if any(value is None for value in values.values()):
+                continue
+            routes.append((rule.endpoint, url_for(rule.endpoint, **values)))
+        # Запити з параметрами, які часто відкривають
+        extra = [('main.search', {'q': 'Кобзар'}), ('main.suggest', {'q': 'Ко'}),
+                 ('books.catalog', {'sort': 'rating'}), ('books.catalog', {'genre': arguments['genre_id']})]
+        for endpoint, values in extra:
+            if endpoint in app.view_functions and (not only or any(part in endpoint for part in only)):
+                routes.append((endpoint, url_for(endpoint, **values)))
+    return routes
+
+
+class TestClientDriver:
+    """Requests through the Flask test client; SQL queries are counted in-process."""
+
+    def __init__(self, app, login=None):
+        self.app = app
+        self.client = app.test_client()
+        if login:
+            username, _, password = login.partition(':')
+            self.client.post('/auth/login', data={'username': username, 'password': password})
+            # Прочитати flash-повідомлення входу
+            self.client.get('/about')
+
+    def request(self, url):
+        from app.utils.sqlstats import collect_queries
+
+        with collect_queries() as stats:
+            started = time.perf_counter()
+            response = self.client.get(url)
+            response.get_data()
+            elapsed = time.perf_counter() - started
+        return response.status_code, elapsed, stats.count
+
+
+class HTTPDriver:
+    """Requests to a running server; queries come from its Server-Timing header."""
+
+    def __init__(self, base_url, login=None):
+        self.base_url = base_url.rstrip('/')
+        if login:
+            print('Увага: --login працює лише з тестовим клієнтом, запити йдуть анонімно.', file=sys.stderr)
+
+    def request(self, url):
+        started = time.perf_counter()
+        try:
+            with urllib.request.urlopen(self.base_url + url) as response:
+                response.read()
+                status, timing = response.status, response.headers.get('Server-Timing', '')
+        except urllib.error.HTTPError as exc:
+            status, timing = exc.code, exc.headers.get('Server-Timing', '')
+        elapsed = time.perf_counter() - started
+        return status, elapsed, _queries_from_timing(timing)
+
+
+def _queries_from_timing(header):
+    # db;dur=1.2;desc="7 queries"
+    for part in header.split(','):
+        if part.strip().startswith('db;') and 'desc="' in part:
+            return int(part.split('desc="', 1)[1].split()[0])
+    return None
+
+
+def run_route(driver, url, requests, warmup, concurrency):
+    for _ in range(warmup):
+        driver.request(url)
+    started = time.perf_counter()
+    if concurrency > 1:
+        with ThreadPoolExecutor(concurrency) as pool:
+            results = list(pool.map(lambda _: driver.request(url), range(requests)))
+    else:
+        results = [driver.request(url) for _ in range(requests)]
+    wall = time.perf_counter() - started
+
+    latencies = sorted(elapsed * 1000 for _, elapsed, _ in results)
+    queries = [count for _, _, count in results if count is not None]
+    return {
+        'url': url,
+        'requests': requests,
+        'status': dict(Counter(str(status) for status, _, _ in results)),
+        'p50_ms': round(percentile(latencies, 50), 2),
+        'p95_ms': round(percentile(latencies, 95), 2),
+        'p99_ms': round(percentile(latencies, 99), 2),
+        'mean_ms': round(sum(latencies) / len(latencies), 2),
+        'throughput_rps': round(requests / wall, 1),
+        'queries_per_request': round(sum(queries) / len(queries), 1) if queries else None,
+    }
+
+
+def _git_commit():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'],
+                                       cwd=os.path.dirname(os.path.abspath(__file__)),
+                                       stderr=subprocess.DEVNULL, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def dataset_size():
+    from app.utils.counters import counters
+
+    counts = counters.snapshot()
+    return {name: counts[name] for name in ('books', 'authors', 'users', 'reviews', 'logs')}
+
+
+def compare(old_path, new_path):
+    with open(old_path, encoding='utf-8') as f:
+        old = json.load(f)
+    with open(new_path, encoding='utf-8') as f:
+        new = json.load(f)
+    print(f"{'маршрут':<40} {'p50':>18} {'p95':>18} {'запитів':>12}")
+    for name, result in new['routes'].items():
+        before = old['routes'].get(name)
+        if before is None:
+            continue
+
+        def delta(key):
+            a, b = before[key], result[key]
+            if a is None or b is None:
+                return f'{b}'
+            change = f'{(b - a) / a * 100:+.0f}%' if a else ''
+            return f'{a}→{b} {change}'
+        print(f"{name:<40} {delta('p50_ms'):>18} {delta('p95_ms'):>18} {delta('queries_per_request'):>12}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Вимірювання продуктивності маршрутів.')
+    parser.add_argument('--requests', type=int, default=50, help='Запитів на маршрут.')
+    parser.add_argument('--warmup', type=int, default=5, help='Запитів для прогріву (не враховуються).')
+    parser.add_argument('--concurrency', type=int, default=1, help='Паралельних запитів (для --url).')
+    parser.add_argument('--route', action='append', help='Лише маршрути, що містять цей рядок (можна кілька).')
+    parser.add_argument('--login', help='username:password для сторінок, що потребують входу.')
+    parser.add_argument('--url', help='Адреса запущеного сервера замість тестового клієнта.')
+    parser.add_argument('--no-cache', action='store_true', help='Вимкнути кеш відповідей (тестовий клієнт).')
+    parser.add_argument('--output', help='Файл результатів (типово benchmarks/<коміт>-<час>.json).')
+    parser.add_argument('--compare', nargs=2, metavar=('OLD', 'NEW'), help='Порівняти два файли результатів.')
+    args = parser.parse_args()
+
+    if args.compare:
+        compare(*args.compare)
+        return
+
+    class BenchmarkConfig(Config):
+        CACHE_TYPE = 'null' if args.no_cache else Config.CACHE_TYPE
+        WTF_CSRF_ENABLED = False
+
+    app = create_app(BenchmarkConfig)
+    with app.app_context():
+        routes = discover_routes(app, args.route)
+        size = dataset_size()
+        dialect = db.engine.dialect.name
+        db.session.remove()
+
+    if args.url:
+        driver = HTTPDriver(args.url, args.login)
+    else:
+        # Тестовий клієнт виконує запити в одному потоці
+        args.concurrency = 1
+        driver = TestClientDriver(app, args.login)
+
+    results = {}
+    for endpoint, url in routes:
+        name = endpoint if endpoint not in results else f'{endpoint} {url}'
+        results[name] = run_route(driver, url, args.requests, args.warmup, args.concurrency)
+        r = results[name]
+        print(f"{name:<40} p50 {r['p50_ms']:>8} ms  p95 {r['p95_ms']:>8} ms  p99 {r['p99_ms']:>8} ms  "
+              f"{r['throughput_rps']:>8} rps  {r['queries_per_request']} SQL  {r['status']}", flush=True)
+
+    commit = _git_commit()
+    report = {
+        'meta': {
+            'commit': commit,
+            'created_at': datetime.utcnow().isoformat(timespec='seconds'),
+            'python': platform.python_version(),
+            'database': dialect,
+            'dataset': size,
+            'mode': 'http' if args.url else 'test_client',
+            'options': {key: value for key, value in vars(args).items() if key not in ('compare', 'login')},
+        },
+        'routes': results,
+    }
+    output = args.output or os.path.join(
+        'benchmarks', f"{commit or 'nogit'}-{datetime.utcnow():%Y%m%d%H%M%S}.json")
+    os.makedirs(os.path.dirname(output) or '.', exist_ok=True)
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f'\nРезультати збережено: {output}')
+
+
+if __name__ == '__main__':
+    main()
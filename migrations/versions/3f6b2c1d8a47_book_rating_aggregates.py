@@ -0,0 +1,34 @@
+"""Book rating aggregates
+
+Revision ID: 3f6b2c1d8a47
+Revises: 9bdeacca24d9
+Create Date: 2026-10-18 10:12:40.118203
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3f6b2c1d8a47'
+down_revision = '9bdeacca24d9'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('books', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('rating_sum', sa.Integer(), nullable=False, server_default='0'))
+        batch_op.add_column(sa.Column('rating_count', sa.Integer(), nullable=False, server_default='0'))
+        batch_op.add_column(sa.Column('rating_score', sa.Float(), nullable=False, server_default='0'))
+        batch_op.create_index('ix_books_active_rating', ['is_active', 'rating_score'], unique=False)
+
+    # Значення для наявних відгуків заповнює `flask ratings recompute`
+
+
+def downgrade():
+    with op.batch_alter_table('books', schema=None) as batch_op:
+        batch_op.drop_index('ix_books_active_rating')
+        batch_op.drop_column('rating_score')
+        batch_op.drop_column('rating_count')
+        batch_op.drop_column('rating_sum')
@@ -0,0 +1,39 @@
+"""Book popularity table
+
+Revision ID: 7c2e9a4b5d10
+Revises: 3f6b2c1d8a47
+Create Date: 2026-10-18 12:40:03.512871
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '7c2e9a4b5d10'
+down_revision = '3f6b2c1d8a47'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('book_popularity',
+    sa.Column('book_id', sa.Integer(), nullable=False),
+    sa.Column('review_count', sa.Integer(), nullable=False, server_default='0'),
+    sa.Column('download_count', sa.Integer(), nullable=False, server_default='0'),
+    sa.Column('score', sa.Float(), nullable=False, server_default='0'),
+    sa.Column('updated_at', sa.DateTime(), nullable=True),
+    sa.ForeignKeyConstraint(['book_id'], ['books.id'], ),
+    sa.PrimaryKeyConstraint('book_id')
+    )
+    with op.batch_alter_table('book_popularity', schema=None) as batch_op:
+        batch_op.create_index('ix_book_popularity_score', ['score', 'book_id'], unique=False)
+
+    # Наявні відгуки та завантаження переносить `flask popularity rebuild`
+
+
+def downgrade():
+    with op.batch_alter_table('book_popularity', schema=None) as batch_op:
+        batch_op.drop_index('ix_book_popularity_score')
+
+    op.drop_table('book_popularity')
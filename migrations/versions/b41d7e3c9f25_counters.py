@@ -0,0 +1,31 @@
+"""Site-wide counters table
+
+Revision ID: b41d7e3c9f25
+Revises: 7c2e9a4b5d10
+Create Date: 2026-10-18 14:05:27.903114
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b41d7e3c9f25'
+down_revision = '7c2e9a4b5d10'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('counters',
+    sa.Column('name', sa.String(length=64), nullable=False),
+    sa.Column('value', sa.BigInteger(), nullable=False, server_default='0'),
+    sa.Column('updated_at', sa.DateTime(), nullable=True),
+    sa.PrimaryKeyConstraint('name')
+    )
+
+    # Початкові значення записує `flask counters recount`
+
+
+def downgrade():
+    op.drop_table('counters')
@@ -0,0 +1,33 @@
+"""Double precision rating score
+
+Revision ID: b5d0e8c27a61
+Revises: e7c3b1a94f58
+Create Date: 2026-10-21 11:02:47.615230
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b5d0e8c27a61'
+down_revision = 'e7c3b1a94f58'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # FLOAT у MySQL одинарної точності: курсор каталогу (double) не збігався
+    # з округленим значенням, і сторінки за рейтингом губили чи повторювали книги
+    with op.batch_alter_table('books', schema=None) as batch_op:
+        batch_op.alter_column('rating_score', existing_type=sa.Float(), type_=sa.Double(),
+                              existing_nullable=False, existing_server_default='0')
+
+    # Збережені значення вже округлені до FLOAT, тож після міграції
+    # потрібно запустити `flask ratings recompute`
+
+
+def downgrade():
+    with op.batch_alter_table('books', schema=None) as batch_op:
+        batch_op.alter_column('rating_score', existing_type=sa.Double(), type_=sa.Float(),
+                              existing_nullable=False, existing_server_default='0')
@@ -0,0 +1,26 @@
+"""Cover thumbnail variants
+
+Revision ID: c6e1f08a4d52
+Revises: a7d3e5b91c28
+Create Date: 2026-10-18 23:12:54.608117
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c6e1f08a4d52'
+down_revision = 'a7d3e5b91c28'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('books', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('cover_variants', sa.JSON(), nullable=True))
+
+
+def downgrade():
+    with op.batch_alter_table('books', schema=None) as batch_op:
+        batch_op.drop_column('cover_variants')
@@ -0,0 +1,70 @@
+"""Log rollup tables
+
+Revision ID: d58a1f6e2b93
+Revises: b41d7e3c9f25
+Create Date: 2026-10-18 15:32:48.220517
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd58a1f6e2b93'
+down_revision = 'b41d7e3c9f25'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('log_rollup_actions',
+    sa.Column('granularity', sa.String(length=8), nullable=False),
+    sa.Column('bucket', sa.DateTime(), nullable=False),
+    sa.Column('action', sa.String(length=50), nullable=False),
+    sa.Column('count', sa.Integer(), nullable=False, server_default='0'),
+    sa.PrimaryKeyConstraint('granularity', 'bucket', 'action')
+    )
+    op.create_table('log_rollup_books',
+    sa.Column('granularity', sa.String(length=8), nullable=False),
+    sa.Column('bucket', sa.DateTime(), nullable=False),
+    sa.Column('book_id', sa.Integer(), nullable=False),
+    sa.Column('action', sa.String(length=50), nullable=False),
+    sa.Column('count', sa.Integer(), nullable=False, server_default='0'),
+    sa.ForeignKeyConstraint(['book_id'], ['books.id'], ),
+    sa.PrimaryKeyConstraint('granularity', 'bucket', 'book_id', 'action')
+    )
+    with op.batch_alter_table('log_rollup_books', schema=None) as batch_op:
+        batch_op.create_index('ix_log_rollup_books_top', ['granularity', 'action', 'count'], unique=False)
+
+    op.create_table('log_rollup_users',
+    sa.Column('granularity', sa.String(length=8), nullable=False),
+    sa.Column('bucket', sa.DateTime(), nullable=False),
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('count', sa.Integer(), nullable=False, server_default='0'),
+    sa.ForeignKeyConstraint(['user_id'], ['users.id'], ),
+    sa.PrimaryKeyConstraint('granularity', 'bucket', 'user_id')
+    )
+    with op.batch_alter_table('log_rollup_users', schema=None) as batch_op:
+        batch_op.create_index('ix_log_rollup_users_top', ['granularity', 'count'], unique=False)
+
+    op.create_table('rollup_watermarks',
+    sa.Column('name', sa.String(length=64), nullable=False),
+    sa.Column('last_log_id', sa.BigInteger(), nullable=False, server_default='0'),
+    sa.Column('updated_at', sa.DateTime(), nullable=True),
+    sa.PrimaryKeyConstraint('name')
+    )
+
+    # Історію з наявного журналу переносить `flask rollups backfill`
+
+
+def downgrade():
+    op.drop_table('rollup_watermarks')
+    with op.batch_alter_table('log_rollup_users', schema=None) as batch_op:
+        batch_op.drop_index('ix_log_rollup_users_top')
+
+    op.drop_table('log_rollup_users')
+    with op.batch_alter_table('log_rollup_books', schema=None) as batch_op:
+        batch_op.drop_index('ix_log_rollup_books_top')
+
+    op.drop_table('log_rollup_books')
+    op.drop_table('log_rollup_actions')
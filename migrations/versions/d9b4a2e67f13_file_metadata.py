@@ -0,0 +1,38 @@
+"""Extracted ebook metadata
+
+Revision ID: d9b4a2e67f13
+Revises: c6e1f08a4d52
+Create Date: 2026-10-19 10:27:41.553092
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd9b4a2e67f13'
+down_revision = 'c6e1f08a4d52'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('file_metadata',
+    sa.Column('file_id', sa.Integer(), nullable=False),
+    sa.Column('status', sa.String(length=16), nullable=False, server_default='done'),
+    sa.Column('title', sa.String(length=255), nullable=True),
+    sa.Column('authors', sa.JSON(), nullable=True),
+    sa.Column('language', sa.String(length=10), nullable=True),
+    sa.Column('isbn', sa.String(length=20), nullable=True),
+    sa.Column('publisher', sa.String(length=200), nullable=True),
+    sa.Column('publication_year', sa.Integer(), nullable=True),
+    sa.Column('cover_path', sa.String(length=500), nullable=True),
+    sa.Column('error', sa.String(length=255), nullable=True),
+    sa.Column('extracted_at', sa.DateTime(), nullable=True),
+    sa.ForeignKeyConstraint(['file_id'], ['files.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('file_id')
+    )
+
+
+def downgrade():
+    op.drop_table('file_metadata')
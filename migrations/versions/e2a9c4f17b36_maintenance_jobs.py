@@ -0,0 +1,34 @@
+"""Maintenance job progress table
+
+Revision ID: e2a9c4f17b36
+Revises: d58a1f6e2b93
+Create Date: 2026-10-18 17:05:12.418903
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e2a9c4f17b36'
+down_revision = 'd58a1f6e2b93'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('maintenance_jobs',
+    sa.Column('name', sa.String(length=64), nullable=False),
+    sa.Column('status', sa.String(length=16), nullable=False, server_default='idle'),
+    sa.Column('processed', sa.BigInteger(), nullable=False, server_default='0'),
+    sa.Column('total', sa.BigInteger(), nullable=True),
+    sa.Column('message', sa.String(length=255), nullable=True),
+    sa.Column('started_at', sa.DateTime(), nullable=True),
+    sa.Column('updated_at', sa.DateTime(), nullable=True),
+    sa.Column('finished_at', sa.DateTime(), nullable=True),
+    sa.PrimaryKeyConstraint('name')
+    )
+
+
+def downgrade():
+    op.drop_table('maintenance_jobs')
@@ -0,0 +1,26 @@
+"""User version for the cached identity
+
+Revision ID: e7c3b1a94f58
+Revises: d9b4a2e67f13
+Create Date: 2026-10-20 09:14:26.307815
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e7c3b1a94f58'
+down_revision = 'd9b4a2e67f13'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('users', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('version', sa.Integer(), nullable=False, server_default='1'))
+
+
+def downgrade():
+    with op.batch_alter_table('users', schema=None) as batch_op:
+        batch_op.drop_column('version')
@@ -0,0 +1,91 @@
+"""Composite indexes for route queries
+
+Revision ID: f3b8d2a6c514
+Revises: e2a9c4f17b36
+Create Date: 2026-10-18 18:20:37.905126
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = 'f3b8d2a6c514'
+down_revision = 'e2a9c4f17b36'
+branch_labels = None
+depends_on = None
+
+# MySQL видаляє автоматичні індекси зовнішніх ключів, коли з'являється складений
+# індекс з тим самим першим стовпцем, тож перед відкатом їх треба повернути
+FK_COLUMNS = [('book_authors', 'author_id'), ('book_genres', 'genre_id'), ('files', 'book_id'),
+              ('logs', 'user_id'), ('logs', 'book_id'), ('reviews', 'book_id')]
+
+
+def upgrade():
+    # Набір перевіряє `flask indexes check` (EXPLAIN канонічних запитів маршрутів)
+    with op.batch_alter_table('authors', schema=None) as batch_op:
+        batch_op.create_index('ix_authors_name', ['last_name', 'first_name'], unique=False)
+
+    with op.batch_alter_table('book_authors', schema=None) as batch_op:
+        batch_op.create_index('ix_book_authors_author', ['author_id', 'book_id'], unique=False)
+        batch_op.create_index('ix_book_authors_book_order', ['book_id', 'order_index'], unique=False)
+
+    with op.batch_alter_table('book_genres', schema=None) as batch_op:
+        batch_op.create_index('ix_book_genres_genre', ['genre_id', 'book_id'], unique=False)
+
+    with op.batch_alter_table('books', schema=None) as batch_op:
+        batch_op.create_index('ix_books_active_created', ['is_active', 'created_at'], unique=False)
+        batch_op.create_index('ix_books_active_title', ['is_active', 'title'], unique=False)
+
+    with op.batch_alter_table('favorites', schema=None) as batch_op:
+        batch_op.create_index('ix_favorites_user_added', ['user_id', 'added_at'], unique=False)
+
+    with op.batch_alter_table('files', schema=None) as batch_op:
+        batch_op.create_index('ix_files_book_active_format', ['book_id', 'is_active', 'format'], unique=False)
+
+    with op.batch_alter_table('logs', schema=None) as batch_op:
+        batch_op.create_index('ix_logs_action_created', ['action', 'created_at'], unique=False)
+        batch_op.create_index('ix_logs_book_action', ['book_id', 'action'], unique=False)
+        batch_op.create_index('ix_logs_user_created', ['user_id', 'created_at'], unique=False)
+
+    with op.batch_alter_table('reviews', schema=None) as batch_op:
+        batch_op.create_index('ix_reviews_book_created', ['book_id', 'created_at'], unique=False)
+
+    with op.batch_alter_table('users', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_users_created_at'), ['created_at'], unique=False)
+
+
+def downgrade():
+    if op.get_bind().dialect.name == 'mysql':
+        for table, column in FK_COLUMNS:
+            op.create_index(f'ix_{table}_{column}', table, [column], unique=False)
+
+    with op.batch_alter_table('users', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_users_created_at'))
+
+    with op.batch_alter_table('reviews', schema=None) as batch_op:
+        batch_op.drop_index('ix_reviews_book_created')
+
+    with op.batch_alter_table('logs', schema=None) as batch_op:
+        batch_op.drop_index('ix_logs_user_created')
+        batch_op.drop_index('ix_logs_book_action')
+        batch_op.drop_index('ix_logs_action_created')
+
+    with op.batch_alter_table('files', schema=None) as batch_op:
+        batch_op.drop_index('ix_files_book_active_format')
+
+    with op.batch_alter_table('favorites', schema=None) as batch_op:
+        batch_op.drop_index('ix_favorites_user_added')
+
+    with op.batch_alter_table('books', schema=None) as batch_op:
+        batch_op.drop_index('ix_books_active_title')
+        batch_op.drop_index('ix_books_active_created')
+
+    with op.batch_alter_table('book_genres', schema=None) as batch_op:
+        batch_op.drop_index('ix_book_genres_genre')
+
+    with op.batch_alter_table('book_authors', schema=None) as batch_op:
+        batch_op.drop_index('ix_book_authors_book_order')
+        batch_op.drop_index('ix_book_authors_author')
+
+    with op.batch_alter_table('authors', schema=None) as batch_op:
+        batch_op.drop_index('ix_authors_name')
@@ -0,0 +1,326 @@
+"""Заповнення бази тестовими даними.
+
+Без параметрів створює демонстраційний набір: адміністратора admin/admin123,
+читача reader/reader123, 5 авторів, 5 жанрів і 5 книг.
+
+З параметрами обсягу генерує великий синтетичний набір для вимірювання
+продуктивності. Рядки вставляються пакетами через Core insert() (executemany)
+з наперед призначеними id, без ORM-об'єктів. Похідні таблиці (рейтинги,
+лічильники, популярність, зведена статистика журналу) перераховуються в кінці.
+
+    python seed_data.py --preset large
+    python seed_data.py --books 20000 --authors 5000 --users 2000 --reviews 200000 --logs 1000000
+"""
+import argparse
+import random
+import time
+from datetime import date, datetime, timedelta
+from sqlalchemy import func, insert
+from werkzeug.security import generate_password_hash
+from app import create_app, db
+from app.forms import LANGUAGE_CHOICES
+from app.models import (User, Author, Genre, Book, BookAuthor, BookGenre, Favorite, Review, Log)
+
+PRESETS = {
+    'small': dict(users=500, authors=1000, books=5000, reviews=50000, favorites=10000, logs=200000),
+    'medium': dict(users=5000, authors=10000, books=50000, reviews=500000, favorites=100000, logs=2000000),
+    'large': dict(users=20000, authors=50000, books=200000, reviews=2000000, favorites=400000, logs=20000000),
+}
+
+FIRST_NAMES = ['Тарас', 'Леся', 'Іван', 'Ольга', 'Михайло', 'Ліна', 'Василь', 'Марія', 'Олесь',
+               'Ганна', 'Григорій', 'Оксана', 'Павло', 'Софія', 'Андрій', 'Наталія', 'Юрій', 'Катерина']
+LAST_NAMES = ['Шевченко', 'Українка', 'Франко', 'Кобилянська', 'Коцюбинський', 'Костенко',
+              'Стефаник', 'Вовчок', 'Гончар', 'Сковорода', 'Забужко', 'Тичина', 'Жадан', 'Андрухович',
+              'Рильський', 'Стус', 'Підмогильний', 'Хвильовий', 'Довженко', 'Загребельний']
+GENRE_NAMES = ['Роман', 'Поезія', 'Драма', 'Детектив', 'Фантастика', 'Фентезі', 'Історичний роман',
+               'Пригоди', 'Жахи', 'Трилер', 'Біографія', 'Мемуари', 'Філософія', 'Психологія',
+               'Історія', 'Наука', 'Дитяча література', 'Казки', 'Гумор', 'Публіцистика',
+               'Есеїстика', 'Новела', 'Повість', 'Байки', "П'єси", 'Містика', 'Любовний роман',
+               'Антиутопія', 'Класика', 'Сучасна проза']
+TITLE_WORDS = ['Тіні', 'забутих', 'предків', 'Місто', 'Сад', 'Камінний', 'хрест', 'Зачарована',
+               'Десна', 'Лісова', 'пісня', 'Intermezzo', 'Тигролови', 'Собор', 'Вершники', 'Маруся',
+               'Чурай', 'Гайдамаки', 'Кобзар', 'Земля', 'Мина', 'Мазайло', 'Жовтий', 'князь',
+               'Сестри', 'Річинські', 'Ворошиловград', 'Музей', 'покинутих', 'секретів', 'Рекреації',
+               'Польові', 'дослідження', 'Диво', 'Чорна', 'рада', 'Кайдашева', 'сім\'я']
+# (дія, частка) у синтетичному журналі
+LOG_ACTIONS = [('view', 0.70), ('download', 0.12), ('login', 0.07), ('logout', 0.05),
+               ('add_favorite', 0.03), ('remove_favorite', 0.01), ('add_review', 0.02)]
+USER_AGENTS = ['Mozilla/5.0 (Windows NT 10.0; Win64; x64) Chrome/126.0',
+               'Mozilla/5.0 (Macintosh; Intel Mac OS X 14_5) Safari/605.1.15',
+               'Mozilla/5.0 (X11; Linux x86_64; rv:127.0) Gecko/20100101 Firefox/127.0',
+               'Mozilla/5.0 (iPhone; CPU iPhone OS 17_5 like Mac OS X) Mobile/15E148']
+
+
+# --- демонстраційні дані ---
+
+def seed_demo():
+    if User.query.filter_by(username='admin').first():
+        print('Демонстраційні дані вже є, пропускаємо.')
+        return
+
+    admin = User(username='admin', email='admin@library.local', role='admin',
+                 first_name='Адмін', last_name='Бібліотеки')
+    admin.set_password('admin123')
+    reader = User(username='reader', email='reader@library.local', first_name='Читач')
+    reader.set_password('reader123')
+    db.session.add_all([admin, reader])
+
+    authors = [
+        Author(first_name='Тарас', last_name='Шевченко', birth_date=date(1814, 3, 9), country='Україна'),
+        Author(first_name='Леся', last_name='Українка', birth_date=date(1871, 2, 25), country='Україна'),
+        Author(first_name='Іван', last_name='Франко', birth_date=date(1856, 8, 27), country='Україна'),
+        Author(first_name='Ольга', last_name='Кобилянська', birth_date=date(1863, 11, 27), country='Україна'),
+        Author(first_name='Михайло', last_name='Коцюбинський', birth_date=date(1864, 9, 17), country='Україна'),
+    ]
+    genres = [Genre(name=name) for name in ['Поезія', 'Драма', 'Роман', 'Повість', 'Новела']]
+    db.session.add_all(authors + genres)
+    db.session.flush()
+
+    books = [
+        ('Кобзар', 1840, 0, 0),
+        ('Лісова пісня', 1911, 1, 1),
+        ('Захар Беркут', 1883, 2, 3),
+        ('Земля', 1902, 3, 2),
+        ('Тіні забутих предків', 1911, 4, 4),
+    ]
+    for title, year, author_index, genre_index in books:
+        book = Book(title=title, publication_year=year, language='uk',
+                    description=f'«{title}» — класика української літератури.')
+        db.session.add(book)
+        db.session.flush()
+        db.session.add(BookAuthor(book_id=book.id, author_id=authors[author_index].id))
+        db.session.add(BookGenre(book_id=book.id, genre_id=genres[genre_index].id))
+
+    db.session.commit()
+    print('✓ Створено користувачів admin/admin123 і reader/reader123, 5 авторів, 5 жанрів, 5 книг')
+
+
+# --- синтетичний набір ---
+
+class Loader:
+    """Batches rows per table and inserts them with executemany."""
+
+    def __init__(self, batch_size):
+        self.batch_size = batch_size
+        self.pending = {}
+        self.inserted = {}
+
+    def add(self, model, row):
+        rows = self.pending.setdefault(model, [])
+        rows.append(row)
+        if len(rows) >= self.batch_size:
+            self.flush(model)
+
+    def flush(self, model=None):
+        """Insert pending rows of `model` (all models if None).
+
+        Tables that received rows earlier (parents, e.g. books before
+        book_authors) are flushed first, so foreign keys always resolve.
+        """
+        for current in list(self.pending):
+            rows = self.pending[current]
+            if rows:
+                with db.engine.begin() as connection:
+                    connection.execute(insert(current), rows)
+                self.inserted[current] = self.inserted.get(current, 0) + len(rows)
+                self.pending[current] = []
+            if current is model:
+                break
+
+
+def _next_id(model):
+    return (db.session.query(func.max(model.id)).scalar() or 0) + 1
+
+
+def _skewed(rng, count, skew):
+    """Index in [0, count) with low indexes more likely (popular items first)."""
+    return min(count - 1, int(count * rng.random() ** skew))
+
+
+def _progress(label, done, total, started):
+    if total and (done == total or done % max(1, total // 20) == 0):
+        rate = done / max(time.monotonic() - started, 1e-6)
+        print(f'  {label}: {done}/{total} ({rate:,.0f} рядків/с)', flush=True)
+
+
+def seed_synthetic(users, authors, books, reviews, favorites, logs, genres, batch_size, seed, days):
+    from app.utils.ratings import bayesian_score
+
+    rng = random.Random(seed)
+    loader = Loader(batch_size)
+    now = datetime.utcnow().replace(microsecond=0)
+    start = now - timedelta(days=days)
+
+    def moment(fraction):
+        return start + timedelta(seconds=int((now - start).total_seconds() * fraction))
+
+    # Користувачі: один хеш пароля на всіх ("password"), хешування дороге
+    password_hash = generate_password_hash('password')
+    first_user = _next_id(User)
+    started = time.monotonic()
+    for i in range(users):
+        user_id = first_user + i
+        loader.add(User, {
+            'id': user_id, 'username': f'user{user_id}', 'email': f'user{user_id}@example.com',
+            'password_hash': password_hash, 'role': 'user', 'is_active': True,
+            'first_name': rng.choice(FIRST_NAMES), 'last_name': rng.choice(LAST_NAMES),
+            'created_at': moment(i / max(users, 1)),
+        })
+    loader.flush(User)
+    _progress('користувачі', users, users, started)
+
+    existing_genres = {name for (name,) in db.session.query(Genre.name)}
+    names = [name for name in GENRE_NAMES if name not in existing_genres]
+    names += [f'Жанр {i}' for i in range(1, genres + 1) if f'Жанр {i}' not in existing_genres]
+    for name in names[:genres]:
+        loader.add(Genre, {'name': name, 'description': f'Синтетичний жанр «{name}»'})
+    loader.flush(Genre)
+    genre_ids = [genre_id for (genre_id,) in db.session.query(Genre.id).order_by(Genre.id)]
+
+    first_author = _next_id(Author)
+    started = time.monotonic()
+    for i in range(authors):
+        birth_year = rng.randint(1780, 1995)
+        loader.add(Author, {
+            'id': first_author + i, 'first_name': rng.choice(FIRST_NAMES),
+            'last_name': f'{rng.choice(LAST_NAMES)}-{first_author + i}',
+            'birth_date': date(birth_year, rng.randint(1, 12), rng.randint(1, 28)),
+            'country': 'Україна' if rng.random() < 0.7 else rng.choice(['Польща', 'Франція', 'Німеччина', 'США']),
+            'bio': 'Синтетичний автор для тестування продуктивності.',
+        })
+    loader.flush(Author)
+    _progress('автори', authors, authors, started)
+
+    # Кількість відгуків на книгу: степеневий розподіл, сума ~ reviews
+    first_book = _next_id(Book)
+    review_counts = [0] * books
+    if books and users:
+        for _ in range(reviews):
+            review_counts[_skewed(rng, books, 3)] += 1
+        review_counts = [min(count, users) for count in review_counts]
+
+    languages = [code for code, _ in LANGUAGE_CHOICES]
+    language_weights = [60, 20, 10, 5, 5][:len(languages)]
+    first_review = _next_id(Review)
+    review_id = first_review
+    started = time.monotonic()
+    for i in range(books):
+        book_id = first_book + i
+        created_at = moment(i / max(books, 1))
+        ratings = [min(5, max(1, round(rng.gauss(3.8, 1.0)))) for _ in range(review_counts[i])]
+        loader.add(Book, {
+            'id': book_id,
+            'title': ' '.join(rng.sample(TITLE_WORDS, rng.randint(1, 4))) + f' {book_id}',
+            'description': 'Синтетичний опис книги для тестування продуктивності. ' * rng.randint(1, 5),
+            'isbn': f'979-{book_id:013d}',
+            'language': rng.choices(languages, language_weights)[0],
+            'publisher': rng.choice(['А-БА-БА-ГА-ЛА-МА-ГА', 'Видавництво Старого Лева', 'Фоліо', 'Наш Формат', None]),
+            'publication_year': rng.randint(1800, now.year),
+            'created_at': created_at, 'updated_at': created_at, 'is_active': rng.random() > 0.02,
+            'rating_sum': sum(ratings), 'rating_count': len(ratings),
+            'rating_score': bayesian_score(sum(ratings), len(ratings)),
+        })
+        # Автори: 1 (80%), 2 (15%) або 3; популярні автори мають більше книг
+        fan_out = rng.choices([1, 2, 3], [80, 15, 5])[0]
+        book_authors = {first_author + _skewed(rng, authors, 1.5) for _ in range(fan_out)} if authors else set()
+        for order_index, author_id in enumerate(sorted(book_authors)):
+            loader.add(BookAuthor, {'book_id': book_id, 'author_id': author_id,
+                                    'role': 'author', 'order_index': order_index})
+        for genre_id in rng.sample(genre_ids, min(len(genre_ids), rng.choices([1, 2, 3], [50, 35, 15])[0])):
+            loader.add(BookGenre, {'book_id': book_id, 'genre_id': genre_id})
+        if ratings:
+            reviewers = rng.sample(range(first_user, first_user + users), len(ratings))
+            for user_id, rating in zip(reviewers, ratings):
+                review_at = created_at + (now - created_at) * rng.random()
+                loader.add(Review, {
+                    'id': review_id, 'user_id': user_id, 'book_id': book_id, 'rating': rating,
+                    'title': rng.choice(['Чудово', 'Раджу', 'Непогано', 'Так собі', 'Не сподобалось']),
+                    'review_text': 'Синтетичний відгук. ' * rng.randint(1, 8),
+                    'created_at': review_at, 'updated_at': review_at,
+                })
+                review_id += 1
+        _progress('книги', i + 1, books, started)
+    loader.flush()
+
+    started = time.monotonic()
+    seen = set()
+    for i in range(favorites if books and users else 0):
+        pair = (first_user + rng.randrange(users), first_book + _skewed(rng, books, 2))
+        if pair in seen:
+            continue
+        seen.add(pair)
+        loader.add(Favorite, {'user_id': pair[0], 'book_id': pair[1], 'added_at': moment(rng.random())})
+        _progress('обране', i + 1, favorites, started)
+    loader.flush()
+    seen.clear()
+
+    # Журнал: час зростає разом з id, як у справжньому журналі
+    actions, weights = zip(*LOG_ACTIONS)
+    started = time.monotonic()
+    for i in range(logs if books and users else 0):
+        action = rng.choices(actions, weights)[0]
+        book_id = None
+        if action not in ('login', 'logout'):
+            book_id = first_book + _skewed(rng, books, 3)
+        loader.add(Log, {
+            'user_id': first_user + _skewed(rng, users, 2), 'book_id': book_id, 'action': action,
+            'created_at': moment(i / logs), 'ip_address': f'10.{rng.randrange(256)}.{rng.randrange(256)}.{rng.randrange(1, 255)}',
+            'user_agent': rng.choice(USER_AGENTS),
+        })
+        _progress('журнал', i + 1, logs, started)
+    loader.flush()
+    return loader.inserted
+
+
+def rebuild_derived():
+    """Recompute tables that the app maintains incrementally."""
+    from app.utils.cache import response_cache
+    from app.utils.counters import counters
+    from app.utils.popularity import rebuild_popularity
+    from app.utils.rollups import reset_rollups, run_rollups
+
+    print('Перерахунок похідних таблиць...')
+    reset_rollups()
+    run_rollups(batch_size=20000)
+    rebuild_popularity()
+    counters.recount()
+    response_cache.clear()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Заповнення бази тестовими даними.')
+    parser.add_argument('--preset', choices=sorted(PRESETS), help='Готовий набір обсягів.')
+    for name in ('users', 'authors', 'books', 'reviews', 'favorites', 'logs'):
+        parser.add_argument(f'--{name}', type=int, help=f'Кількість: {name}.')
+    parser.add_argument('--genres', type=int, default=30, help='Кількість жанрів (синтетичний набір).')
+    parser.add_argument('--days', type=int, default=3 * 365, help='Період історії в днях.')
+    parser.add_argument('--batch-size', type=int, default=5000, help='Рядків в одному executemany.')
+    parser.add_argument('--seed', type=int, default=42, help='Зерно генератора (відтворюваність).')
+    parser.add_argument('--skip-derived', action='store_true', help='Не перераховувати похідні таблиці.')
+    args = parser.parse_args()
+
+    volumes = dict(PRESETS.get(args.preset, {}))
+    for name in ('users', 'authors', 'books', 'reviews', 'favorites', 'logs'):
+        if getattr(args, name) is not None:
+            volumes[name] = getattr(args, name)
+
+    app = create_app()
+    with app.app_context():
+        seed_demo()
+        if not volumes:
+            return
+        for name in ('users', 'authors', 'books', 'reviews', 'favorites', 'logs'):
+            volumes.setdefault(name, 0)
+
+        started = time.monotonic()
+        inserted = seed_synthetic(genres=args.genres, batch_size=args.batch_size, seed=args.seed,
+                                  days=args.days, **volumes)
+        for model, count in inserted.items():
+            print(f'✓ {model.__tablename__}: {count}')
+        if not args.skip_derived:
+            rebuild_derived()
+        print(f'\n✅ Готово за {time.monotonic() - started:.0f} с')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,59 @@
+"""Anonymous pages cached by response_cache must follow review changes."""
+import pytest
+from app import create_app, db
+from app.config import Config
+from app.models import Author, Book, BookAuthor, BookGenre, Genre, User
+from app.utils.cache import response_cache
+
+
+@pytest.fixture
+def app(tmp_path):
+    class TestConfig(Config):
+        TESTING = True
+        WTF_CSRF_ENABLED = False
+        SQLALCHEMY_DATABASE_URI = 'sqlite:///' + str(tmp_path / 'test.db')
+        SQLALCHEMY_ENGINE_OPTIONS = {}
+        CACHE_TYPE = 'memory'
+        ACTIVITY_LOG_ASYNC = False
+        FULLTEXT_INDEX = False
+        FULLTEXT_INDEX_DIR = str(tmp_path / 'fulltext')
+
+    app = create_app(TestConfig)
+    with app.app_context():
+        db.create_all()
+        reader = User(username='reader', email='reader@example.com')
+        reader.set_password('reader123')
+        author = Author(first_name='Тарас', last_name='Шевченко')
+        genre = Genre(name='Поезія')
+        book = Book(title='Кобзар', language='uk')
+        db.session.add_all([reader, author, genre, book])
+        db.session.flush()
+        db.session.add_all([BookAuthor(book_id=book.id, author_id=author.id),
+                            BookGenre(book_id=book.id, genre_id=genre.id)])
+        db.session.commit()
+    response_cache.clear()
+    # Запити йдуть без відкритого контексту застосунку: інакше g (а з ним і
+    # користувач Flask-Login) спільний для всіх клієнтів
+    yield app
+    with app.app_context():
+        db.drop_all()
+
+
+@pytest.mark.parametrize('url', ['/authors/1', '/genres/1'])
+def test_review_refreshes_cached_page(app, url):
+    client = app.test_client()
+    before = client.get(url)
+    assert before.status_code == 200
+    assert '(0)' in before.get_data(as_text=True)
+    assert client.get(url).headers.get('X-Cache') == 'HIT'
+
+    # Відгук залишає інший відвідувач; сторінку й далі отримує анонім
+    reader = app.test_client()
+    reader.post('/auth/login', data={'username': 'reader', 'password': 'reader123'})
+    reader.post('/reviews/books/1/review', data={'rating': '5', 'title': 'Чудово', 'review_text': 'Варто прочитати'})
+
+    after = client.get(url)
+    assert after.status_code == 200
+    assert after.headers.get('X-Cache') != 'HIT'
+    body = after.get_data(as_text=True)
+    assert '(1)' in body and body.count('★') == 5